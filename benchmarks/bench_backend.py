@@ -0,0 +1,97 @@
+# Compare HIDDevice I/O backends writing 8 byte reports into a local sink.
+#
+# aiofile opens its handle 'rb+' and therefore needs a seekable sink (a real
+# /dev/hidgN is seekable via noop_llseek), so it is benchmarked against a
+# regular file; the nonblocking backend is additionally run against a FIFO
+# that a reader thread drains, which exercises the EAGAIN/add_writer path.
+#
+# $ python benchmarks/bench_backend.py --reports 20000
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+import typing
+
+from pathlib import Path
+
+from ezmsg.gadget.handle import open_handle, BACKENDS, BACKEND_NONBLOCKING
+
+REPORT = bytes([0x02, 0x00, 0x04, 0x00, 0x00, 0x00, 0x00, 0x00])
+
+
+def _drain(fd: int, stop: threading.Event) -> None:
+    while not stop.is_set():
+        try:
+            os.read(fd, 65536)
+        except BlockingIOError:
+            time.sleep(0.0001)
+
+
+async def bench(path: Path, backend: str, reports: int) -> typing.Dict[str, float]:
+    handle = await open_handle(path, backend)
+    latencies: typing.List[float] = []
+    try:
+        start = time.perf_counter()
+        for _ in range(reports):
+            t0 = time.perf_counter()
+            await handle.write(REPORT)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+    finally:
+        await handle.close()
+
+    latencies.sort()
+    return {
+        'reports_per_sec': reports / elapsed,
+        'mean_us': statistics.fmean(latencies) * 1e6,
+        'p50_us': latencies[len(latencies) // 2] * 1e6,
+        'p99_us': latencies[int(len(latencies) * 0.99)] * 1e6,
+        'max_us': latencies[-1] * 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'HIDDevice backend benchmark')
+    parser.add_argument('--reports', '-n', type = int, default = 20000)
+
+    class Args:
+        reports: int
+
+    args = parser.parse_args(namespace = Args)
+
+    with tempfile.TemporaryDirectory(dir = '/dev/shm' if Path('/dev/shm').is_dir() else None) as tmpdir:
+        runs: typing.List[typing.Tuple[str, str, Path]] = []
+
+        sink_file = Path(tmpdir) / 'hidg.bin'
+        sink_file.touch()
+        for backend in BACKENDS:
+            runs.append((backend, 'file', sink_file))
+
+        sink_fifo = Path(tmpdir) / 'hidg.fifo'
+        os.mkfifo(sink_fifo)
+        reader = os.open(sink_fifo, os.O_RDONLY | os.O_NONBLOCK)
+        stop = threading.Event()
+        drain = threading.Thread(target = _drain, args = (reader, stop), daemon = True)
+        drain.start()
+        runs.append((BACKEND_NONBLOCKING, 'fifo', sink_fifo))
+
+        try:
+            print(f'{"backend":<12} {"sink":<5} {"reports/s":>10} {"mean us":>8} {"p50 us":>8} {"p99 us":>8} {"max us":>8}')
+            for backend, sink, path in runs:
+                r = asyncio.run(bench(path, backend, args.reports))
+                print(
+                    f'{backend:<12} {sink:<5} {r["reports_per_sec"]:>10.0f} {r["mean_us"]:>8.1f} '
+                    f'{r["p50_us"]:>8.1f} {r["p99_us"]:>8.1f} {r["max_us"]:>8.1f}'
+                )
+        finally:
+            stop.set()
+            drain.join()
+            os.close(reader)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Micro-benchmark for HID report encoders; compares the original list-building
+# encoders with precompiled struct encoders (report / report_into a reused
+# buffer) and with the vectorized batch encoders.
+#
+# $ python benchmarks/bench_encode.py --reports 100000
+
+import argparse
+import timeit
+import typing
+
+import numpy as np
+
+from ezmsg.gadget.function import Keyboard, Mouse, Touch
+
+
+def legacy_keyboard(msg: Keyboard.Message) -> bytearray:
+    buf = [0] * 16
+    buf[0] = msg.control_keys
+    buf[2] = msg.hid_keycode
+    return bytearray(buf[:(16 if msg.tap else 8)])
+
+def legacy_mouse(msg: Mouse.Message) -> bytearray:
+    x = int(msg.relative_x * ((2 ** 15) - 1))
+    y = int(msg.relative_y * ((2 ** 15) - 1))
+    buf = [0] * 6
+    buf[0] = msg.buttons
+    buf[1] = x & 0xff
+    buf[2] = (x >> 8) & 0xff
+    buf[3] = y & 0xff
+    buf[4] = (y >> 8) & 0xff
+    buf[5] = msg.relative_wheel & 0xff
+    return bytearray(buf)
+
+def legacy_touch(msg: Touch.Message) -> bytearray:
+    x = int(msg.absolute_x * 10000)
+    y = int(msg.absolute_y * 10000)
+    buf = [0] * 5
+    buf[0] = msg.touch
+    buf[1] = x & 0xff
+    buf[2] = (x >> 8) & 0xff
+    buf[3] = y & 0xff
+    buf[4] = (y >> 8) & 0xff
+    return bytearray(buf)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'HID report encoder benchmark')
+    parser.add_argument('--reports', '-n', type = int, default = 100000)
+
+    class Args:
+        reports: int
+
+    args = parser.parse_args(namespace = Args)
+    n = args.reports
+
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(0.0, 1.0, (2, n))
+    buttons = rng.integers(0, 4, n)
+    wheel = rng.integers(-127, 128, n)
+    keycodes = rng.integers(Keyboard.KEYCODE_A, Keyboard.KEYCODE_Z, n)
+
+    cases: typing.List[typing.Tuple[str, typing.List[typing.Any], typing.Callable, typing.Callable]] = [
+        (
+            'Keyboard', 
+            [Keyboard.Message(0, int(k)) for k in keycodes], 
+            legacy_keyboard, 
+            lambda: Keyboard.encode_batch(0, keycodes)
+        ),
+        (
+            'Mouse', 
+            [Mouse.Message(int(b), float(u), float(v), int(w)) for b, u, v, w in zip(buttons, x, y, wheel)], 
+            legacy_mouse, 
+            lambda: Mouse.encode_batch(buttons, x, y, wheel)
+        ),
+        (
+            'Touch', 
+            [Touch.Message(int(b), float(u), float(v)) for b, u, v in zip(buttons, x, y)], 
+            legacy_touch, 
+            lambda: Touch.encode_batch(buttons, x, y)
+        ),
+    ]
+
+    print(f'{"function":<10} {"encoder":<12} {"ns/report":>10} {"speedup":>8}')
+    for name, messages, legacy, batch in cases:
+        buffer = bytearray(64)
+        timings = {
+            'legacy': lambda: [legacy(msg) for msg in messages],
+            'report': lambda: [msg.report() for msg in messages],
+            'report_into': lambda: [msg.report_into(buffer) for msg in messages],
+            'batch': batch,
+        }
+
+        baseline = None
+        for encoder, fn in timings.items():
+            per_report = min(timeit.repeat(fn, number = 1, repeat = 5)) / n
+            baseline = baseline or per_report
+            print(f'{name:<10} {encoder:<12} {per_report * 1e9:>10.1f} {baseline / per_report:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Compare the dataclass messages with their slotted, immutable Frozen
+# variants: memory per instance (tracemalloc over N live instances), pickled
+# size, pickle round trip (what crossing an ezmsg process or network
+# boundary costs) and encoding into a reused buffer.
+#
+# $ python benchmarks/bench_message.py --messages 100000
+
+import argparse
+import pickle
+import timeit
+import tracemalloc
+import typing
+
+from ezmsg.gadget.function import Keyboard, Mouse, Touch
+
+CASES: typing.List[typing.Tuple[str, typing.Callable[[int], typing.Any]]] = [
+    ('Keyboard.Message', lambda i: Keyboard.Message(control_keys = 0x02, hid_keycode = i & 0xff)),
+    ('Keyboard.Frozen', lambda i: Keyboard.Frozen(control_keys = 0x02, hid_keycode = i & 0xff)),
+    ('Mouse.Message', lambda i: Mouse.Message(buttons = 1, relative_x = 0.01 * (i % 100), relative_y = -0.01, relative_wheel = 1)),
+    ('Mouse.Frozen', lambda i: Mouse.Frozen(buttons = 1, relative_x = 0.01 * (i % 100), relative_y = -0.01, relative_wheel = 1)),
+    ('Touch.Message', lambda i: Touch.Message(touch = 3, absolute_x = 0.001 * (i % 1000), absolute_y = 0.5)),
+    ('Touch.Frozen', lambda i: Touch.Frozen(touch = 3, absolute_x = 0.001 * (i % 1000), absolute_y = 0.5)),
+]
+
+
+def bytes_per_instance(make: typing.Callable[[int], typing.Any], n: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = [make(i) for i in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return (after - before) / n - 8 # less the list's pointer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'HID message memory/serialization benchmark')
+    parser.add_argument('--messages', '-n', type = int, default = 100000)
+
+    class Args:
+        messages: int
+
+    args = parser.parse_args(namespace = Args)
+    n = args.messages
+
+    print(f'{"message":<18} {"bytes/obj":>9} {"pickled":>8} {"pickle rt us":>12} {"encode us":>10} {"create us":>10}')
+    buf = bytearray(64)
+    for name, make in CASES:
+        msg = make(1)
+        pickled = pickle.dumps(msg, protocol = pickle.HIGHEST_PROTOCOL)
+        roundtrip = timeit.timeit(
+            lambda: pickle.loads(pickle.dumps(msg, protocol = pickle.HIGHEST_PROTOCOL)), number = n
+        ) / n
+        encode = timeit.timeit(lambda: msg.report_into(buf), number = n) / n
+        create = timeit.timeit(lambda: make(1), number = n) / n
+        print(
+            f'{name:<18} {bytes_per_instance(make, n):>9.0f} {len(pickled):>8} '
+            f'{roundtrip * 1e6:>12.2f} {encode * 1e6:>10.3f} {create * 1e6:>10.3f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
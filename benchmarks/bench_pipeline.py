@@ -0,0 +1,264 @@
+# Reproducible throughput/latency benchmark for the HID pipeline.
+#
+# A HIDDevice writes into a local fake hidg sink (no USB hardware needed):
+# a FIFO drained by a reader thread for the nonblocking backend, or a tmpfs
+# file for aiofile (which needs a seekable node).  Each function is measured
+#
+#   unit:  HIDDevice in isolation; latency is exact per-message write latency
+#   graph: Generator -> HIDDevice through a full ez.run graph; latency comes
+#          from the device's own arrival-to-write histogram (4 buckets/decade)
+#
+# Results are saved as JSON; pass --compare to diff against an older run.
+#
+# $ python benchmarks/bench_pipeline.py -n 20000 --output bench.json
+# $ python benchmarks/bench_pipeline.py -n 20000 --compare bench.json
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import typing
+
+from pathlib import Path
+
+import ezmsg.core as ez
+
+from ezmsg.gadget import __version__
+from ezmsg.gadget.function import Keyboard, Mouse, Touch
+from ezmsg.gadget.handle import BACKENDS, BACKEND_NONBLOCKING
+from ezmsg.gadget.hiddevice import HIDDevice, HIDDeviceSettings
+from ezmsg.gadget.message import HIDMessage
+from ezmsg.gadget.stats import read_stats
+
+# Configured like a real gadget, so the device writes one report per write
+CONFIG = """
+[function.Keyboard.keyboard]
+[function.Mouse.mouse]
+[function.Touch.touch]
+"""
+
+FUNCTIONS: typing.Dict[str, typing.Callable[[int], HIDMessage]] = {
+    'keyboard': lambda i: Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A + i % 26),
+    'mouse': lambda i: Mouse.Message(relative_x = 0.01, relative_y = -0.01),
+    'touch': lambda i: Touch.Message(touch = 0x03, absolute_x = (i % 1000) / 1000, absolute_y = 0.5),
+}
+
+
+class FakeHIDSink:
+    # A FIFO (drained by a thread) or a regular file standing in for /dev/hidgN
+
+    path: Path
+    received: int
+
+    def __init__(self, directory: Path, name: str, backend: str) -> None:
+        self.path = directory / name
+        self.received = 0
+        self._reader: typing.Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+
+        if backend == BACKEND_NONBLOCKING:
+            os.mkfifo(self.path)
+            self._reader = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+            self._thread = threading.Thread(target = self._drain, daemon = True)
+            self._thread.start()
+        else:
+            self.path.touch()
+
+    def _drain(self) -> None:
+        assert self._reader is not None
+        while not self._stop.is_set():
+            try:
+                self.received += len(os.read(self._reader, 65536))
+            except BlockingIOError:
+                time.sleep(0.0001)
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._reader is not None:
+            os.close(self._reader)
+
+
+def _summary(latencies: typing.List[float]) -> typing.Dict[str, float]:
+    latencies = sorted(latencies)
+    pct = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1e6
+    return {
+        'mean_us': statistics.fmean(latencies) * 1e6,
+        'p50_us': pct(0.50),
+        'p90_us': pct(0.90),
+        'p99_us': pct(0.99),
+        'max_us': latencies[-1] * 1e6,
+    }
+
+
+async def bench_unit(function: str, backend: str, n: int, tmpdir: Path) -> typing.Dict[str, typing.Any]:
+    sink = FakeHIDSink(tmpdir, f'unit-{function}-{backend}', backend)
+    device = HIDDevice(
+        HIDDeviceSettings(
+            function_name = function,
+            config_file = tmpdir / 'ezmsg-gadget.conf',
+            device_path = sink.path,
+            backend = backend
+        )
+    )
+
+    try:
+        await device.setup()
+        messages = [FUNCTIONS[function](i) for i in range(n)]
+        latencies: typing.List[float] = []
+        start = time.perf_counter()
+        for msg in messages:
+            t0 = time.perf_counter()
+            await device.write(msg)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+        await device.shutdown()
+    finally:
+        sink.close()
+
+    return {
+        'messages_per_sec': n / elapsed,
+        'reports_per_sec': device.stats().reports / elapsed,
+        **_summary(latencies)
+    }
+
+
+class GeneratorSettings(ez.Settings):
+    function: str
+    n: int
+
+
+class Generator(ez.Unit):
+    SETTINGS = GeneratorSettings
+
+    OUTPUT = ez.OutputStream(HIDMessage)
+
+    @ez.publisher(OUTPUT)
+    async def generate(self) -> typing.AsyncGenerator:
+        await asyncio.sleep(0.5) # Let the graph connect
+        make = FUNCTIONS[self.SETTINGS.function]
+        for i in range(self.SETTINGS.n):
+            yield self.OUTPUT, make(i)
+        await asyncio.sleep(0.5) # Let the device drain
+        raise ez.NormalTermination
+
+
+def bench_graph(function: str, backend: str, n: int, tmpdir: Path) -> typing.Dict[str, typing.Any]:
+    sink = FakeHIDSink(tmpdir, f'graph-{function}-{backend}', backend)
+    stats_dir = tmpdir / f'stats-{function}-{backend}'
+
+    generator = Generator(GeneratorSettings(function = function, n = n))
+    device = HIDDevice(
+        HIDDeviceSettings(
+            function_name = function,
+            config_file = tmpdir / 'ezmsg-gadget.conf',
+            device_path = sink.path,
+            backend = backend,
+            stats_period = 1.0,
+            stats_dir = stats_dir
+        )
+    )
+
+    try:
+        ez.run(
+            GENERATOR = generator,
+            DEVICE = device,
+            connections = ((generator.OUTPUT, device.INPUT_HID),)
+        )
+    finally:
+        sink.close()
+
+    stats = read_stats(stats_dir)
+    if not stats or stats[0].received != n:
+        raise RuntimeError(f'graph run for {function}/{backend} did not complete: {stats}')
+
+    s = stats[0]
+    span = s.write_span if s.write_span > 0 else float('nan')
+    return {
+        'messages_per_sec': s.received / span,
+        'reports_per_sec': s.reports / span,
+        'p50_us': s.latency_p50 * 1e6,
+        'p99_us': s.latency_p99 * 1e6,
+        'max_us': s.latency_max * 1e6,
+    }
+
+
+def compare(results: typing.List[typing.Dict[str, typing.Any]], baseline_path: Path) -> None:
+    baseline = json.loads(baseline_path.read_text())
+    key = lambda r: (r['mode'], r['function'], r['backend'])
+    old = {key(r): r for r in baseline['results']}
+    print(f'\nvs {baseline_path} ({baseline["meta"]["version"]}, {baseline["meta"]["timestamp"]})')
+    for r in results:
+        b = old.get(key(r))
+        if b is None:
+            continue
+        rate = 100.0 * (r['reports_per_sec'] / b['reports_per_sec'] - 1.0)
+        p99 = 100.0 * (r['p99_us'] / b['p99_us'] - 1.0) if b['p99_us'] else float('nan')
+        print(f'{r["mode"]:<6} {r["function"]:<9} {r["backend"]:<12} reports/s {rate:+7.1f}%  p99 {p99:+7.1f}%')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'HID pipeline benchmark')
+    parser.add_argument('--reports', '-n', type = int, default = 10000, help = 'messages per run')
+    parser.add_argument('--functions', nargs = '+', choices = list(FUNCTIONS), default = list(FUNCTIONS))
+    parser.add_argument('--backends', nargs = '+', choices = BACKENDS, default = list(BACKENDS))
+    parser.add_argument('--modes', nargs = '+', choices = ['unit', 'graph'], default = ['unit', 'graph'])
+    parser.add_argument('--output', '-o', type = Path, default = None, help = 'save results as JSON')
+    parser.add_argument('--compare', type = Path, default = None, help = 'JSON results to compare against')
+
+    class Args:
+        reports: int
+        functions: typing.List[str]
+        backends: typing.List[str]
+        modes: typing.List[str]
+        output: typing.Optional[Path]
+        compare: typing.Optional[Path]
+
+    args = parser.parse_args(namespace = Args)
+
+    results: typing.List[typing.Dict[str, typing.Any]] = []
+    print(f'{"mode":<6} {"function":<9} {"backend":<12} {"reports/s":>10} {"p50 us":>9} {"p99 us":>9} {"max us":>9}')
+    with tempfile.TemporaryDirectory(dir = '/dev/shm' if Path('/dev/shm').is_dir() else None) as tmp:
+        tmpdir = Path(tmp)
+        (tmpdir / 'ezmsg-gadget.conf').write_text(CONFIG)
+        for mode in args.modes:
+            for function in args.functions:
+                for backend in args.backends:
+                    if mode == 'unit':
+                        r = asyncio.run(bench_unit(function, backend, args.reports, tmpdir))
+                    else:
+                        r = bench_graph(function, backend, args.reports, tmpdir)
+                    r = {'mode': mode, 'function': function, 'backend': backend, 'n': args.reports, **r}
+                    results.append(r)
+                    print(
+                        f'{mode:<6} {function:<9} {backend:<12} {r["reports_per_sec"]:>10.0f} '
+                        f'{r["p50_us"]:>9.1f} {r["p99_us"]:>9.1f} {r["max_us"]:>9.1f}'
+                    )
+
+    if args.compare is not None:
+        compare(results, args.compare)
+
+    if args.output is not None:
+        args.output.write_text(json.dumps({
+            'meta': {
+                'version': __version__,
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'machine': platform.machine(),
+            },
+            'results': results
+        }, indent = 2))
+        print(f'\nSaved {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# Throughput of 'ezmsg-gadget serve' from socket to a local fake hidg node.
+#
+# A sender process blasts N mouse packets (raw, or field-encoded with
+# --fields) at a ReportServer over its Unix datagram socket or UDP; the
+# server writes them into a tmpfs file standing in for /dev/hidgN.  Reported
+# are packets written per second and how many the socket dropped (a
+# datagram socket drops whatever its receive buffer can't hold).  The sender
+# paces itself with --rate (packets/s; 0 = as fast as possible).
+#
+# $ python benchmarks/bench_serve.py -n 100000 --transport unix
+# $ python benchmarks/bench_serve.py -n 100000 --transport udp --fields --rate 20000
+
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import tempfile
+import time
+import typing
+
+from pathlib import Path
+
+from ezmsg.gadget.config import GadgetConfig
+from ezmsg.gadget.function import Mouse
+from ezmsg.gadget.serve import ReportServer, encode_packet, encode_fields, listen
+
+CONFIG = '[function.Mouse.mouse0]\n'
+
+
+def _send(family: int, addr: typing.Any, packets: int, rate: float, fields: bool) -> None:
+    if fields:
+        packet = encode_packet(0, encode_fields(0x01, 100, -100, 0), fields = True)
+    else:
+        packet = encode_packet(0, Mouse.Message(buttons = 0x01, relative_x = 0.01).report())
+    period = 1.0 / rate if rate else 0.0
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        start = time.perf_counter()
+        for i in range(packets):
+            if period:
+                while time.perf_counter() < start + i * period:
+                    pass
+            sock.sendto(packet, addr)
+
+
+async def bench(tmpdir: Path, transport: str, packets: int, rate: float, fields: bool) -> typing.Dict[str, float]:
+    config_path = tmpdir / 'ezmsg-gadget.conf'
+    config_path.write_text(CONFIG)
+    node = tmpdir / 'hidg0'
+    node.touch()
+    server = await ReportServer.open(GadgetConfig(config_path), device_paths = {'mouse0': node})
+
+    unix_path = tmpdir / 'serve.sock' if transport == 'unix' else None
+    udp_addr = ('127.0.0.1', 0) if transport == 'udp' else None
+    transports = await listen(server, unix_path, udp_addr)
+    if transport == 'unix':
+        family, addr = socket.AF_UNIX, str(unix_path)
+    else:
+        family, addr = socket.AF_INET, transports[0].get_extra_info('sockname')
+
+    sender = multiprocessing.Process(target = _send, args = (family, addr, packets, rate, fields))
+    try:
+        start = None
+        sender.start()
+        while sender.is_alive() or server.counters.received < packets:
+            if start is None and server.counters.received:
+                start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            if not sender.is_alive():
+                # Let the socket buffer drain, then stop waiting for drops
+                before = server.counters.received
+                await asyncio.sleep(0.1)
+                if server.counters.received == before:
+                    break
+        elapsed = time.perf_counter() - (start or time.perf_counter())
+    finally:
+        sender.join()
+        for t in transports:
+            t.close()
+        server.close()
+
+    return {
+        'written': server.counters.written,
+        'dropped': packets - server.counters.received,
+        'packets_per_sec': server.counters.written / elapsed if elapsed else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'ezmsg-gadget serve throughput benchmark')
+    parser.add_argument('--packets', '-n', type = int, default = 100000)
+    parser.add_argument('--transport', choices = ['unix', 'udp'], default = 'unix')
+    parser.add_argument('--rate', type = float, default = 0.0, help = 'sender packets/s; 0 = unpaced')
+    parser.add_argument('--fields', action = 'store_true', help = 'send field-encoded reports')
+
+    class Args:
+        packets: int
+        transport: str
+        rate: float
+        fields: bool
+
+    args = parser.parse_args(namespace = Args)
+
+    with tempfile.TemporaryDirectory(dir = '/dev/shm' if Path('/dev/shm').is_dir() else None) as tmpdir:
+        r = asyncio.run(bench(Path(tmpdir), args.transport, args.packets, args.rate, args.fields))
+    encoding = 'fields' if args.fields else 'raw'
+    print(f'{"transport":<10} {"payload":<7} {"packets/s":>10} {"written":>8} {"dropped":>8}')
+    print(f'{args.transport:<10} {encoding:<7} {r["packets_per_sec"]:>10.0f} {r["written"]:>8} {r["dropped"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
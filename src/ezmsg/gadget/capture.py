@@ -0,0 +1,190 @@
+import asyncio
+import mmap
+import os
+import struct
+import time
+import typing
+
+from pathlib import Path
+
+import ezmsg.core as ez
+
+from .message import RawReport
+
+# Append-only capture of everything written to hidg nodes.  The file is a
+# magic header followed by records of
+#   [monotonic timestamp (f64), name length (u8), report length (u16), name, report]
+# Several HIDDevices (even in different processes) can append to one file;
+# each flush is a single O_APPEND write, so records never interleave, but
+# records from different writers are only ordered to within a flush.
+
+CAPTURE_MAGIC = b'EZHIDCAP\x01'
+CAPTURE_FLUSH_PERIOD = 0.05 # sec between flushes from the write path's buffer
+
+# capture_origin assumes no writer's flush lands more than this many sec
+# after its records were taken (executor saturation, a suspended process)
+CAPTURE_ORIGIN_MARGIN = 10.0 # sec
+
+_RECORD = struct.Struct('<dBH')
+
+
+class CaptureRecord(typing.NamedTuple):
+    timestamp: float # time.monotonic() when the write completed
+    function_name: str
+    report: bytes
+
+
+class CaptureWriter:
+    # Records are buffered in memory by record() (cheap; called right after
+    # each write) and written out by flush() from a background task
+
+    path: Path
+    _fd: int
+    _name: bytes
+    _pending: bytearray
+
+    def __init__(self, path: Path, function_name: str) -> None:
+        self.path = path
+        self._name = function_name.encode('utf-8')
+        if len(self._name) > 255:
+            raise ValueError(f'Function name {function_name} is too long to capture')
+        self._pending = bytearray()
+
+        # Link a file that already has the header into place so a concurrent
+        # writer can never append a record ahead of the header
+        path.parent.mkdir(parents = True, exist_ok = True)
+        header = path.with_name(f'.{path.name}.{os.getpid()}.{function_name}')
+        header.write_bytes(CAPTURE_MAGIC)
+        try:
+            os.link(header, path)
+        except FileExistsError:
+            pass
+        finally:
+            header.unlink()
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+
+    def record(self, timestamp: float, report: typing.Union[bytes, bytearray, memoryview]) -> None:
+        self._pending += _RECORD.pack(timestamp, len(self._name), len(report))
+        self._pending += self._name
+        self._pending += report
+
+    async def flush(self) -> None:
+        if self._pending:
+            chunk, self._pending = self._pending, bytearray()
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, os.write, self._fd, chunk)
+
+    def close(self) -> None:
+        if self._pending:
+            os.write(self._fd, self._pending)
+            self._pending = bytearray()
+        os.close(self._fd)
+
+
+def read_capture(path: Path, function_name: typing.Optional[str] = None) -> typing.Iterator[CaptureRecord]:
+    # Stream records straight out of a memory map; nothing is loaded up front
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size <= len(CAPTURE_MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+            if mm[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+                raise ValueError(f'{path} is not an ezmsg-gadget capture')
+
+            name = None if function_name is None else function_name.encode('utf-8')
+            offset = len(CAPTURE_MAGIC)
+            while offset + _RECORD.size <= len(mm):
+                timestamp, name_len, report_len = _RECORD.unpack_from(mm, offset)
+                start = offset + _RECORD.size
+                end = start + name_len + report_len
+                if end > len(mm):
+                    break # Partially written final record
+                record_name = mm[start:start + name_len]
+                if name is None or record_name == name:
+                    yield CaptureRecord(timestamp, record_name.decode('utf-8'), mm[start + name_len:end])
+                offset = end
+
+
+def capture_origin(path: Path, margin: float = CAPTURE_ORIGIN_MARGIN) -> typing.Optional[float]:
+    # Earliest timestamp in the file.  Every record is flushed within a flush
+    # period (give or take a stall of up to margin) of its timestamp, so once
+    # records are more than margin past the earliest seen, nothing earlier
+    # can follow.  A writer held up for longer than that can leave an earlier
+    # record further on; Replay warns if it meets one
+    origin: typing.Optional[float] = None
+    for record in read_capture(path):
+        if origin is not None and record.timestamp > origin + margin:
+            break
+        if origin is None or record.timestamp < origin:
+            origin = record.timestamp
+    return origin
+
+
+class ReplaySettings(ez.Settings):
+    path: Path
+    function_name: str
+
+    # time.monotonic() at which the first record in the file is replayed;
+    # give every Replay reading the same file the same start to keep them
+    # in sync.  None starts as soon as the unit does.
+    start: typing.Optional[float] = None
+
+    # Capture timestamp replayed at start; None uses capture_origin(path),
+    # which is only the earliest if no writer's flush stalled for longer than
+    # CAPTURE_ORIGIN_MARGIN.  Records before origin are replayed right away
+    origin: typing.Optional[float] = None
+    speed: float = 1.0
+
+    def __post_init__(self) -> None:
+        if not self.speed > 0:
+            raise ValueError(f'Replay speed must be positive, not {self.speed}')
+
+
+class Replay(ez.Unit):
+    # Streams one function's captured reports back on the original schedule;
+    # connect OUTPUT_HID to the matching HIDDevice.INPUT_HID
+
+    SETTINGS = ReplaySettings
+
+    OUTPUT_HID = ez.OutputStream(RawReport)
+
+    @ez.publisher(OUTPUT_HID)
+    async def replay(self) -> typing.AsyncGenerator:
+        start = self.SETTINGS.start if self.SETTINGS.start is not None else time.monotonic()
+
+        origin = self.SETTINGS.origin
+        if origin is None:
+            origin = capture_origin(self.SETTINGS.path)
+            if origin is None:
+                return # Empty capture
+
+        early = False
+        for record in read_capture(self.SETTINGS.path, self.SETTINGS.function_name):
+            if record.timestamp < origin and not early:
+                early = True
+                ez.logger.warning(
+                    f'{self.SETTINGS.function_name} record in {self.SETTINGS.path} is {origin - record.timestamp:.3f} sec '
+                    f'before the replay origin (a flush stalled for over {CAPTURE_ORIGIN_MARGIN} sec?); '
+                    'replaying it right away, out of step with the other functions'
+                )
+            due = start + (record.timestamp - origin) / self.SETTINGS.speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield self.OUTPUT_HID, RawReport(record.report)
+
+        ez.logger.info(f'Finished replaying {self.SETTINGS.function_name} from {self.SETTINGS.path}')
+
+
+def replay_units(
+    path: Path,
+    function_names: typing.Iterable[str],
+    speed: float = 1.0,
+    delay: float = 1.0
+) -> typing.Dict[str, Replay]:
+    # One Replay per function, all aligned to start `delay` sec from now
+    start = time.monotonic() + delay
+    origin = capture_origin(path)
+    return {
+        name: Replay(ReplaySettings(path = path, function_name = name, start = start, origin = origin, speed = speed))
+        for name in function_names
+    }
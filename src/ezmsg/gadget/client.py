@@ -0,0 +1,230 @@
+import asyncio
+import concurrent.futures
+import os
+import time
+import typing
+
+from pathlib import Path
+
+from usb_gadget import HIDFunction
+
+from .config import GadgetConfig
+from .discovery import discover
+from .function import Composite
+from .handle import HIDHandle, open_handle, BACKEND_NONBLOCKING
+from .message import HIDMessage, split_reports
+
+# Write reports straight to the gadget's /dev/hidgN nodes from the calling
+# process, without an ezmsg graph or GraphServer.  Functions are named as in
+# the config file and opened on first use (or up front with open()); their
+# handles stay open until close().  Nothing coordinates with an endpoint
+# writing to the same node, so don't run both against one function.
+#
+#   with GadgetClient() as gadget:
+#       gadget.send('keyboard0', Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A))
+#       gadget.send('keyboard0', Keyboard.Message())
+
+
+class _Function:
+    # Encoding state for one opened function
+
+    name: str
+    path: Path
+    composite: typing.Optional[typing.Type[Composite]] # Routes messages by report ID
+    report_length: int
+    buffer: bytearray # Reused for every report encoded for this function
+
+    def __init__(self, config: GadgetConfig, name: str, path: Path) -> None:
+        function_type, _ = config.function(name) or (None, {})
+        if function_type is None or not issubclass(function_type, HIDFunction):
+            raise KeyError(f'{name} is not a HID function in {config.path}')
+        self.name = name
+        self.path = path
+        self.composite = function_type if issubclass(function_type, Composite) else None
+        self.report_length = getattr(function_type, 'REPORT_LENGTH', 0)
+        self.buffer = bytearray(64) # Max interrupt packet size for full-speed HID
+
+    def encode(self, msg: HIDMessage) -> typing.List[typing.Tuple[memoryview, typing.Optional[float]]]:
+        return self.encode_batch((msg,))
+
+    def encode_batch(self, msgs: typing.Iterable[HIDMessage]) -> typing.List[typing.Tuple[memoryview, typing.Optional[float]]]:
+        # Every report (one per write; hidg truncates each write to
+        # report_length) with the time.time() it is due, or None for right
+        # away, as HIDDevice schedules them.  All share one buffer
+        if self.composite is not None:
+            msgs = [self.composite.route(msg) for msg in msgs]
+        else:
+            msgs = list(msgs)
+        size = sum(msg.report_size() for msg in msgs)
+        if size > len(self.buffer):
+            self.buffer = bytearray(size)
+        view = memoryview(self.buffer)
+        reports: typing.List[typing.Tuple[memoryview, typing.Optional[float]]] = []
+        offset = 0
+        for msg in msgs:
+            end = offset + msg.report_into(self.buffer, offset)
+            split = self._split(view[offset:end])
+            schedule = msg.schedule()
+            if schedule is None:
+                reports.extend((report, None) for report in split)
+            else:
+                reports.extend(zip(split, schedule))
+            offset = end
+        return reports
+
+    def _split(self, reports: memoryview) -> typing.List[memoryview]:
+        if self.composite is not None:
+            return list(self.composite.split(reports))
+        return split_reports(reports, self.report_length)
+
+
+def _delay(when: typing.Optional[float]) -> float:
+    # sec until a report is due; overdue reports go right away
+    return 0.0 if when is None else when - time.time()
+
+
+def _hid_functions(config: GadgetConfig) -> typing.Tuple[str, ...]:
+    return tuple(name for name, (ty, _) in config.functions.items() if issubclass(ty, HIDFunction))
+
+
+async def _locate(config: GadgetConfig, name: str, device_paths: typing.Dict[str, Path]) -> Path:
+    path = device_paths.get(name, None)
+    return await discover(config, name) if path is None else Path(path)
+
+
+def _locate_blocking(config: GadgetConfig, name: str, device_paths: typing.Dict[str, Path]) -> Path:
+    # Discovery on its own loop in a worker thread, so a GadgetClient also
+    # works from code that is already running an event loop
+    with concurrent.futures.ThreadPoolExecutor(max_workers = 1) as pool:
+        return pool.submit(asyncio.run, _locate(config, name, device_paths)).result()
+
+
+class AsyncGadgetClient:
+
+    config: GadgetConfig
+    backend: str
+
+    def __init__(
+            self,
+            config_path: typing.Optional[Path] = None,
+            backend: str = BACKEND_NONBLOCKING,
+            device_paths: typing.Optional[typing.Dict[str, Path]] = None
+        ) -> None:
+        # backend defaults to nonblocking: writes go straight from the caller's
+        # event loop.  device_paths overrides discovery per function name
+        self.config = GadgetConfig(config_path)
+        self.backend = backend
+        self._device_paths = dict(device_paths or {})
+        # Each function's lock is held from encoding until its last report is
+        # written: the encode buffer is shared, and a nonblocking handle
+        # waits for one writer per descriptor at a time
+        self._functions: typing.Dict[str, typing.Tuple[_Function, HIDHandle, asyncio.Lock]] = {}
+
+    async def open(self, *names: str) -> None:
+        # Open the named functions (all HID functions by default) ahead of time
+        names = names or _hid_functions(self.config)
+        await asyncio.gather(*[self._function(name) for name in names])
+
+    async def _function(self, name: str) -> typing.Tuple[_Function, HIDHandle, asyncio.Lock]:
+        opened = self._functions.get(name, None)
+        if opened is None:
+            path = await _locate(self.config, name, self._device_paths)
+            function = _Function(self.config, name, path)
+            handle = await open_handle(path, self.backend)
+            opened = self._functions.get(name, None)
+            if opened is not None:
+                await handle.close() # Opened concurrently by another send
+            else:
+                opened = self._functions[name] = (function, handle, asyncio.Lock())
+        return opened
+
+    async def send(self, name: str, msg: HIDMessage) -> None:
+        function, handle, lock = await self._function(name)
+        async with lock:
+            await self._write_all(handle, function.encode(msg))
+
+    async def batch(self, name: str, msgs: typing.Iterable[HIDMessage]) -> None:
+        # Written in order, one report per write, as fast as the host takes
+        # them; timestamped samples (e.g. Mouse.Batch) each wait for their time
+        function, handle, lock = await self._function(name)
+        async with lock:
+            await self._write_all(handle, function.encode_batch(msgs))
+
+    async def _write_all(self, handle: HIDHandle, reports: typing.List[typing.Tuple[memoryview, typing.Optional[float]]]) -> None:
+        for report, when in reports:
+            delay = _delay(when)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await handle.write(report)
+
+    async def close(self) -> None:
+        functions, self._functions = self._functions, {}
+        for _, handle, _ in functions.values():
+            await handle.close()
+
+    async def __aenter__(self) -> "AsyncGadgetClient":
+        return self
+
+    async def __aexit__(self, *exc_info: typing.Any) -> None:
+        await self.close()
+
+
+class GadgetClient:
+    # Blocking counterpart of AsyncGadgetClient: each write is a plain os.write
+    # on a blocking descriptor, returning once the kernel has queued the report
+
+    config: GadgetConfig
+
+    def __init__(
+            self,
+            config_path: typing.Optional[Path] = None,
+            device_paths: typing.Optional[typing.Dict[str, Path]] = None
+        ) -> None:
+        self.config = GadgetConfig(config_path)
+        self._device_paths = dict(device_paths or {})
+        self._functions: typing.Dict[str, typing.Tuple[_Function, int]] = {}
+
+    def open(self, *names: str) -> None:
+        names = names or _hid_functions(self.config)
+        for name in names:
+            self._function(name)
+
+    def _function(self, name: str) -> typing.Tuple[_Function, int]:
+        opened = self._functions.get(name, None)
+        if opened is None:
+            path = _locate_blocking(self.config, name, self._device_paths)
+            function = _Function(self.config, name, path)
+            opened = self._functions[name] = (function, os.open(str(path), os.O_RDWR))
+        return opened
+
+    def send(self, name: str, msg: HIDMessage) -> None:
+        function, fd = self._function(name)
+        _write_all(fd, function.encode(msg))
+
+    def batch(self, name: str, msgs: typing.Iterable[HIDMessage]) -> None:
+        function, fd = self._function(name)
+        _write_all(fd, function.encode_batch(msgs))
+
+    def close(self) -> None:
+        functions, self._functions = self._functions, {}
+        for _, fd in functions.values():
+            os.close(fd)
+
+    def __enter__(self) -> "GadgetClient":
+        return self
+
+    def __exit__(self, *exc_info: typing.Any) -> None:
+        self.close()
+
+
+def _write_all(fd: int, reports: typing.List[typing.Tuple[memoryview, typing.Optional[float]]]) -> None:
+    for report, when in reports:
+        delay = _delay(when)
+        if delay > 0:
+            time.sleep(delay)
+        _write(fd, report)
+
+
+def _write(fd: int, report: memoryview) -> None:
+    while report:
+        report = report[os.write(fd, report):]
@@ -1,30 +1,87 @@
 import argparse
+import asyncio
+import os
 import typing
-import subprocess
-import traceback
 
 from pathlib import Path
 
-import ezmsg.core as ez
+from . import simulate
+from .config import GadgetConfig, USBGadget, GADGET_PATH, setup_gadget
+from .reconcile import diff_gadget, apply_gadget_diff
+from .discovery import discover_all
+from .install import install, uninstall
+from .stats import read_stats, format_stats
 
-from usb_gadget import HIDFunction
+# Each subcommand imports what only it needs (the endpoint, report codecs,
+# ...), so e.g. 'ezmsg-gadget stats' starts without loading any of it
+if typing.TYPE_CHECKING:
+    from .startup import PhaseTimer
 
-from .config import GadgetConfig, setup_gadget
-from .install import install, uninstall
-from .hiddevice import hid_devices
+def activate(config_path: typing.Optional[Path] = None, timer: typing.Optional["PhaseTimer"] = None) -> GadgetConfig:
+    from .startup import PhaseTimer
+
+    timer = PhaseTimer() if timer is None else timer
+
+    with timer.phase('config parse'):
+        config = GadgetConfig(config_path)
+        if not config.from_snapshot:
+            # Later CLI calls and the endpoint can skip parsing; needs write access
+            try:
+                config.write_snapshot()
+            except OSError as e:
+                print(f'Could not write config snapshot {config.snapshot_path}: {e}')
+
+    with timer.phase('function import'):
+        config.functions
+
+    gadget_path = simulate.system_path(GADGET_PATH)
+    sim_root = simulate.simulation_root()
+    if sim_root is not None:
+        simulate.prepare(sim_root, gadget_path)
 
-def activate(config_path: typing.Optional[Path] = None) -> None:
+    # Reconcile with whatever is already there instead of rebuilding it
+    gadget_dir = gadget_path / config.gadget_name
+    with timer.phase('configfs writes'):
+        diff = diff_gadget(config, gadget_dir)
+        udc = gadget_dir / 'UDC'
+        bound = udc.is_file() and bool(udc.read_text().strip())
 
-    gadget, functions = setup_gadget(config_path = config_path)
+        if bound and diff.changed:
+            print('Unbinding gadget to apply changes')
+            if sim_root is None:
+                udc.write_text('\n')
+            else:
+                simulate.unbind(sim_root, gadget_dir)
 
-    print('Activating Gadget')
-    gadget.activate()
+        if not bound or diff.changed:
+            print(
+                f'Writing {len(diff.attributes)} attributes, {len(diff.links)} links; '
+                f'removing {len(diff.removed)} functions'
+            )
+            apply_gadget_diff(gadget_dir, diff)
+
+    if bound and not diff.changed:
+        print('Gadget is up to date; leaving it bound')
+    else:
+        with timer.phase('udc bind'):
+            print('Activating Gadget')
+            gadget = USBGadget(config.gadget_name, path = str(gadget_path))
+            if sim_root is None:
+                gadget.activate()
+            else:
+                gadget.activate(simulate.udc_ports(sim_root)[0])
+                simulate.bind(sim_root, gadget_dir)
+
+    with timer.phase('discovery'):
+        nodes = asyncio.run(discover_all(config))
 
     # Change permissions of associated HID devices
-    for fn_name, function in functions.items():
-        if isinstance(function, HIDFunction):
-            print(f'Changing permissions on {fn_name} -> {function.device}')
-            subprocess.run(f'chmod 777 {function.device}', shell = True)
+    with timer.phase('chmod'):
+        for fn_name, device in nodes.items():
+            print(f'Changing permissions on {fn_name} -> {device}')
+            os.chmod(device, 0o777)
+
+    return config
 
 
 def deactivate(config_path: typing.Optional[Path] = None) -> None:
@@ -32,23 +89,65 @@ def deactivate(config_path: typing.Optional[Path] = None) -> None:
     gadget, _ = setup_gadget(config_path = config_path, setup_functions = False)
 
     print('Deactivating Gadget')
-    gadget.deactivate()
-    gadget.destroy()
+    sim_root = simulate.simulation_root()
+    if sim_root is None:
+        gadget.deactivate()
+        gadget.destroy()
+    else:
+        simulate.destroy(sim_root, Path(gadget.path))
 
 
 def endpoint(config_path: typing.Optional[Path] = None) -> None:
+    # Reconnects whenever the GraphServer goes away and comes back (see supervisor)
+    from .supervisor import supervise
+
+    config = GadgetConfig(config_path)
+    supervise(config, reconnect_timeout = config.endpoint_reconnect_timeout)
+
+
+def replay(config_path: typing.Optional[Path], capture_path: Path, speed: float = 1.0) -> None:
+    import ezmsg.core as ez
+    from .capture import replay_units
+    from .hiddevice import hid_devices
+
+    config = GadgetConfig(config_path)
+    devices = hid_devices(config, capture = False)
+    replays = replay_units(capture_path, devices.keys(), speed = speed)
+    ez.logger.info(f'Replaying {capture_path} into {list(devices)} at {speed}x')
+
+    ez.run(
+        components = {
+            **devices,
+            **{f'{name}_replay': unit for name, unit in replays.items()}
+        },
+        connections = [(unit.OUTPUT_HID, devices[name].INPUT_HID) for name, unit in replays.items()]
+    )
+
+
+def profile(config_path: typing.Optional[Path] = None, output: typing.Optional[Path] = None) -> None:
+    # Runs activate, then an endpoint's startup, timing every phase
+    from .startup import PhaseTimer, profile_endpoint, profile_record, format_profile, save_profile
+
+    timer = PhaseTimer()
+    config = activate(config_path, timer)
+    asyncio.run(profile_endpoint(config, timer))
+
+    record = profile_record(timer, config, simulated = simulate.simulation_root() is not None)
+    print(format_profile(record))
+
+    output = config.endpoint_stats_dir / 'profile.json' if output is None else output
+    save_profile(record, output)
+    print(f'Saved {output}')
+
+
+def stats(config_path: typing.Optional[Path] = None) -> None:
     config = GadgetConfig(config_path)
-    devices = hid_devices(config)
-    ez.logger.info(f'Starting ezmsg graph with {devices=}')
-
-    try:
-        ez.run(
-            components = devices,
-            graph_address = config.endpoint_remote_addr
-        )
-    except OSError:
-        ez.logger.warning('Failed to connect to GraphServer')
-        traceback.print_exc()
+    stats_dir = config.endpoint_stats_dir
+    device_stats = read_stats(stats_dir)
+    if not device_stats:
+        print(f'No device stats in {stats_dir}; is an endpoint running with [endpoint] stats_period set?')
+        return
+    print(format_stats(device_stats))
         
 
 def cmdline() -> None:
@@ -59,7 +158,7 @@ def cmdline() -> None:
 
     parser.add_argument(
         'command',
-        choices = ['activate', 'deactivate', 'install', 'uninstall', 'endpoint']
+        choices = ['activate', 'deactivate', 'install', 'uninstall', 'endpoint', 'serve', 'stats', 'replay', 'profile']
     )
 
     parser.add_argument(
@@ -69,6 +168,29 @@ def cmdline() -> None:
         help = 'config file for gadget settings. default: /etc/ezmsg-gadget.conf'
     )
 
+    ## Replay Flags
+    parser.add_argument(
+        '--capture',
+        type = lambda x: Path(x),
+        default = None,
+        help = "capture file for 'replay' (see [endpoint] capture_path)"
+    )
+
+    parser.add_argument(
+        '--speed',
+        type = float,
+        default = 1.0,
+        help = "playback speed multiplier for 'replay'"
+    )
+
+    ## Profile Flags
+    parser.add_argument(
+        '--output', '-o',
+        type = lambda x: Path(x),
+        default = None,
+        help = "where 'profile' saves its JSON breakdown. default: <stats_dir>/profile.json"
+    )
+
     ## UN/Install Flags
     parser.add_argument(
         '--install-endpoint-service',
@@ -91,6 +213,9 @@ def cmdline() -> None:
     class Args:
         command: str
         config: typing.Optional[Path]
+        capture: typing.Optional[Path]
+        speed: float
+        output: typing.Optional[Path]
         install_endpoint_service: bool
         no_boot_service: bool
         yes: bool
@@ -121,5 +246,24 @@ def cmdline() -> None:
     elif args.command == 'endpoint':
         endpoint(args.config)
 
+    elif args.command == 'serve':
+        from .serve import serve
+        serve(args.config)
+
+    elif args.command == 'profile':
+        try:
+            profile(args.config, args.output)
+        except PermissionError:
+            print('Permission Error. Run this as superuser.')
+            raise
+
+    elif args.command == 'stats':
+        stats(args.config)
+
+    elif args.command == 'replay':
+        if args.capture is None:
+            parser.error("'replay' needs --capture")
+        replay(args.config, args.capture, args.speed)
+
 if __name__ == '__main__':
     cmdline()
\ No newline at end of file
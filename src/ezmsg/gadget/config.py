@@ -1,20 +1,30 @@
 import os
+import json
 import typing
 import importlib
 
-from functools import reduce
+from functools import reduce, lru_cache
 from configparser import ConfigParser
 
 from pathlib import Path
 
 from usb_gadget import USBGadget, USBFunction
 
+from . import simulate
+
 CONFIG_ENV = 'EZMSG_GADGET_CONFIG'
 CONFIG_PATH = Path(os.environ.get(CONFIG_ENV, '/etc/ezmsg-gadget.conf'))
 GADGET_PATH = Path('/sys/kernel/config/usb_gadget')
+STATS_PATH = Path('/tmp/ezmsg-gadget')
 
 _EN_US = '0x409'
 
+# Parsed config written next to the config file (e.g. by 'activate'), reused
+# until the config file or anything in its .d directory changes
+SNAPSHOT_SUFFIX = '.snapshot'
+_SNAPSHOT_VERSION = 1
+
+@lru_cache(maxsize = None)
 def _import_type(typestr: str) -> typing.Type[USBFunction]:
     module, name = typestr.split(":")
     module = importlib.import_module(module)
@@ -33,24 +43,86 @@ function_definition = typing.Dict[
     ]
 ]
 
+function_spec = typing.Dict[
+    str,
+    typing.Tuple[
+        str, # module:Class, not yet imported
+        typing.Dict[str, str]
+    ]
+]
+
+def _sources(config_path: Path) -> typing.List[Path]:
+    config_files = []
+    if config_path.exists() and config_path.is_file():
+        config_files.append(config_path)
+    config_dir = config_path.with_suffix('.d')
+    if config_dir.exists() and config_dir.is_dir():
+        for fname in sorted(config_dir.glob('*')):
+            config_files.append(fname)
+    return config_files
+
+def _fingerprint(config_path: Path) -> typing.List[typing.List[typing.Any]]:
+    # The .d directory's own mtime covers files being added or removed
+    fingerprint = []
+    for path in [config_path.with_suffix('.d')] + _sources(config_path):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        fingerprint.append([str(path), stat.st_mtime_ns, stat.st_size])
+    return fingerprint
+
 class GadgetConfig:
 
     parser: ConfigParser
+    path: Path
+    from_snapshot: bool # True if loaded from an up to date snapshot
 
     def __init__(self, config_path: typing.Optional[Path] = None):
         if config_path is None:
             config_path = Path('/') / CONFIG_PATH
-
-        config_files = []
-        if config_path.exists() and config_path.is_file():
-            config_files.append(config_path)
-        config_dir = config_path.with_suffix('.d')
-        if config_dir.exists() and config_dir.is_dir():
-            for fname in config_dir.glob('*'):
-                config_files.append(fname)
+        self.path = config_path
+        self._function_specs: typing.Optional[function_spec] = None
+        self._functions: typing.Optional[function_definition] = None
 
         self.parser = ConfigParser()
-        self.parser.read(config_files)
+        sections = self._read_snapshot()
+        self.from_snapshot = sections is not None
+        if sections is not None:
+            self.parser.read_dict(sections)
+        else:
+            self.parser.read(_sources(config_path))
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.path.with_name(self.path.name + SNAPSHOT_SUFFIX)
+
+    def _read_snapshot(self) -> typing.Optional[typing.Dict[str, typing.Dict[str, str]]]:
+        try:
+            snapshot = json.loads(self.snapshot_path.read_text())
+        except (OSError, ValueError):
+            return None
+        if snapshot.get('version', None) != _SNAPSHOT_VERSION:
+            return None
+        if snapshot.get('sources', None) != _fingerprint(self.path):
+            return None
+        return snapshot['sections']
+
+    def write_snapshot(self) -> Path:
+        # Written atomically so a concurrent reader never sees a partial file
+        sections = {'DEFAULT': dict(self.parser.defaults())}
+        for section in self.parser.sections():
+            sections[section] = dict(self.parser.items(section, raw = True))
+        snapshot = {
+            'version': _SNAPSHOT_VERSION,
+            'sources': _fingerprint(self.path),
+            'sections': sections
+        }
+        path = self.snapshot_path
+        temp = path.with_name(f'.{path.name}.{os.getpid()}')
+        temp.write_text(json.dumps(snapshot, indent = 2))
+        os.replace(temp, path)
+        return path
 
     @property
     def gadget_name(self) -> str:
@@ -63,30 +135,88 @@ class GadgetConfig:
         return remote_host, remote_port
     
     @property
-    def functions(self) -> function_definition:
-        functions: function_definition = {}
+    def endpoint_stats_period(self) -> typing.Optional[float]:
+        stats_period = self.parser.get('endpoint', 'stats_period', fallback = None)
+        return None if stats_period is None else float(stats_period)
 
-        for section in self.parser.sections():
-            tokens = section.split('.')
-            if tokens[0] == 'function':
-                name = tokens[-1]
-                function_classname = tokens[-2]
-                module = '.'.join(['ezmsg', 'gadget'] + tokens[:-2])
-                ty = _import_type(f'{module}:{function_classname}')
-                functions[name] = (ty, dict(**self.parser[section]))
+    @property
+    def endpoint_stats_dir(self) -> Path:
+        return Path(self.parser.get('endpoint', 'stats_dir', fallback = str(STATS_PATH)))
+    
+    @property
+    def endpoint_reconnect_timeout(self) -> typing.Optional[float]:
+        reconnect_timeout = self.parser.get('endpoint', 'reconnect_timeout', fallback = None)
+        return None if reconnect_timeout is None else float(reconnect_timeout)
+
+    @property
+    def endpoint_capture_path(self) -> typing.Optional[Path]:
+        capture_path = self.parser.get('endpoint', 'capture_path', fallback = None)
+        return None if capture_path is None else Path(capture_path)
+
+    @property
+    def serve_unix_path(self) -> typing.Optional[Path]:
+        # Set to nothing to disable
+        unix_path = self.parser.get('serve', 'unix_path', fallback = str(STATS_PATH / 'serve.sock'))
+        return Path(unix_path) if unix_path else None
 
-        return functions
+    @property
+    def serve_udp_addr(self) -> typing.Optional[typing.Tuple[str, int]]:
+        # UDP is only served if udp_port is set
+        udp_port = self.parser.get('serve', 'udp_port', fallback = None)
+        if udp_port is None:
+            return None
+        return self.parser.get('serve', 'udp_host', fallback = 'localhost'), int(udp_port)
+
+    @property
+    def function_specs(self) -> function_spec:
+        # Every configured function, without importing any of them
+        if self._function_specs is None:
+            self._function_specs = {}
+            for section in self.parser.sections():
+                tokens = section.split('.')
+                if tokens[0] == 'function':
+                    name = tokens[-1]
+                    function_classname = tokens[-2]
+                    module = '.'.join(['ezmsg', 'gadget'] + tokens[:-2])
+                    self._function_specs[name] = (f'{module}:{function_classname}', dict(**self.parser[section]))
+        return self._function_specs
+
+    def function(self, name: str) -> typing.Optional[typing.Tuple[typing.Type[USBFunction], typing.Dict[str, str]]]:
+        # One function's type and parameters, importing only its module
+        if self._functions is not None:
+            return self._functions.get(name, None)
+        spec = self.function_specs.get(name, None)
+        if spec is None:
+            return None
+        typestr, kwargs = spec
+        return _import_type(typestr), kwargs
+
+    @property
+    def functions(self) -> function_definition:
+        if self._functions is None:
+            self._functions = {
+                name: (_import_type(typestr), kwargs)
+                for name, (typestr, kwargs) in self.function_specs.items()
+            }
+        return self._functions
 
 def setup_gadget(
         config_path: typing.Optional[Path] = None, 
         setup_functions: bool = True,
-        gadget_path: Path = GADGET_PATH
+        gadget_path: typing.Optional[Path] = None,
+        config: typing.Optional[GadgetConfig] = None
     ) -> typing.Tuple[USBGadget, typing.Dict[str, USBFunction]]:
 
+    if gadget_path is None:
+        gadget_path = simulate.system_path(GADGET_PATH)
+        sim_root = simulate.simulation_root()
+        if sim_root is not None:
+            simulate.prepare(sim_root, gadget_path)
+
     if not gadget_path.exists():
         raise ValueError("Filesystem does not contain usb_gadget configfs")
     
-    cfg = GadgetConfig(config_path)
+    cfg = GadgetConfig(config_path) if config is None else config
 
     # Create gadget and set IDs
     # TODO: A lot more of this info could be brought in from the config file
@@ -103,17 +233,17 @@ def setup_gadget(
     strings.product = 'Multifunction ezmsg-gadget'
 
     # Create a config for the gadget
-    config = gadget['configs']['c.1']
-    config.bmAttributes = '0x80'
-    config.MaxPower = '250'
-    config['strings'][_EN_US].configuration = 'Config 1: ECM network'
+    usb_config = gadget['configs']['c.1']
+    usb_config.bmAttributes = '0x80'
+    usb_config.MaxPower = '250'
+    usb_config['strings'][_EN_US].configuration = 'Config 1: ECM network'
 
     functions: typing.Dict[str, USBFunction] = {}
 
     if setup_functions:
         for fn_name, (fn_type, kwargs) in cfg.functions.items():
             function = fn_type(gadget, fn_name, **kwargs)
-            gadget.link(function, config)
+            gadget.link(function, usb_config)
             functions[fn_name] = function
 
     return gadget, functions
\ No newline at end of file
@@ -0,0 +1,298 @@
+import typing
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from .reportspec import (
+    INPUT, OUTPUT, CONSTANT, VARIABLE,
+    PAGE_GENERIC_DESKTOP, PAGE_KEYBOARD, PAGE_LED, PAGE_BUTTON, PAGE_DIGITIZER,
+    USAGE_X, USAGE_Y, USAGE_WHEEL, USAGE_NUM_LOCK, USAGE_CAPS_LOCK, USAGE_SCROLL_LOCK,
+    USAGE_GENERIC_INDICATOR, USAGE_TIP_SWITCH, USAGE_IN_RANGE, USAGE_CONTACT_IDENTIFIER, USAGE_CONTACT_COUNT
+)
+
+# Parse REPORT_DESC bytes back into a field layout and decode captured
+# reports in bulk.  Source: Device Class Definition for HID 1.11, 6.2.2
+
+FEATURE = 'feature'
+
+# Item tags (prefix >> 4) per item type
+_MAIN_INPUT = 0x8
+_MAIN_OUTPUT = 0x9
+_MAIN_COLLECTION = 0xA
+_MAIN_FEATURE = 0xB
+_MAIN_END_COLLECTION = 0xC
+
+_GLOBAL_USAGE_PAGE = 0x0
+_GLOBAL_LOGICAL_MINIMUM = 0x1
+_GLOBAL_LOGICAL_MAXIMUM = 0x2
+_GLOBAL_REPORT_SIZE = 0x7
+_GLOBAL_REPORT_ID = 0x8
+_GLOBAL_REPORT_COUNT = 0x9
+_GLOBAL_PUSH = 0xA
+_GLOBAL_POP = 0xB
+
+_LOCAL_USAGE = 0x0
+_LOCAL_USAGE_MINIMUM = 0x1
+_LOCAL_USAGE_MAXIMUM = 0x2
+
+_TYPE_MAIN = 0
+_TYPE_GLOBAL = 1
+_TYPE_LOCAL = 2
+
+_DIRECTIONS = {_MAIN_INPUT: INPUT, _MAIN_OUTPUT: OUTPUT, _MAIN_FEATURE: FEATURE}
+
+_USAGE_NAMES = {
+    (PAGE_GENERIC_DESKTOP, USAGE_X): 'x',
+    (PAGE_GENERIC_DESKTOP, USAGE_Y): 'y',
+    (PAGE_GENERIC_DESKTOP, USAGE_WHEEL): 'wheel',
+    (PAGE_LED, USAGE_NUM_LOCK): 'num_lock',
+    (PAGE_LED, USAGE_CAPS_LOCK): 'caps_lock',
+    (PAGE_LED, USAGE_SCROLL_LOCK): 'scroll_lock',
+    (PAGE_LED, USAGE_GENERIC_INDICATOR): 'generic_indicator',
+    (PAGE_DIGITIZER, USAGE_TIP_SWITCH): 'tip_switch',
+    (PAGE_DIGITIZER, USAGE_IN_RANGE): 'in_range',
+    (PAGE_DIGITIZER, USAGE_CONTACT_IDENTIFIER): 'contact_id',
+    (PAGE_DIGITIZER, USAGE_CONTACT_COUNT): 'contact_count',
+}
+
+_PAGE_NAMES = {
+    PAGE_GENERIC_DESKTOP: 'desktop',
+    PAGE_KEYBOARD: 'key',
+    PAGE_LED: 'led',
+    PAGE_BUTTON: 'button',
+    PAGE_DIGITIZER: 'digitizer',
+}
+
+
+@dataclass(frozen = True)
+class DescriptorField:
+    # One data (non-constant) main item as laid out in its report
+    name: str
+    columns: typing.Tuple[str, ...] # decoded column per element (variable) or one (array)
+    direction: str
+    report_id: int # 0 if the descriptor doesn't use report IDs
+    bit_offset: int # from the start of the report, after any report ID byte
+    size: int # bits per element
+    count: int
+    usage_page: int
+    usages: typing.Tuple[int, ...] # one per element (variable) or all possible values (array)
+    logical_minimum: int
+    logical_maximum: int
+    flags: int
+
+    @property
+    def variable(self) -> bool:
+        return bool(self.flags & VARIABLE)
+
+    @property
+    def signed(self) -> bool:
+        return self.logical_minimum < 0
+
+    @property
+    def dtype(self) -> np.dtype:
+        for bits in (8, 16, 32, 64):
+            if self.size <= bits:
+                return np.dtype(f'{"i" if self.signed else "u"}{bits // 8}')
+        raise ValueError(f'{self.name} is wider than 64 bits')
+
+
+class DescriptorLayout:
+
+    fields: typing.Tuple[DescriptorField, ...]
+    report_ids: typing.Tuple[int, ...] # (0,) without report IDs
+    _bits: typing.Dict[typing.Tuple[str, int], int]
+
+    def __init__(self, fields: typing.Sequence[DescriptorField], bits: typing.Dict[typing.Tuple[str, int], int]) -> None:
+        self.fields = tuple(fields)
+        self._bits = bits
+        self.report_ids = tuple(sorted({report_id for _, report_id in bits})) or (0,)
+
+    def length(self, direction: str = INPUT, report_id: int = 0) -> int:
+        # Bytes per report, including the report ID byte if there is one
+        bits = self._bits.get((direction, report_id), 0)
+        if bits == 0:
+            return 0
+        return (bits + 7) // 8 + (1 if report_id else 0)
+
+    @property
+    def report_length(self) -> int:
+        # What hidg's report_length has to be to carry every report
+        return max(
+            [self.length(direction, report_id) for direction, report_id in self._bits] or [0]
+        )
+
+    def report_fields(self, direction: str = INPUT, report_id: int = 0) -> typing.List[DescriptorField]:
+        return [f for f in self.fields if f.direction == direction and f.report_id == report_id]
+
+    def dtype(self, direction: str = INPUT, report_id: int = 0) -> np.dtype:
+        columns: typing.List[typing.Tuple[typing.Any, ...]] = []
+        for field in self.report_fields(direction, report_id):
+            if field.variable:
+                columns += [(name, field.dtype) for name in field.columns]
+            else:
+                columns.append((field.columns[0], field.dtype, (field.count,)))
+        return np.dtype(columns)
+
+    def decode(self, buffer: typing.Union[bytes, bytearray, memoryview, np.ndarray], direction: str = INPUT, report_id: int = 0) -> np.ndarray:
+        # Decode many back-to-back reports into a structured array with a
+        # column per variable element and an (n, count) column per array
+        length = self.length(direction, report_id)
+        if length == 0:
+            raise ValueError(f'No {direction} report with ID {report_id}')
+
+        raw = np.frombuffer(buffer, dtype = np.uint8)
+        if raw.size % length != 0:
+            raise ValueError(f'{raw.size} bytes is not a whole number of {length} byte reports')
+        raw = raw.reshape(-1, length)
+        if report_id:
+            if np.any(raw[:, 0] != report_id):
+                raise ValueError(f'Not every report has report ID {report_id}')
+            raw = raw[:, 1:]
+
+        out = np.empty(raw.shape[0], dtype = self.dtype(direction, report_id))
+        for field in self.report_fields(direction, report_id):
+            values = np.stack([
+                _extract(raw, field.bit_offset + i * field.size, field.size, field.signed)
+                for i in range(field.count)
+            ], axis = 1).astype(field.dtype)
+            if field.variable:
+                for i, name in enumerate(field.columns):
+                    out[name] = values[:, i]
+            else:
+                out[field.columns[0]] = values
+        return out
+
+
+def _extract(raw: np.ndarray, bit: int, size: int, signed: bool) -> np.ndarray:
+    # Vectorized little-endian bitfield extraction from an (n, length) uint8 array
+    first, last = bit // 8, (bit + size - 1) // 8
+    value = np.zeros(raw.shape[0], dtype = np.uint64)
+    for k, byte in enumerate(range(first, last + 1)):
+        value |= raw[:, byte].astype(np.uint64) << np.uint64(8 * k)
+    value = (value >> np.uint64(bit % 8)) & np.uint64((1 << size) - 1)
+    if not signed:
+        return value
+    value = value.astype(np.int64)
+    return np.where(value >= (1 << (size - 1)), value - (1 << size), value)
+
+
+def _usage_name(page: int, usage: int) -> str:
+    name = _USAGE_NAMES.get((page, usage), None)
+    if name is not None:
+        return name
+    return f'{_PAGE_NAMES.get(page, f"page_{page:02x}")}_{usage:02x}'
+
+
+def parse_descriptor(desc: bytes) -> DescriptorLayout:
+    fields: typing.List[DescriptorField] = []
+    bits: typing.Dict[typing.Tuple[str, int], int] = {}
+    names: typing.Dict[str, int] = {}
+
+    state: typing.Dict[int, int] = {_GLOBAL_USAGE_PAGE: 0, _GLOBAL_REPORT_ID: 0}
+    stack: typing.List[typing.Dict[int, int]] = []
+    usages: typing.List[typing.Tuple[int, int]] = []
+    usage_minimum: typing.Optional[typing.Tuple[int, int]] = None
+
+    def full_usage(value: int, size: int) -> typing.Tuple[int, int]:
+        # 4 byte usages carry their own page in the high 16 bits
+        if size == 4:
+            return value >> 16, value & 0xffff
+        return state[_GLOBAL_USAGE_PAGE], value
+
+    def unique(name: str) -> str:
+        names[name] = names.get(name, 0) + 1
+        return name if names[name] == 1 else f'{name}_{names[name]}'
+
+    i = 0
+    while i < len(desc):
+        prefix = desc[i]
+        if prefix == 0xFE: # Long item; nothing standard uses these
+            i += 3 + desc[i + 1]
+            continue
+
+        size = (0, 1, 2, 4)[prefix & 0x3]
+        kind = (prefix >> 2) & 0x3
+        tag = prefix >> 4
+        data = bytes(desc[i + 1:i + 1 + size])
+        if len(data) != size:
+            raise ValueError(f'Truncated item at byte {i}')
+        value = int.from_bytes(data, 'little')
+        signed = int.from_bytes(data, 'little', signed = True) if size else 0
+        i += 1 + size
+
+        if kind == _TYPE_GLOBAL:
+            if tag == _GLOBAL_PUSH:
+                stack.append(dict(state))
+            elif tag == _GLOBAL_POP:
+                state = stack.pop()
+            elif tag in (_GLOBAL_LOGICAL_MINIMUM, _GLOBAL_LOGICAL_MAXIMUM):
+                state[tag] = signed
+            else:
+                state[tag] = value
+
+        elif kind == _TYPE_LOCAL:
+            if tag == _LOCAL_USAGE:
+                usages.append(full_usage(value, size))
+            elif tag == _LOCAL_USAGE_MINIMUM:
+                usage_minimum = full_usage(value, size)
+            elif tag == _LOCAL_USAGE_MAXIMUM and usage_minimum is not None:
+                page, maximum = full_usage(value, size)
+                usages += [(page, u) for u in range(usage_minimum[1], maximum + 1)]
+                usage_minimum = None
+
+        elif kind == _TYPE_MAIN and tag in _DIRECTIONS:
+            direction = _DIRECTIONS[tag]
+            report_id = state[_GLOBAL_REPORT_ID]
+            report_size = state.get(_GLOBAL_REPORT_SIZE, 0)
+            report_count = state.get(_GLOBAL_REPORT_COUNT, 0)
+            offset = bits.get((direction, report_id), 0)
+            bits[(direction, report_id)] = offset + report_size * report_count
+
+            if not value & CONSTANT and report_count > 0:
+                logical_minimum = state.get(_GLOBAL_LOGICAL_MINIMUM, 0)
+                logical_maximum = state.get(_GLOBAL_LOGICAL_MAXIMUM, 0)
+                if logical_maximum < logical_minimum:
+                    # Common descriptor bug: an unsigned maximum in too few bytes
+                    logical_maximum &= (1 << (8 * max(1, (logical_maximum.bit_length() + 7) // 8))) - 1
+
+                page = usages[0][0] if usages else state[_GLOBAL_USAGE_PAGE]
+                if value & VARIABLE:
+                    element_usages = tuple(
+                        usages[min(n, len(usages) - 1)][1] if usages else 0 for n in range(report_count)
+                    )
+                    if len(set(element_usages)) == report_count:
+                        columns = [_usage_name(page, u) for u in element_usages]
+                    else:
+                        base = _usage_name(page, element_usages[0])
+                        columns = [base] if report_count == 1 else [f'{base}_{n}' for n in range(report_count)]
+                    name = columns[0] if report_count == 1 else _PAGE_NAMES.get(page, f'page_{page:02x}')
+                else:
+                    element_usages = tuple(u for _, u in usages)
+                    name = _PAGE_NAMES.get(page, f'page_{page:02x}')
+                    columns = [name]
+
+                fields.append(DescriptorField(
+                    name = name,
+                    columns = tuple(unique(column) for column in columns),
+                    direction = direction,
+                    report_id = report_id,
+                    bit_offset = offset,
+                    size = report_size,
+                    count = report_count,
+                    usage_page = page,
+                    usages = element_usages,
+                    logical_minimum = logical_minimum,
+                    logical_maximum = logical_maximum,
+                    flags = value
+                ))
+
+            usages = []
+            usage_minimum = None
+
+        elif kind == _TYPE_MAIN:
+            # Collections and end collections also clear local state
+            usages = []
+            usage_minimum = None
+
+    return DescriptorLayout(fields, bits)
@@ -0,0 +1,123 @@
+import asyncio
+import time
+import typing
+
+from pathlib import Path
+
+from . import simulate
+from .config import GadgetConfig, GADGET_PATH
+
+# Map HID functions to their /dev/hidgN nodes straight from sysfs, the way
+# 'udevadm info -r -q name /sys/dev/char/<maj:min>' does, without forking.
+# All of a gadget's HID functions are resolved together, concurrently, the
+# first time any of them is asked for, in one pass that every caller waiting
+# at the same time shares; each function resolves (or times out) on its own.
+# Results are reused until the gadget is re-bound (its functions' dev
+# numbers change).
+
+DISCOVERY_TIMEOUT = 5.0 # sec to wait for udev to create a node after binding
+_POLL_PERIOD = 0.01
+
+# gadget dir -> function name -> (dev, node)
+_cache: typing.Dict[Path, typing.Dict[str, typing.Tuple[str, Path]]] = {}
+
+# function name -> (dev, node), or why it couldn't be resolved
+_Outcomes = typing.Dict[str, typing.Union[typing.Tuple[str, Path], Exception]]
+
+# gadget dir -> the discovery pass in flight for it
+_passes: typing.Dict[Path, "asyncio.Task[_Outcomes]"] = {}
+
+
+def _uevent(kobj: Path) -> typing.Dict[str, str]:
+    try:
+        text = (kobj / 'uevent').read_text()
+    except OSError:
+        return {}
+    return dict(line.split('=', 1) for line in text.splitlines() if '=' in line)
+
+
+def device_node(dev: str, root: typing.Optional[Path] = None) -> Path:
+    # /dev node for a char device number like '240:0' (see simulate.system_path)
+    kobj = simulate.system_path(Path('/sys/dev/char'), root) / dev.strip()
+    devname = _uevent(kobj).get('DEVNAME', None)
+    if devname is None:
+        raise FileNotFoundError(f'No device node for {dev} in {kobj}')
+    return simulate.system_path(Path('/dev'), root) / devname
+
+
+def _dev(gadget_dir: Path, function_name: str) -> str:
+    return (gadget_dir / 'functions' / f'hid.{function_name}' / 'dev').read_text().strip()
+
+
+async def _resolve(gadget_dir: Path, function_name: str, timeout: float) -> typing.Tuple[str, Path]:
+    # udev creates the node asynchronously after the UDC is bound
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            dev = _dev(gadget_dir, function_name)
+            node = device_node(dev)
+            if node.exists():
+                return dev, node
+        except FileNotFoundError:
+            pass
+        if time.monotonic() > deadline:
+            raise FileNotFoundError(f'No device node for HID function {function_name} after {timeout} sec')
+        await asyncio.sleep(_POLL_PERIOD)
+
+
+async def _discover_pass(gadget_dir: Path, names: typing.List[str], timeout: float) -> _Outcomes:
+    results = await asyncio.gather(*[_resolve(gadget_dir, name, timeout) for name in names], return_exceptions = True)
+    outcomes: _Outcomes = {}
+    cache = _cache.setdefault(gadget_dir, {})
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            cache.pop(name, None)
+        elif isinstance(result, BaseException):
+            raise result # Cancelled
+        else:
+            cache[name] = result
+        outcomes[name] = result
+    return outcomes
+
+
+async def _discover(config: GadgetConfig, timeout: float) -> _Outcomes:
+    # HID functions are the configured ones with a hid.<name> directory in
+    # the gadget, so no function module needs importing to tell them apart.
+    # Callers arriving while a pass is in flight (on this loop) join it
+    gadget_dir = simulate.system_path(GADGET_PATH) / config.gadget_name
+    task = _passes.get(gadget_dir, None)
+    if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+        functions_dir = gadget_dir / 'functions'
+        names = [name for name in config.function_specs if (functions_dir / f'hid.{name}').is_dir()]
+        task = asyncio.create_task(_discover_pass(gadget_dir, names, timeout))
+        _passes[gadget_dir] = task
+    # One caller giving up doesn't cancel the pass for the others
+    return await asyncio.shield(task)
+
+
+async def discover_all(config: GadgetConfig, timeout: float = DISCOVERY_TIMEOUT) -> typing.Dict[str, Path]:
+    # Every HID function's node; raises if any of them didn't show up
+    nodes: typing.Dict[str, Path] = {}
+    for name, outcome in (await _discover(config, timeout)).items():
+        if isinstance(outcome, Exception):
+            raise outcome
+        nodes[name] = outcome[1]
+    return nodes
+
+
+async def discover(config: GadgetConfig, function_name: str, timeout: float = DISCOVERY_TIMEOUT) -> Path:
+    gadget_dir = simulate.system_path(GADGET_PATH) / config.gadget_name
+    cached = _cache.get(gadget_dir, {}).get(function_name, None)
+    if cached is not None:
+        try:
+            if _dev(gadget_dir, function_name) == cached[0] and cached[1].exists():
+                return cached[1]
+        except OSError:
+            pass # Function went away; rediscover
+
+    outcome = (await _discover(config, timeout)).get(function_name, None)
+    if outcome is None:
+        raise KeyError(f'{function_name} is not a HID function of gadget {config.gadget_name} ({config.path})')
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome[1]
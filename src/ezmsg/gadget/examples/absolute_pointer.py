@@ -8,9 +8,10 @@ import ezmsg.core as ez
 
 from ezmsg.gadget.hiddevice import HIDDevice, HIDDeviceSettings
 from ezmsg.gadget.function import Touch
+from ezmsg.gadget.trajectory import TouchResampler, TouchResamplerSettings
 
 class TouchMessageGeneratorSettings(ez.Settings):
-    pub_rate: float = 60 # Hz
+    pub_rate: float = 30 # Hz; sparse targets, TouchResampler fills in the rest
 
 class TouchMessageGenerator(ez.Unit):
     SETTINGS = TouchMessageGeneratorSettings
@@ -40,6 +41,13 @@ if __name__ == '__main__':
 
     generator = TouchMessageGenerator()
 
+    resampler = TouchResampler(
+        TouchResamplerSettings(
+            rate = 250.0,
+            interpolation = 'spline'
+        )
+    )
+
     touch_device = HIDDevice(
         HIDDeviceSettings(
             function_name = 'touch0'
@@ -48,11 +56,10 @@ if __name__ == '__main__':
 
     ez.run(
         GENERATOR = generator,
+        RESAMPLER = resampler,
         MOUSE_DEVICE = touch_device,
         connections = (
-            (generator.OUTPUT, touch_device.INPUT_HID),
+            (generator.OUTPUT, resampler.INPUT_TARGET),
+            (resampler.OUTPUT_HID, touch_device.INPUT_HID),
         )
     )
-
-
-
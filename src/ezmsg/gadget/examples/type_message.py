@@ -1,56 +1,21 @@
-import asyncio
 import typing
 
 import ezmsg.core as ez
 
 from ezmsg.gadget.hiddevice import HIDDevice, HIDDeviceSettings
-from ezmsg.gadget.function import Keyboard
+from ezmsg.gadget.text import TypeText, TypeTextSettings, LAYOUTS, LAYOUT_US
 
 class GhostWriterSettings(ez.Settings):
     message: str
-    pub_rate: float = 3 # Hz
 
 class GhostWriter(ez.Unit):
     SETTINGS = GhostWriterSettings
 
-    OUTPUT = ez.OutputStream(Keyboard.Message)
+    OUTPUT = ez.OutputStream(str)
 
     @ez.publisher(OUTPUT)
-    async def push_buttons(self) -> typing.AsyncGenerator:
-        for character in self.SETTINGS.message:
-            control_keys = 0x00
-            keycode = 0x00
-
-            if character.isdigit():
-                keycode = ord(character) - ord('0') + Keyboard.KEYCODE_NUMBER_1
-            elif character.isalpha():
-                keycode = ord(character.lower()) - ord('a') + Keyboard.KEYCODE_A
-                if character.isupper():
-                    control_keys |= Keyboard.MODIFIER_LEFT_SHIFT
-            elif character == ' ':
-                keycode = Keyboard.KEYCODE_SPACEBAR
-            elif character == ',':
-                keycode = Keyboard.KEYCODE_COMMA
-            elif character == '.':
-                keycode = Keyboard.KEYCODE_PERIOD
-            else: # ?
-                keycode = Keyboard.KEYCODE_FORWARD_SLASH
-                control_keys |= Keyboard.MODIFIER_LEFT_SHIFT
-            
-            yield self.OUTPUT, Keyboard.Message(
-                control_keys = control_keys, 
-                hid_keycode = keycode
-            )
-
-            await asyncio.sleep(1.0 / self.SETTINGS.pub_rate)
-        
-        yield self.OUTPUT, Keyboard.Message(
-            control_keys = 0x00,
-            hid_keycode = Keyboard.KEYCODE_ENTER
-        )
-
-        await asyncio.sleep(1.0 / self.SETTINGS.pub_rate)
-
+    async def push_text(self) -> typing.AsyncGenerator:
+        yield self.OUTPUT, self.SETTINGS.message + '\n'
         raise ez.Complete
 
 if __name__ == '__main__':
@@ -62,12 +27,20 @@ if __name__ == '__main__':
     parser.add_argument(
         '--message', '-m',
         type = str,
-        help = 'message to type (keep it alphanumeric)',
+        help = 'message to type',
         default = 'Wake up, Neo...'
     )
 
+    parser.add_argument(
+        '--layout', '-l',
+        choices = list(LAYOUTS),
+        help = 'keyboard layout configured on the host',
+        default = LAYOUT_US
+    )
+
     class Args:
         message: str
+        layout: str
 
     args = parser.parse_args(namespace = Args)
 
@@ -77,6 +50,12 @@ if __name__ == '__main__':
         )
     )
 
+    typer = TypeText(
+        TypeTextSettings(
+            layout = args.layout
+        )
+    )
+
     keyboard_device = HIDDevice(
         HIDDeviceSettings(
             function_name = 'keyboard0'
@@ -85,11 +64,10 @@ if __name__ == '__main__':
 
     ez.run(
         GENERATOR = generator,
+        TYPER = typer,
         KEYBOARD_DEVICE = keyboard_device,
         connections = (
-            (generator.OUTPUT, keyboard_device.INPUT_HID),
+            (generator.OUTPUT, typer.INPUT_TEXT),
+            (typer.OUTPUT_HID, keyboard_device.INPUT_HID),
         )
     )
-
-
-
@@ -1,11 +1,43 @@
+import importlib
+import typing
+
 __all__ = [
+    'Composite',
     'Ethernet',
     'Keyboard',
     'Mouse',
+    'MultiTouch',
     'Touch'
 ]
 
-from .ethernet import Ethernet
-from .keyboard import Keyboard
-from .mouse import Mouse
-from .touch import Touch
\ No newline at end of file
+# Function modules (and the report codecs they compile) are only imported
+# when first used, so loading a config doesn't pay for unused functions
+_MODULES = {
+    'Composite': 'composite',
+    'Ethernet': 'ethernet',
+    'Keyboard': 'keyboard',
+    'Mouse': 'mouse',
+    'MultiTouch': 'multitouch',
+    'Touch': 'touch',
+}
+
+if typing.TYPE_CHECKING:
+    from .composite import Composite
+    from .ethernet import Ethernet
+    from .keyboard import Keyboard
+    from .mouse import Mouse
+    from .multitouch import MultiTouch
+    from .touch import Touch
+
+
+def __getattr__(name: str) -> typing.Any:
+    module = _MODULES.get(name, None)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> typing.List[str]:
+    return sorted(list(globals()) + __all__)
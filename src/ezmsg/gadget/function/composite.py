@@ -0,0 +1,129 @@
+import typing
+
+from dataclasses import dataclass
+
+from .hiddefinition import HIDDefinition
+from .keyboard import Keyboard
+from .mouse import Mouse
+from .touch import Touch
+from ..message import HIDMessage, RawReport
+from ..reportspec import ReportSpec
+
+# Several HID definitions behind one interface (and one /dev/hidgN), told
+# apart by report ID.  Each member keeps its own top-level collection with a
+# REPORT_ID item, so the host sees e.g. a keyboard, a mouse and a touch
+# screen; every report on the wire is prefixed with its member's ID.
+# Report IDs are assigned 1, 2, 3... in MEMBERS order.
+#
+# Subclass and override MEMBERS for a different set of functions:
+#   class KeyboardTouch(Composite):
+#       MEMBERS = (Keyboard, MultiTouch)
+
+
+@dataclass(frozen = True)
+class Routed(HIDMessage):
+    # A member's message, with its report ID prepended to each of its reports
+    report_id: int
+    length: int # bytes per member report, without the ID
+    message: HIDMessage
+
+    def report(self) -> bytearray:
+        buf = bytearray(self.report_size())
+        self.report_into(buf)
+        return buf
+
+    def report_size(self) -> int:
+        size = self.message.report_size()
+        return size + size // self.length
+
+    def report_into(self, buffer: bytearray, offset: int = 0) -> int:
+        # Encode in place after the first ID byte, then open a gap for each
+        # following ID, working backwards so nothing is overwritten
+        size = self.message.report_size()
+        count = size // self.length
+        if size % self.length:
+            raise ValueError(f'{type(self.message).__name__} encoded {size} bytes; expected whole {self.length} byte reports')
+        self.message.report_into(buffer, offset + 1)
+        for i in reversed(range(count)):
+            src = offset + 1 + i * self.length
+            dst = offset + i * (self.length + 1)
+            buffer[dst + 1:dst + 1 + self.length] = buffer[src:src + self.length]
+            buffer[dst] = self.report_id
+        return size + count
+
+    def schedule(self) -> typing.Optional[typing.Sequence[float]]:
+        return self.message.schedule()
+
+    def merge(self, other: HIDMessage) -> typing.Optional[HIDMessage]:
+        if not isinstance(other, Routed) or other.report_id != self.report_id:
+            return None
+        merged = self.message.merge(other.message)
+        return None if merged is None else Routed(self.report_id, self.length, merged)
+
+
+class Composite(HIDDefinition):
+
+    PROTOCOL: int = 0 # Not a boot device; report IDs aren't allowed in boot protocol
+    SUBCLASS: int = 0
+    MEMBERS: typing.Tuple[typing.Type[HIDDefinition], ...] = (Keyboard, Mouse, Touch)
+
+    # Generated from MEMBERS (see _compile)
+    SPECS: typing.Tuple[ReportSpec, ...]
+    REPORT_LENGTH: int
+    REPORT_DESC: bytes
+    _ROUTES: typing.Dict[type, typing.Tuple[int, int]] # message type -> (report ID, length)
+
+    def __init_subclass__(cls, **kwargs: typing.Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._compile()
+
+    @classmethod
+    def _compile(cls) -> None:
+        if len(cls.MEMBERS) > 255:
+            raise ValueError('At most 255 report IDs')
+        cls.SPECS = tuple(member.SPEC.with_report_id(i + 1) for i, member in enumerate(cls.MEMBERS))
+        cls.REPORT_LENGTH = max(spec.report_length for spec in cls.SPECS)
+        cls.REPORT_DESC = b''.join(spec.descriptor for spec in cls.SPECS)
+        cls._ROUTES = {}
+        for spec, member in zip(cls.SPECS, cls.MEMBERS):
+            for value in vars(member).values():
+                if isinstance(value, type) and issubclass(value, HIDMessage):
+                    cls._ROUTES[value] = (spec.report_id, spec.input.length)
+
+    @classmethod
+    def report_id(cls, member: typing.Type[HIDDefinition]) -> int:
+        return cls.MEMBERS.index(member) + 1
+
+    @classmethod
+    def route(cls, msg: HIDMessage) -> HIDMessage:
+        # Wrap a member's message so it is written with its report ID;
+        # RawReports are assumed to already carry theirs (e.g. a replay)
+        if isinstance(msg, (RawReport, Routed)):
+            return msg
+        for ty in type(msg).__mro__:
+            route = cls._ROUTES.get(ty, None)
+            if route is not None:
+                return Routed(route[0], route[1], msg)
+        raise TypeError(f'{cls.__name__} has no member for {type(msg).__name__}')
+
+    @classmethod
+    def split(cls, reports: memoryview) -> typing.Iterator[memoryview]:
+        # Back-to-back encoded reports, one at a time, each sized by its ID
+        offset = 0
+        while offset < len(reports):
+            report_id = reports[offset]
+            if not 0 < report_id <= len(cls.SPECS):
+                raise ValueError(f'{cls.__name__} has no report ID {report_id}')
+            end = offset + 1 + cls.SPECS[report_id - 1].input.length
+            yield reports[offset:end]
+            offset = end
+
+    @classmethod
+    def leds(cls, report: bytes) -> typing.Optional[int]:
+        # LED state from a keyboard member's output report, if this is one
+        if Keyboard not in cls.MEMBERS or len(report) < 2 or report[0] != cls.report_id(Keyboard):
+            return None
+        return report[1]
+
+
+Composite._compile()
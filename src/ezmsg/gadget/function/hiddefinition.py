@@ -1,16 +1,32 @@
 from usb_gadget import HIDFunction
 from usb_gadget.usb_gadget import USBGadget
 
+from ..descriptor import parse_descriptor
+from ..reportspec import ReportSpec
+
 class HIDDefinition(HIDFunction):
 
     PROTOCOL: int
     SUBCLASS: int
+    SPEC: ReportSpec # REPORT_LENGTH and REPORT_DESC are generated from this
     REPORT_LENGTH: int
     REPORT_DESC: bytes
 
     def __init__(self, gadget: USBGadget, name: str, **kwargs):
+        self.__class__.check_report_length()
         super().__init__(gadget, name)
         self.protocol = str(self.__class__.PROTOCOL)
         self.subclass = str(self.__class__.SUBCLASS)
         self.report_length = str(self.__class__.REPORT_LENGTH)
-        self.report_desc = self.__class__.REPORT_DESC
\ No newline at end of file
+        self.report_desc = self.__class__.REPORT_DESC
+
+    @classmethod
+    def check_report_length(cls) -> None:
+        # hidg truncates/pads every report to report_length, so a mismatch
+        # with the descriptor silently corrupts everything sent to the host
+        expected = parse_descriptor(cls.REPORT_DESC).report_length
+        if cls.REPORT_LENGTH != expected:
+            raise ValueError(
+                f'{cls.__name__}.REPORT_LENGTH is {cls.REPORT_LENGTH} '
+                f'but its REPORT_DESC describes {expected} byte reports'
+            )
@@ -1,46 +1,53 @@
 
+import struct
+import typing
+
 from dataclasses import dataclass
 
+import numpy as np
+
 from .hiddefinition import HIDDefinition
-from ..hiddevice import HIDMessage
+from .. import message
+from ..message import HIDMessage, FrozenMessage
+from ..reportspec import (
+    ReportSpec, Field, padding,
+    PAGE_GENERIC_DESKTOP, PAGE_KEYBOARD, PAGE_LED, USAGE_KEYBOARD,
+    USAGE_NUM_LOCK, USAGE_CAPS_LOCK, USAGE_SCROLL_LOCK, USAGE_GENERIC_INDICATOR,
+    DATA, ARRAY, ABSOLUTE, OUTPUT
+)
+
+_ROLLOVER_KEYS = 6
+
+_SPEC = ReportSpec(PAGE_GENERIC_DESKTOP, USAGE_KEYBOARD, [
+    # LED output report from the host
+    Field(
+        'leds', size = 1, count = 4, usage_page = PAGE_LED, direction = OUTPUT,
+        usages = (USAGE_NUM_LOCK, USAGE_CAPS_LOCK, USAGE_SCROLL_LOCK, USAGE_GENERIC_INDICATOR)
+    ),
+    padding(4, direction = OUTPUT),
+
+    # [modifiers, reserved, 6x key slots]
+    Field('control_keys', size = 1, count = 8, usage_page = PAGE_KEYBOARD, usage_minimum = 0xE0, usage_maximum = 0xE7),
+    padding(8),
+    Field(
+        'hid_keycodes', size = 8, count = _ROLLOVER_KEYS, usage_minimum = 0x00, usage_maximum = 0x91,
+        logical_maximum = 0xFF, flags = DATA | ARRAY | ABSOLUTE
+    ),
+])
+
+_REPORT = _SPEC.input.struct
+
+# [modifiers, reserved, key, 5x unused key slots] (+ all-zero release if tap)
+_PRESS = struct.Struct(f'<BxB{_SPEC.input.length - 3}x')
+_TAP = struct.Struct(f'<BxB{_SPEC.input.length - 3}x{_SPEC.input.length}x')
 
 class Keyboard(HIDDefinition):
 
     PROTOCOL: int = 1
     SUBCLASS: int = 1
-    REPORT_LENGTH: int = 8
-    REPORT_DESC: bytes = bytes([
-        0x05, 0x01,       # Usage Page (Generic Desktop Ctrls)
-        0x09, 0x06,       # Usage (Keyboard)
-        0xA1, 0x01,       # Collection (Application)
-        0x05, 0x08,       #   Usage Page (LEDs)
-        0x19, 0x01,       #   Usage Minimum (Num Lock)
-        0x29, 0x03,       #   Usage Maximum (Scroll Lock)
-        0x15, 0x00,       #   Logical Minimum (0)
-        0x25, 0x01,       #   Logical Maximum (1)
-        0x75, 0x01,       #   Report Size (1)
-        0x95, 0x03,       #   Report Count (3)
-        0x91, 0x02,       #   Output (Data,Var,Abs,No Wrap,Linear,Preferred State,No Null Position,Non-volatile)
-        0x09, 0x4B,       #   Usage (Generic Indicator)
-        0x95, 0x01,       #   Report Count (1)
-        0x91, 0x02,       #   Output (Data,Var,Abs,No Wrap,Linear,Preferred State,No Null Position,Non-volatile)
-        0x95, 0x04,       #   Report Count (4)
-        0x91, 0x01,       #   Output (Const,Array,Abs,No Wrap,Linear,Preferred State,No Null Position,Non-volatile)
-        0x05, 0x07,       #   Usage Page (Kbrd/Keypad)
-        0x19, 0xE0,       #   Usage Minimum (0xE0)
-        0x29, 0xE7,       #   Usage Maximum (0xE7)
-        0x95, 0x08,       #   Report Count (8)
-        0x81, 0x02,       #   Input (Data,Var,Abs,No Wrap,Linear,Preferred State,No Null Position)
-        0x75, 0x08,       #   Report Size (8)
-        0x95, 0x01,       #   Report Count (1)
-        0x81, 0x01,       #   Input (Const,Array,Abs,No Wrap,Linear,Preferred State,No Null Position)
-        0x19, 0x00,       #   Usage Minimum (0x00)
-        0x29, 0x91,       #   Usage Maximum (0x91)
-        0x26, 0xFF, 0x00, #   Logical Maximum (255)
-        0x95, 0x06,       #   Report Count (6)
-        0x81, 0x00,       #   Input (Data,Array,Abs,No Wrap,Linear,Preferred State,No Null Position)
-        0xC0,             # End Collection
-    ])
+    SPEC: ReportSpec = _SPEC
+    REPORT_LENGTH: int = _SPEC.report_length
+    REPORT_DESC: bytes = _SPEC.descriptor
 
     @dataclass
     class Message(HIDMessage):
@@ -49,10 +56,87 @@ class Keyboard(HIDDefinition):
         tap: bool = True
 
         def report(self) -> bytearray:
-            buf = [0] * 16 # 2x 8 Byte Reports, only if 'tap'
-            buf[0] = self.control_keys
-            buf[2] = self.hid_keycode
-            return bytearray(buf[:(16 if self.tap else 8)])
+            buf = bytearray(self.report_size()) # 2x 8 Byte Reports, only if 'tap'
+            self.report_into(buf)
+            return buf
+
+        def report_size(self) -> int:
+            return _TAP.size if self.tap else _PRESS.size
+
+        def report_into(self, buffer: bytearray, offset: int = 0) -> int:
+            encoder = _TAP if self.tap else _PRESS
+            encoder.pack_into(buffer, offset, self.control_keys, self.hid_keycode)
+            return encoder.size
+
+        def freeze(self) -> "Keyboard.Frozen":
+            return typing.cast(Keyboard.Frozen, Keyboard.Frozen.from_report(self.report()))
+
+    class Frozen(FrozenMessage):
+        # Immutable Message
+        __slots__ = ()
+        _FIELDS = ('control_keys', 'hid_keycode', 'tap')
+
+        def __init__(self, control_keys: int = 0x00, hid_keycode: int = 0x00, tap: bool = True) -> None:
+            self._freeze((_TAP if tap else _PRESS).pack(control_keys, hid_keycode))
+
+        @property
+        def control_keys(self) -> int:
+            return self._report[0]
+
+        @property
+        def hid_keycode(self) -> int:
+            return self._report[2]
+
+        @property
+        def tap(self) -> bool:
+            return len(self._report) == _TAP.size
+
+    @dataclass(frozen = True)
+    class Report(HIDMessage):
+        # A complete input report: the modifiers and (up to 6) keys
+        # that are held down right now.  Nothing is released implicitly.
+        control_keys: int = 0x00
+        hid_keycodes: typing.Tuple[int, ...] = ()
+
+        def __post_init__(self) -> None:
+            if len(self.hid_keycodes) > _ROLLOVER_KEYS:
+                raise ValueError(f'At most {_ROLLOVER_KEYS} keys can be reported at once')
+
+        def report(self) -> bytearray:
+            buf = bytearray(_REPORT.size)
+            self.report_into(buf)
+            return buf
+
+        def report_size(self) -> int:
+            return _REPORT.size
+
+        def report_into(self, buffer: bytearray, offset: int = 0) -> int:
+            keys = self.hid_keycodes + (0,) * (_ROLLOVER_KEYS - len(self.hid_keycodes))
+            _REPORT.pack_into(buffer, offset, self.control_keys, *keys)
+            return _REPORT.size
+
+    ROLLOVER_KEYS = _ROLLOVER_KEYS
+
+    LEDs = message.LEDs
+
+    # LED output report bits, in REPORT_DESC order
+    LED_NUM_LOCK = message.LED_NUM_LOCK
+    LED_CAPS_LOCK = message.LED_CAPS_LOCK
+    LED_SCROLL_LOCK = message.LED_SCROLL_LOCK
+    LED_GENERIC_INDICATOR = message.LED_GENERIC_INDICATOR
+
+    @staticmethod
+    def encode_batch(
+        control_keys: typing.Union[int, np.ndarray], 
+        hid_keycode: typing.Union[int, np.ndarray], 
+        tap: bool = True
+    ) -> bytes:
+        # Vectorized Message.report() for arrays of fields
+        control_keys, hid_keycode = np.broadcast_arrays(control_keys, hid_keycode)
+        reports = np.zeros((control_keys.size, 2 if tap else 1, 8), dtype = np.uint8)
+        reports[:, 0, 0] = control_keys.ravel()
+        reports[:, 0, 2] = hid_keycode.ravel()
+        return reports.tobytes()
         
     # Source: HID Usage Tables for USB, v1.21, section "10 - Keyboard/Keypad Page"
     # https://usb.org/sites/default/files/hut1_21.pdf
@@ -67,6 +151,7 @@ class Keyboard(HIDDefinition):
     MODIFIER_RIGHT_META = 1 << 7
 
     KEYCODE_NONE = 0
+    KEYCODE_ERROR_ROLLOVER = 0x01
     KEYCODE_A = 0x04
     KEYCODE_B = 0x05
     KEYCODE_C = 0x06
@@ -1,59 +1,47 @@
-from dataclasses import dataclass
+import struct
+import typing
+
+from dataclasses import dataclass, field
+
+import numpy as np
 
 from .hiddefinition import HIDDefinition
-from ..hiddevice import HIDMessage
+from ..message import HIDMessage, FrozenMessage
+from ..reportspec import (
+    ReportSpec, Field, Collection, padding,
+    PAGE_GENERIC_DESKTOP, PAGE_BUTTON, USAGE_MOUSE, USAGE_POINTER, USAGE_X, USAGE_Y, USAGE_WHEEL,
+    COLLECTION_PHYSICAL, DATA, VARIABLE, RELATIVE
+)
+
+_SPEC = ReportSpec(PAGE_GENERIC_DESKTOP, USAGE_MOUSE, [
+    # 3 buttons
+    Field('buttons', size = 1, count = 3, usage_page = PAGE_BUTTON, usage_minimum = 1, usage_maximum = 3),
+    padding(5),
+
+    # x, y, relative 16 bit
+    Collection(PAGE_GENERIC_DESKTOP, USAGE_POINTER, COLLECTION_PHYSICAL, (
+        Field('x', size = 16, usages = (USAGE_X,), logical_minimum = -32767, logical_maximum = 32767, flags = DATA | VARIABLE | RELATIVE),
+        Field('y', size = 16, usages = (USAGE_Y,), logical_minimum = -32767, logical_maximum = 32767, flags = DATA | VARIABLE | RELATIVE),
+    )),
 
-# This comes from LOGICAL_MAXIMUM in the mouse HID descriptor.
-# FIXME: Maybe couple these definitions together
-_MAX_MOUSE = (2 ** 15) - 1
+    # wheel, relative 8 bit
+    Field('wheel', size = 8, usages = (USAGE_WHEEL,), logical_minimum = -127, logical_maximum = 127, flags = DATA | VARIABLE | RELATIVE),
+])
+
+_MAX_MOUSE = _SPEC['x'].logical_maximum
+
+# [buttons, x (le16), y (le16), wheel]
+_REPORT = _SPEC.input.struct
+_REPORT_DTYPE = _SPEC.input.dtype
+_SIGNED = struct.Struct('<Bhhb') # _REPORT, decoded with signs
 
 class Mouse(HIDDefinition):
 
     PROTOCOL: int = 0
     SUBCLASS: int = 0
-    REPORT_LENGTH: int = 6
-    REPORT_DESC: bytes = bytes([
-        0x05, 0x01,         # USAGE_PAGE (Generic Desktop)
-        0x09, 0x02,         # USAGE (Mouse)
-        0xA1, 0x01,         # COLLECTION (Application)
-
-                            #   8-buttons
-        0x05, 0x09,         #   USAGE_PAGE (Button)
-        0x19, 0x01,         #   USAGE_MINIMUM (Button 1)
-        0x29, 0x03,         #   USAGE_MAXIMUM (Button 3)
-        0x15, 0x00,         #   LOGICAL_MINIMUM (0)
-        0x25, 0x01,         #   LOGICAL_MAXIMUM (1)
-        0x95, 0x03,         #   REPORT_COUNT (3)
-        0x75, 0x01,         #   REPORT_SIZE (1)
-        0x81, 0x02,         #   INPUT (Data,Var,Abs)
-                            #   padding
-        0x95, 0x01,         #   REPORT_COUNT (1)
-        0x75, 0x05,         #   REPORT_SIZE (5)
-        0x81, 0x03,         #   INPUT (Constant)
-
-                            #   x, y, relative 16 bit
-        0x05, 0x01,         #   USAGE_PAGE (Generic Desktop)
-        0x09, 0x01,         #   USAGE (Pointer)
-        0xA1, 0x00,         #   COLLECTION (Physical)
-        0x09, 0x30,         #     USAGE (X)
-        0x09, 0x31,         #     USAGE (Y)
-        0x16, 0x01, 0x80,   #     LOGICAL_MINIMUM (-32767)
-        0x26, 0xFF, 0x7F,   #     LOGICAL_MAXIMUM (32767)
-        0x75, 0x10,         #     REPORT_SIZE (16),
-        0x95, 0x02,         #     REPORT_COUNT (2),
-        0x81, 0x06,         #     INPUT (Data,Var,Abs)
-        0xC0,               #   END_COLLECTION
-
-                            #   wheel, relative 8 bit
-        0x09, 0x38,         #   USAGE (Wheel)
-        0x15, 0x81,         #   LOGICAL_MINIMUM (-127)
-        0x25, 0x7F,         #   LOGICAL_MAXIMUM (127)
-        0x75, 0x08,         #   REPORT_SIZE (8),
-        0x95, 0x01,         #   REPORT_COUNT (1),
-        0x81, 0x06,         #   INPUT (Data,Var,Rel)
-
-        0xC0                # END_COLLECTION
-    ])
+    SPEC: ReportSpec = _SPEC
+    REPORT_LENGTH: int = _SPEC.report_length
+    REPORT_DESC: bytes = _SPEC.descriptor
 
     @dataclass
     class Message(HIDMessage):
@@ -62,16 +50,155 @@ class Mouse(HIDDefinition):
         relative_y: float = 0.0 # [-1.0-1.0]
         relative_wheel: int = 0 # [0.0-1.0] 
 
+        def merge(self, other: HIDMessage) -> typing.Optional[HIDMessage]:
+            # Consecutive deltas with the same button state can be summed
+            # as long as the sum is still representable in one report
+            if not isinstance(other, Mouse.Message) or other.buttons != self.buttons:
+                return None
+
+            x = self.relative_x + other.relative_x
+            y = self.relative_y + other.relative_y
+            wheel = self.relative_wheel + other.relative_wheel
+            if abs(x) > 1.0 or abs(y) > 1.0 or abs(wheel) > 127:
+                return None
+
+            return Mouse.Message(
+                buttons = self.buttons,
+                relative_x = x,
+                relative_y = y,
+                relative_wheel = wheel
+            )
+
+        def report(self) -> bytearray:
+            buf = bytearray(_REPORT.size)
+            self.report_into(buf)
+            return buf
+
+        def report_size(self) -> int:
+            return _REPORT.size
+
+        def report_into(self, buffer: bytearray, offset: int = 0) -> int:
+            _REPORT.pack_into(
+                buffer, offset,
+                self.buttons,
+                int(self.relative_x * _MAX_MOUSE) & 0xffff,
+                int(self.relative_y * _MAX_MOUSE) & 0xffff,
+                self.relative_wheel & 0xff
+            )
+            return _REPORT.size
+
+        def freeze(self) -> "Mouse.Frozen":
+            return typing.cast(Mouse.Frozen, Mouse.Frozen.from_report(self.report()))
+
+    class Frozen(FrozenMessage):
+        # Immutable Message; fields read back quantized to the report's resolution
+        __slots__ = ()
+        _FIELDS = ('buttons', 'relative_x', 'relative_y', 'relative_wheel')
+
+        def __init__(
+            self,
+            buttons: int = 0x00,
+            relative_x: float = 0.0,
+            relative_y: float = 0.0,
+            relative_wheel: int = 0
+        ) -> None:
+            self._freeze(_REPORT.pack(
+                buttons,
+                int(relative_x * _MAX_MOUSE) & 0xffff,
+                int(relative_y * _MAX_MOUSE) & 0xffff,
+                relative_wheel & 0xff
+            ))
+
+        @property
+        def buttons(self) -> int:
+            return self._report[0]
+
+        @property
+        def relative_x(self) -> float:
+            return _SIGNED.unpack(self._report)[1] / _MAX_MOUSE
+
+        @property
+        def relative_y(self) -> float:
+            return _SIGNED.unpack(self._report)[2] / _MAX_MOUSE
+
+        @property
+        def relative_wheel(self) -> int:
+            return _SIGNED.unpack(self._report)[3]
+
+        def merge(self, other: HIDMessage) -> typing.Optional[HIDMessage]:
+            # As Message.merge, summing the encoded deltas
+            if not isinstance(other, Mouse.Frozen) or other._report[0] != self._report[0]:
+                return None
+
+            _, x0, y0, wheel0 = _SIGNED.unpack(self._report)
+            _, x1, y1, wheel1 = _SIGNED.unpack(other._report)
+            x, y, wheel = x0 + x1, y0 + y1, wheel0 + wheel1
+            if abs(x) > _MAX_MOUSE or abs(y) > _MAX_MOUSE or abs(wheel) > 127:
+                return None
+
+            return Mouse.Frozen.from_report(_REPORT.pack(self._report[0], x & 0xffff, y & 0xffff, wheel & 0xff))
+
+    @dataclass(eq = False)
+    class Batch(HIDMessage):
+        # Many samples, one report each, encoded in one vectorized pass; every
+        # field broadcasts against the others.  With timestamps (time.time()
+        # per sample) HIDDevice writes each report at its sample's time
+        buttons: typing.Union[int, np.ndarray] = 0x00
+        relative_x: typing.Union[float, np.ndarray] = field(default_factory = lambda: np.zeros(0))
+        relative_y: typing.Union[float, np.ndarray] = field(default_factory = lambda: np.zeros(0))
+        relative_wheel: typing.Union[int, np.ndarray] = 0
+        timestamps: typing.Optional[np.ndarray] = None
+
+        def __post_init__(self) -> None:
+            if self.timestamps is not None and np.size(self.timestamps) != len(self):
+                raise ValueError(f'{np.size(self.timestamps)} timestamps for {len(self)} samples')
+
+        def __len__(self) -> int:
+            return np.broadcast(self.buttons, self.relative_x, self.relative_y, self.relative_wheel).size
+
+        def schedule(self) -> typing.Optional[typing.Sequence[float]]:
+            return None if self.timestamps is None else np.ravel(self.timestamps)
+
         def report(self) -> bytearray:
-            x = int(self.relative_x * _MAX_MOUSE)
-            y = int(self.relative_y * _MAX_MOUSE)
-
-            buf = [0] * 6
-            buf[0] = self.buttons
-            buf[1] = x & 0xff
-            buf[2] = (x >> 8) & 0xff
-            buf[3] = y & 0xff
-            buf[4] = (y >> 8) & 0xff
-            buf[5] = self.relative_wheel & 0xff
-
-            return bytearray(buf)
\ No newline at end of file
+            buf = bytearray(self.report_size())
+            self.report_into(buf)
+            return buf
+
+        def report_size(self) -> int:
+            return len(self) * _REPORT.size
+
+        def report_into(self, buffer: bytearray, offset: int = 0) -> int:
+            n = len(self)
+            if n:
+                reports = np.frombuffer(buffer, dtype = _REPORT_DTYPE, count = n, offset = offset)
+                _encode(reports, self.buttons, self.relative_x, self.relative_y, self.relative_wheel)
+            return n * _REPORT.size
+
+    @staticmethod
+    def encode_batch(
+        buttons: typing.Union[int, np.ndarray],
+        relative_x: typing.Union[float, np.ndarray],
+        relative_y: typing.Union[float, np.ndarray],
+        relative_wheel: typing.Union[int, np.ndarray] = 0
+    ) -> bytes:
+        # Vectorized Message.report() for arrays of fields
+        reports = np.empty(np.broadcast(buttons, relative_x, relative_y, relative_wheel).size, dtype = _REPORT_DTYPE)
+        _encode(reports, buttons, relative_x, relative_y, relative_wheel)
+        return reports.tobytes()
+
+
+def _encode(
+    reports: np.ndarray,
+    buttons: typing.Union[int, np.ndarray],
+    relative_x: typing.Union[float, np.ndarray],
+    relative_y: typing.Union[float, np.ndarray],
+    relative_wheel: typing.Union[int, np.ndarray]
+) -> None:
+    # Fill a _REPORT_DTYPE array (possibly a view of a write buffer) in place
+    buttons, relative_x, relative_y, relative_wheel = np.broadcast_arrays(
+        buttons, relative_x, relative_y, relative_wheel
+    )
+    reports['buttons'] = buttons.ravel()
+    reports['x'] = (np.asarray(relative_x, dtype = np.float64).ravel() * _MAX_MOUSE).astype(np.int64) & 0xffff
+    reports['y'] = (np.asarray(relative_y, dtype = np.float64).ravel() * _MAX_MOUSE).astype(np.int64) & 0xffff
+    reports['wheel'] = relative_wheel.ravel().astype(np.int64) & 0xff
\ No newline at end of file
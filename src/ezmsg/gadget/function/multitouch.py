@@ -0,0 +1,125 @@
+import typing
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .hiddefinition import HIDDefinition
+from ..message import HIDMessage
+from ..reportspec import (
+    ReportSpec, Field, Collection, padding,
+    PAGE_DIGITIZER, PAGE_GENERIC_DESKTOP, USAGE_TOUCH_SCREEN, USAGE_FINGER, USAGE_TIP_SWITCH,
+    USAGE_IN_RANGE, USAGE_CONTACT_IDENTIFIER, USAGE_CONTACT_COUNT, USAGE_X, USAGE_Y,
+    COLLECTION_LOGICAL
+)
+
+# Multi-touch digitizer: up to _CONTACTS fingers per report, each in its own
+# Finger collection with a contact identifier so the host can track it
+# between reports, followed by how many of the slots are valid.
+# Hosts without a Contact Count Maximum feature report (Linux hid-multitouch)
+# take the number of Finger collections as the maximum.
+# Source: Microsoft, "Windows Precision Touchpad / Touch Screen" HID requirements
+
+_CONTACTS = 5
+
+
+def _finger(i: int) -> Collection:
+    return Collection(PAGE_DIGITIZER, USAGE_FINGER, COLLECTION_LOGICAL, (
+        Field(f'touch{i}', size = 1, count = 2, usages = (USAGE_TIP_SWITCH, USAGE_IN_RANGE)),
+        padding(6),
+        Field(f'contact_id{i}', size = 8, usages = (USAGE_CONTACT_IDENTIFIER,), logical_maximum = 255),
+        Field(f'x{i}', size = 16, usage_page = PAGE_GENERIC_DESKTOP, usages = (USAGE_X,), logical_maximum = 10000),
+        Field(f'y{i}', size = 16, usage_page = PAGE_GENERIC_DESKTOP, usages = (USAGE_Y,), logical_maximum = 10000),
+    ))
+
+
+_SPEC = ReportSpec(PAGE_DIGITIZER, USAGE_TOUCH_SCREEN, [
+    *[_finger(i) for i in range(_CONTACTS)],
+    Field('contact_count', size = 8, usage_page = PAGE_DIGITIZER, usages = (USAGE_CONTACT_COUNT,), logical_maximum = _CONTACTS),
+])
+
+_MAX_TOUCH = _SPEC['x0'].logical_maximum
+
+# The same bytes as _SPEC.input.dtype, viewed as [contacts[_CONTACTS], contact_count]
+# so whole frames of contacts are filled with single array assignments
+_CONTACT_DTYPE = np.dtype([('touch', 'u1'), ('contact_id', 'u1'), ('x', '<u2'), ('y', '<u2')])
+_REPORT_DTYPE = np.dtype([('contacts', _CONTACT_DTYPE, (_CONTACTS,)), ('contact_count', 'u1')])
+assert _REPORT_DTYPE.itemsize == _SPEC.input.length
+assert _REPORT_DTYPE.fields['contact_count'][1] == _SPEC.input.dtype.fields['contact_count'][1]
+
+class MultiTouch(HIDDefinition):
+
+    PROTOCOL: int = 0
+    SUBCLASS: int = 0
+    SPEC: ReportSpec = _SPEC
+    REPORT_LENGTH: int = _SPEC.report_length
+    REPORT_DESC: bytes = _SPEC.descriptor
+
+    CONTACTS: int = _CONTACTS
+
+    TOUCH_TIP = 0x01 # Finger is down
+    TOUCH_IN_RANGE = 0x02 # Finger is tracked; report a contact once without it to release it
+
+    @dataclass(eq = False)
+    class Message(HIDMessage):
+        # One frame of up to CONTACTS contacts; every field broadcasts
+        # against absolute_x, so a scalar applies to all contacts
+        touch: typing.Union[int, np.ndarray] = 0x03 # [bit0 = tip, bit1 = in range] per contact
+        absolute_x: np.ndarray = field(default_factory = lambda: np.zeros(0)) # [0-1.0]
+        absolute_y: np.ndarray = field(default_factory = lambda: np.zeros(0)) # [0-1.0]
+        contact_id: typing.Optional[np.ndarray] = None # None numbers contacts 0..n-1
+
+        def contact_ids(self) -> np.ndarray:
+            n = np.size(self.absolute_x)
+            if self.contact_id is None:
+                return np.arange(n)
+            return np.broadcast_to(self.contact_id, (n,))
+
+        def merge(self, other: HIDMessage) -> typing.Optional[HIDMessage]:
+            # Positions supersede each other as long as the same contacts are
+            # in the same state; a contact appearing or lifting must be sent
+            if not isinstance(other, MultiTouch.Message):
+                return None
+            if np.size(self.absolute_x) != np.size(other.absolute_x):
+                return None
+            n = np.size(self.absolute_x)
+            if not (
+                np.array_equal(self.contact_ids(), other.contact_ids()) and
+                np.array_equal(np.broadcast_to(self.touch, (n,)), np.broadcast_to(other.touch, (n,)))
+            ):
+                return None
+            return other
+
+        def report(self) -> bytearray:
+            return bytearray(MultiTouch.encode_batch(
+                self.touch, np.reshape(self.absolute_x, (1, -1)), np.reshape(self.absolute_y, (1, -1)), self.contact_id
+            ))
+
+        def report_size(self) -> int:
+            return _REPORT_DTYPE.itemsize
+
+    @staticmethod
+    def encode_batch(
+        touch: typing.Union[int, np.ndarray],
+        absolute_x: np.ndarray,
+        absolute_y: np.ndarray,
+        contact_id: typing.Optional[np.ndarray] = None
+    ) -> bytes:
+        # Vectorized encoding of (frames, contacts) arrays; contact_id = None
+        # numbers the contacts of each frame 0..contacts-1
+        absolute_x = np.atleast_2d(np.asarray(absolute_x, dtype = np.float64))
+        frames, contacts = absolute_x.shape
+        if contacts > _CONTACTS:
+            raise ValueError(f'{contacts} contacts per frame; MultiTouch reports carry at most {_CONTACTS}')
+        if contact_id is None:
+            contact_id = np.arange(contacts)
+        touch, absolute_x, absolute_y, contact_id = np.broadcast_arrays(touch, absolute_x, absolute_y, contact_id)
+
+        reports = np.zeros(frames, dtype = _REPORT_DTYPE)
+        slots = reports['contacts'][:, :contacts]
+        slots['touch'] = touch
+        slots['contact_id'] = contact_id
+        slots['x'] = (np.asarray(absolute_x, dtype = np.float64) * _MAX_TOUCH).astype(np.int64) & 0xffff
+        slots['y'] = (np.asarray(absolute_y, dtype = np.float64) * _MAX_TOUCH).astype(np.int64) & 0xffff
+        reports['contact_count'] = contacts
+        return reports.tobytes()
@@ -1,61 +1,48 @@
-from dataclasses import dataclass
+import typing
+
+from dataclasses import dataclass, field
+
+import numpy as np
 
 from .hiddefinition import HIDDefinition
-from ..hiddevice import HIDMessage
+from ..message import HIDMessage, FrozenMessage
+from ..reportspec import (
+    ReportSpec, Field, Collection, padding,
+    PAGE_DIGITIZER, PAGE_GENERIC_DESKTOP, USAGE_PEN, USAGE_STYLUS, USAGE_TIP_SWITCH, USAGE_IN_RANGE,
+    USAGE_POINTER, USAGE_X, USAGE_Y, COLLECTION_PHYSICAL
+)
+
+_SPEC = ReportSpec(PAGE_DIGITIZER, USAGE_PEN, [
+    # declare a finger collection
+    Collection(PAGE_DIGITIZER, USAGE_STYLUS, COLLECTION_PHYSICAL, (
+        # finger touch (finger up/down) and in range; the remaining
+        # 6 bits of the first byte are constant so the driver ignores them
+        Field('touch', size = 1, count = 2, usages = (USAGE_TIP_SWITCH, USAGE_IN_RANGE)),
+        padding(6),
+
+        # absolute X and Y coordinates of 16 bit each (percent values multiplied with 100)
+        # http:#www.usb.org/developers/hidpage/Hut1_12v2.pdf
+        # Chapter 16.2 says: "In the Stylus collection a Pointer physical collection will contain the axes reported by the stylus."
+        Collection(PAGE_GENERIC_DESKTOP, USAGE_POINTER, COLLECTION_PHYSICAL, (
+            Field('x', size = 16, usages = (USAGE_X,), logical_maximum = 10000),
+            Field('y', size = 16, usages = (USAGE_Y,), logical_maximum = 10000),
+        )),
+    )),
+])
+
+_MAX_TOUCH = _SPEC['x'].logical_maximum
 
-# This comes from LOGICAL_MAXIMUM in the touch HID descriptor.
-# FIXME: Maybe couple these definitions together
-_MAX_TOUCH = 10000
+# [touch, x (le16), y (le16)]
+_REPORT = _SPEC.input.struct
+_REPORT_DTYPE = _SPEC.input.dtype
 
 class Touch(HIDDefinition):
 
     PROTOCOL: int = 0
     SUBCLASS: int = 0
-    REPORT_LENGTH: int = 5
-    REPORT_DESC: bytes = bytes([
-        0x05, 0x0d,                    # USAGE_PAGE (Digitizer)
-        0x09, 0x02,                    # USAGE (Pen)
-        0xa1, 0x01,                    # COLLECTION (Application)
-        
-        # declare a finger collection
-        0x09, 0x20,                    #   Usage (Stylus)
-        0xA1, 0x00,                    #   Collection (Physical)
-
-        # Declare a finger touch (finger up/down)
-        0x09, 0x42,                    #     Usage (Tip Switch)
-        0x09, 0x32,                    #     USAGE (In Range)
-        0x15, 0x00,                    #     LOGICAL_MINIMUM (0)
-        0x25, 0x01,                    #     LOGICAL_MAXIMUM (1)
-        0x75, 0x01,                    #     REPORT_SIZE (1)
-        0x95, 0x02,                    #     REPORT_COUNT (2)
-        0x81, 0x02,                    #     INPUT (Data,Var,Abs)
-
-        # Declare the remaining 6 bits of the first data byte as constant -> the driver will ignore them
-        0x75, 0x01,                    #     REPORT_SIZE (1)
-        0x95, 0x06,                    #     REPORT_COUNT (6)
-        0x81, 0x01,                    #     INPUT (Cnst,Ary,Abs)
-
-        # Define absolute X and Y coordinates of 16 bit each (percent values multiplied with 100)
-        # http:#www.usb.org/developers/hidpage/Hut1_12v2.pdf
-        # Chapter 16.2 says: "In the Stylus collection a Pointer physical collection will contain the axes reported by the stylus."
-        0x05, 0x01,                    #     Usage Page (Generic Desktop)
-        0x09, 0x01,                    #     Usage (Pointer)
-        0xA1, 0x00,                    #     Collection (Physical)
-        0x09, 0x30,                    #        Usage (X)
-        0x09, 0x31,                    #        Usage (Y)
-        0x16, 0x00, 0x00,              #        Logical Minimum (0)
-        0x26, 0x10, 0x27,              #        Logical Maximum (10000)
-        0x36, 0x00, 0x00,              #        Physical Minimum (0)
-        0x46, 0x10, 0x27,              #        Physical Maximum (10000)
-        0x66, 0x00, 0x00,              #        UNIT (None)
-        0x75, 0x10,                    #        Report Size (16),
-        0x95, 0x02,                    #        Report Count (2),
-        0x81, 0x02,                    #        Input (Data,Var,Abs)
-        0xc0,                          #     END_COLLECTION
-
-        0xc0,                          #   END_COLLECTION
-        0xc0                           # END_COLLECTION
-    ])
+    SPEC: ReportSpec = _SPEC
+    REPORT_LENGTH: int = _SPEC.report_length
+    REPORT_DESC: bytes = _SPEC.descriptor
 
     @dataclass
     class Message(HIDMessage):
@@ -63,15 +50,114 @@ class Touch(HIDDefinition):
         absolute_x: float = 0.0 # [0-1.0]
         absolute_y: float = 0.0 # [0-1.0]
 
+        def merge(self, other: HIDMessage) -> typing.Optional[HIDMessage]:
+            # Absolute positions supersede each other; only the newest matters
+            if not isinstance(other, Touch.Message) or other.touch != self.touch:
+                return None
+            return other
+
+        def report(self) -> bytearray:
+            buf = bytearray(_REPORT.size)
+            self.report_into(buf)
+            return buf
+
+        def report_size(self) -> int:
+            return _REPORT.size
+
+        def report_into(self, buffer: bytearray, offset: int = 0) -> int:
+            _REPORT.pack_into(
+                buffer, offset,
+                self.touch,
+                int(self.absolute_x * _MAX_TOUCH) & 0xffff,
+                int(self.absolute_y * _MAX_TOUCH) & 0xffff
+            )
+            return _REPORT.size
+
+        def freeze(self) -> "Touch.Frozen":
+            return typing.cast(Touch.Frozen, Touch.Frozen.from_report(self.report()))
+
+    class Frozen(FrozenMessage):
+        # Immutable Message; fields read back quantized to the report's resolution
+        __slots__ = ()
+        _FIELDS = ('touch', 'absolute_x', 'absolute_y')
+
+        def __init__(self, touch: int = 0x00, absolute_x: float = 0.0, absolute_y: float = 0.0) -> None:
+            self._freeze(_REPORT.pack(
+                touch,
+                int(absolute_x * _MAX_TOUCH) & 0xffff,
+                int(absolute_y * _MAX_TOUCH) & 0xffff
+            ))
+
+        @property
+        def touch(self) -> int:
+            return self._report[0]
+
+        @property
+        def absolute_x(self) -> float:
+            return _REPORT.unpack(self._report)[1] / _MAX_TOUCH
+
+        @property
+        def absolute_y(self) -> float:
+            return _REPORT.unpack(self._report)[2] / _MAX_TOUCH
+
+        def merge(self, other: HIDMessage) -> typing.Optional[HIDMessage]:
+            if not isinstance(other, Touch.Frozen) or other._report[0] != self._report[0]:
+                return None
+            return other
+
+    @dataclass(eq = False)
+    class Batch(HIDMessage):
+        # Many samples, one report each (see Mouse.Batch)
+        touch: typing.Union[int, np.ndarray] = 0x00
+        absolute_x: typing.Union[float, np.ndarray] = field(default_factory = lambda: np.zeros(0))
+        absolute_y: typing.Union[float, np.ndarray] = field(default_factory = lambda: np.zeros(0))
+        timestamps: typing.Optional[np.ndarray] = None
+
+        def __post_init__(self) -> None:
+            if self.timestamps is not None and np.size(self.timestamps) != len(self):
+                raise ValueError(f'{np.size(self.timestamps)} timestamps for {len(self)} samples')
+
+        def __len__(self) -> int:
+            return np.broadcast(self.touch, self.absolute_x, self.absolute_y).size
+
+        def schedule(self) -> typing.Optional[typing.Sequence[float]]:
+            return None if self.timestamps is None else np.ravel(self.timestamps)
+
         def report(self) -> bytearray:
-            x = int(self.absolute_x * _MAX_TOUCH)
-            y = int(self.absolute_y * _MAX_TOUCH)
+            buf = bytearray(self.report_size())
+            self.report_into(buf)
+            return buf
+
+        def report_size(self) -> int:
+            return len(self) * _REPORT.size
+
+        def report_into(self, buffer: bytearray, offset: int = 0) -> int:
+            n = len(self)
+            if n:
+                reports = np.frombuffer(buffer, dtype = _REPORT_DTYPE, count = n, offset = offset)
+                _encode(reports, self.touch, self.absolute_x, self.absolute_y)
+            return n * _REPORT.size
+
+    @staticmethod
+    def encode_batch(
+        touch: typing.Union[int, np.ndarray],
+        absolute_x: typing.Union[float, np.ndarray],
+        absolute_y: typing.Union[float, np.ndarray]
+    ) -> bytes:
+        # Vectorized Message.report() for arrays of fields
+        reports = np.empty(np.broadcast(touch, absolute_x, absolute_y).size, dtype = _REPORT_DTYPE)
+        _encode(reports, touch, absolute_x, absolute_y)
+        return reports.tobytes()
 
-            buf = [0] * 5
-            buf[0] = self.touch
-            buf[1] = x & 0xff
-            buf[2] = (x >> 8) & 0xff
-            buf[3] = y & 0xff
-            buf[4] = (y >> 8) & 0xff
 
-            return bytearray(buf)
\ No newline at end of file
+def _encode(
+    reports: np.ndarray,
+    touch: typing.Union[int, np.ndarray],
+    absolute_x: typing.Union[float, np.ndarray],
+    absolute_y: typing.Union[float, np.ndarray]
+) -> None:
+    # Fill a _REPORT_DTYPE array (possibly a view of a write buffer) in place
+    touch, absolute_x, absolute_y = np.broadcast_arrays(touch, absolute_x, absolute_y)
+    reports['touch'] = touch.ravel()
+    reports['x'] = (np.asarray(absolute_x, dtype = np.float64).ravel() * _MAX_TOUCH).astype(np.int64) & 0xffff
+    reports['y'] = (np.asarray(absolute_y, dtype = np.float64).ravel() * _MAX_TOUCH).astype(np.int64) & 0xffff
\ No newline at end of file
@@ -0,0 +1,146 @@
+import abc
+import asyncio
+import os
+import typing
+
+from pathlib import Path
+
+from aiofile import async_open, BinaryFileWrapper
+
+BACKEND_AIOFILE = 'aiofile'
+BACKEND_NONBLOCKING = 'nonblocking'
+BACKENDS = (BACKEND_AIOFILE, BACKEND_NONBLOCKING)
+
+
+class HIDHandle(abc.ABC):
+    @abc.abstractmethod
+    async def write(self, data: typing.Union[bytes, bytearray, memoryview]) -> None:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def read(self, size: int) -> bytes:
+        # Wait for the next output report from the host; b'' at EOF
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def close(self) -> None:
+        raise NotImplementedError()
+
+
+class AiofileHandle(HIDHandle):
+    # Every write is handed off to aiofile's thread pool
+
+    file: BinaryFileWrapper
+
+    def __init__(self, file: BinaryFileWrapper) -> None:
+        self.file = file
+
+    @classmethod
+    async def open(cls, path: typing.Union[str, Path]) -> "AiofileHandle":
+        # Open the handle in binary mode read/append mode
+        return cls(await async_open(str(path), 'rb+')) # type: ignore
+
+    async def write(self, data: typing.Union[bytes, bytearray, memoryview]) -> None:
+        await self.file.write(bytes(data))
+
+    async def read(self, size: int) -> bytes:
+        return await self.file.read(size)
+
+    async def close(self) -> None:
+        await self.file.close()
+
+
+class NonBlockingHandle(HIDHandle):
+    # Writes go straight to an O_NONBLOCK file descriptor from the event loop;
+    # we only wait on loop.add_writer when the kernel pushes back (EAGAIN)
+
+    fd: int
+    owned: bool # close() closes fd; False for descriptors borrowed from a HandlePool
+
+    def __init__(self, fd: int, owned: bool = True) -> None:
+        self.fd = fd
+        self.owned = owned
+
+    @classmethod
+    async def open(cls, path: typing.Union[str, Path]) -> "NonBlockingHandle":
+        return cls(os.open(str(path), os.O_RDWR | os.O_NONBLOCK))
+
+    async def write(self, data: typing.Union[bytes, bytearray, memoryview]) -> None:
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[os.write(self.fd, view):]
+            except BlockingIOError:
+                await self._writable()
+
+    async def _writable(self) -> None:
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_writer(self.fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_writer(self.fd)
+
+    async def read(self, size: int) -> bytes:
+        while True:
+            try:
+                return os.read(self.fd, size)
+            except BlockingIOError:
+                await self._readable()
+
+    async def _readable(self) -> None:
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_reader(self.fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(self.fd)
+
+    async def close(self) -> None:
+        if self.owned:
+            os.close(self.fd)
+
+
+async def open_handle(path: typing.Union[str, Path], backend: str = BACKEND_AIOFILE) -> HIDHandle:
+    if backend == BACKEND_AIOFILE:
+        return await AiofileHandle.open(path)
+    elif backend == BACKEND_NONBLOCKING:
+        return await NonBlockingHandle.open(path)
+    raise ValueError(f'Unknown HID backend {backend!r}; expected one of {BACKENDS}')
+
+
+class HandlePool:
+    # Keeps hidg nodes open across graph restarts (see supervisor).  Handles
+    # from open() share the pooled file, and closing them leaves it open.
+
+    _files: typing.Dict[typing.Tuple[str, str], typing.Any]
+
+    def __init__(self) -> None:
+        self._files = {}
+
+    async def open(self, path: typing.Union[str, Path], backend: str = BACKEND_AIOFILE) -> HIDHandle:
+        key = (str(path), backend)
+        if backend == BACKEND_AIOFILE:
+            if key not in self._files:
+                self._files[key] = open(path, 'rb+', buffering = 0)
+            # aiofile contexts belong to an event loop; wrap the file anew for each
+            # graph run.  Wrappers don't own the file, so closing them is a no-op
+            return AiofileHandle(async_open(self._files[key])) # type: ignore
+        elif backend == BACKEND_NONBLOCKING:
+            if key not in self._files:
+                self._files[key] = os.open(str(path), os.O_RDWR | os.O_NONBLOCK)
+            return NonBlockingHandle(self._files[key], owned = False)
+        raise ValueError(f'Unknown HID backend {backend!r}; expected one of {BACKENDS}')
+
+    def close(self) -> None:
+        for (_, backend), file in self._files.items():
+            if backend == BACKEND_AIOFILE:
+                file.close()
+            else:
+                os.close(file)
+        self._files.clear()
+
+
+HANDLE_POOL = HandlePool()
@@ -1,29 +1,67 @@
-import abc
 import asyncio
+import time
 import typing
 
 from pathlib import Path
 
 import ezmsg.core as ez
 
-from aiofile import async_open, BinaryFileWrapper
-from ezmsg.gadget.config import USBGadget, GadgetConfig
+from ezmsg.gadget.capture import CaptureWriter, CAPTURE_FLUSH_PERIOD
+from ezmsg.gadget.config import GadgetConfig
+from ezmsg.gadget.discovery import discover
+from ezmsg.gadget.handle import HIDHandle, open_handle, BACKEND_AIOFILE, BACKEND_NONBLOCKING, HANDLE_POOL
+from ezmsg.gadget.message import HIDMessage, LEDs, split_reports
+from ezmsg.gadget.stats import DeviceCounters, HIDDeviceStats, write_stats
+from ezmsg.gadget.writequeue import WriteQueue
 from usb_gadget import HIDFunction
 
-
-class HIDMessage(abc.ABC):
-    @abc.abstractmethod
-    def report(self) -> bytearray:
-        raise NotImplementedError()
+if typing.TYPE_CHECKING:
+    from ezmsg.gadget.function import Composite
 
 
 class HIDDeviceSettings(ez.Settings):
     function_name: str
     config_file: typing.Optional[Path] = None
 
+    # Write to this node instead of discovering the function's /dev/hidgN
+    device_path: typing.Optional[Path] = None
+
+    # 'aiofile' hands every write to a thread pool; 'nonblocking'
+    # writes from the event loop with an O_NONBLOCK descriptor
+    backend: str = BACKEND_AIOFILE
+
+    # If set, messages are queued and coalesced for up to this many seconds
+    # before being written; otherwise each message is written on arrival
+    queue_latency: typing.Optional[float] = None
+
+    # If set, write at most one message per poll interval (sec), merging
+    # movement into the newest state and queueing transitions in order.
+    # Match this to the host's polling interval (bInterval) for the endpoint
+    poll_interval: typing.Optional[float] = None
+
+    # If set, publish HIDDeviceStats on OUTPUT_STATS every stats_period sec
+    # and (if stats_dir is set) dump them to <stats_dir>/<function_name>.json
+    stats_period: typing.Optional[float] = None
+    stats_dir: typing.Optional[Path] = None
+
+    # If set, append every report written to this capture file (see Replay)
+    capture_path: typing.Optional[Path] = None
+
+    # Borrow the node's handle from HANDLE_POOL and leave it open on shutdown,
+    # so a restarted graph (see supervisor) doesn't have to reopen it
+    keep_open: bool = False
+
 
 class HIDDeviceState(ez.State):
-    handle: BinaryFileWrapper
+    handle: HIDHandle
+    led_handle: typing.Optional[HIDHandle] = None # Reads the host's LED reports
+    buffer: bytearray # Reused for every report encoded by this device
+    queue: typing.Optional[WriteQueue] = None
+    has_leds: bool = False
+    report_length: int = 0
+    composite: typing.Optional[typing.Type["Composite"]] = None # Routes messages by report ID
+    counters: DeviceCounters
+    capture: typing.Optional[CaptureWriter] = None
 
 
 class HIDDevice(ez.Unit):
@@ -32,35 +70,198 @@ class HIDDevice(ez.Unit):
     STATE = HIDDeviceState
 
     INPUT_HID = ez.InputStream(HIDMessage)
+    OUTPUT_LED = ez.OutputStream(LEDs)
+    OUTPUT_STATS = ez.OutputStream(HIDDeviceStats)
 
     async def initialize(self) -> None:
-        # Find the corresponding kernel object
         config = GadgetConfig(self.SETTINGS.config_file)
-        gadget = USBGadget(config.gadget_name)
-        kobj = gadget['functions'][f'hid.{self.SETTINGS.function_name}'].dev
-        
-        # Get the file descriptor that maps to that kernel object
-        kobj_fd = Path('/sys/dev/char') / str(kobj)
-        command = f"udevadm info -r -q name {kobj_fd}"
-        proc = await asyncio.create_subprocess_shell(command, stdout = asyncio.subprocess.PIPE)
-        stdout, _ = await proc.communicate()
-        descriptor = stdout.decode('ascii').strip()
-        
-        # Open the handle in binary mode read/append mode
-        self.STATE.handle = await async_open(descriptor, 'rb+') # type: ignore
+
+        descriptor = self.SETTINGS.device_path
+        if descriptor is None:
+            descriptor = await discover(config, self.SETTINGS.function_name)
+
+        self.STATE.handle = await self._open(descriptor, self.SETTINGS.backend)
+        self.STATE.buffer = bytearray(64) # Max interrupt packet size for full-speed HID
+        self.STATE.counters = DeviceCounters(self.SETTINGS.function_name)
+
+        if self.SETTINGS.capture_path is not None:
+            self.STATE.capture = CaptureWriter(self.SETTINGS.capture_path, self.SETTINGS.function_name)
+
+        if self.SETTINGS.queue_latency is not None or self.SETTINGS.poll_interval is not None:
+            self.STATE.queue = WriteQueue(
+                latency = self.SETTINGS.queue_latency or 0.0, 
+                interval = self.SETTINGS.poll_interval or 0.0
+            )
+
+        # Keyboards receive LED output reports from the host.  Imported here
+        # so importing this module (e.g. for the CLI) loads no report codecs
+        from ezmsg.gadget.function import Keyboard, Composite
+        function_type, _ = config.function(self.SETTINGS.function_name) or (None, {})
+        if function_type is not None and issubclass(function_type, Composite):
+            self.STATE.composite = function_type
+            self.STATE.has_leds = Keyboard in function_type.MEMBERS
+        else:
+            self.STATE.has_leds = function_type is not None and issubclass(function_type, Keyboard)
+        self.STATE.report_length = getattr(function_type, 'REPORT_LENGTH', 0)
+
+        # An aiofile read holds the file's lock until the host sends a report,
+        # blocking every write meanwhile; LEDs get a descriptor of their own
+        if self.STATE.has_leds:
+            if self.SETTINGS.backend == BACKEND_NONBLOCKING:
+                self.STATE.led_handle = self.STATE.handle
+            else:
+                self.STATE.led_handle = await self._open(descriptor, BACKEND_NONBLOCKING)
+
+    async def _open(self, path: Path, backend: str) -> HIDHandle:
+        if self.SETTINGS.keep_open:
+            return await HANDLE_POOL.open(path, backend)
+        return await open_handle(path, backend)
+
+    async def shutdown(self) -> None:
+        if self.STATE.queue is not None:
+            ez.logger.info(f'{self.SETTINGS.function_name} write queue: {self.STATE.queue.stats}')
+        if self.SETTINGS.stats_period is not None:
+            self._dump_stats(self.stats())
+        if self.STATE.capture is not None:
+            self.STATE.capture.close()
+        led_handle = self.STATE.led_handle
+        if led_handle is not None and led_handle is not self.STATE.handle:
+            await led_handle.close()
+        await self.STATE.handle.close()
+
+    def stats(self) -> HIDDeviceStats:
+        queue = self.STATE.queue
+        return self.STATE.counters.snapshot(
+            backlog = 0 if queue is None else queue.backlog,
+            merged = 0 if queue is None else queue.stats.merged
+        )
 
     @ez.subscriber(INPUT_HID)
     async def write(self, msg: HIDMessage) -> None:
-        await self.STATE.handle.write(msg.report())
+        self.STATE.counters.received += 1
+        if self.STATE.composite is not None:
+            msg = self.STATE.composite.route(msg)
+        if self.STATE.queue is not None:
+            self.STATE.queue.put(msg)
+        else:
+            await self._write_report(msg, time.perf_counter())
+
+    @ez.task
+    async def write_queued(self) -> None:
+        if self.STATE.queue is None:
+            return
+
+        while True:
+            msg = await self.STATE.queue.get()
+            await self._write_report(msg, self.STATE.queue.arrival)
+
+    @ez.task
+    async def flush_capture(self) -> None:
+        if self.STATE.capture is None:
+            return
+
+        while True:
+            await asyncio.sleep(CAPTURE_FLUSH_PERIOD)
+            await self.STATE.capture.flush()
+
+    @ez.publisher(OUTPUT_LED)
+    async def read_leds(self) -> typing.AsyncGenerator:
+        if self.STATE.led_handle is None:
+            return
+
+        while True:
+            report = await self.STATE.led_handle.read(64)
+            if not report:
+                break # EOF; not a real hidg node
+            if self.STATE.composite is not None:
+                leds = self.STATE.composite.leds(report)
+                if leds is None:
+                    continue # Output report for another member
+            else:
+                leds = report[0]
+            yield self.OUTPUT_LED, LEDs(leds = leds, timestamp = time.time())
+
+    @ez.publisher(OUTPUT_STATS)
+    async def publish_stats(self) -> typing.AsyncGenerator:
+        if self.SETTINGS.stats_period is None:
+            return
+
+        while True:
+            await asyncio.sleep(self.SETTINGS.stats_period)
+            stats = self.stats()
+            self._dump_stats(stats)
+            yield self.OUTPUT_STATS, stats
+
+    def _dump_stats(self, stats: HIDDeviceStats) -> None:
+        if self.SETTINGS.stats_dir is not None:
+            try:
+                write_stats(stats, self.SETTINGS.stats_dir)
+            except OSError as e:
+                ez.logger.warning(f'Could not write stats to {self.SETTINGS.stats_dir}: {e}')
+
+    async def _write_report(self, msg: HIDMessage, arrival: float) -> None:
+        size = msg.report_size()
+        if size > len(self.STATE.buffer):
+            self.STATE.buffer = bytearray(size)
+        msg.report_into(self.STATE.buffer)
+        reports = self._split(memoryview(self.STATE.buffer)[:size])
+
+        # hidg truncates every write to report_length, so each report gets its own
+        schedule = msg.schedule()
+        if schedule is None:
+            for report in reports:
+                await self._write(report, arrival)
+            return
+
+        # One report per timed sample, each written at (or, if overdue, right
+        # away after) its time; latency is measured from the later of its
+        # time and the message's arrival
+        wall, perf = time.time(), time.perf_counter()
+        for report, when in zip(reports, schedule):
+            delay = when - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            due = max(arrival, perf + (when - wall))
+            await self._write(report, due)
+
+    def _split(self, reports: memoryview) -> typing.List[memoryview]:
+        if self.STATE.composite is not None:
+            return list(self.STATE.composite.split(reports))
+        return split_reports(reports, self.STATE.report_length)
+
+    async def _write(self, report: memoryview, arrival: float) -> None:
+        size = len(report)
+        try:
+            await self.STATE.handle.write(report)
+        except OSError:
+            self.STATE.counters.write_errors += 1
+            raise
+        self.STATE.counters.record_write(size, self.STATE.report_length, arrival)
+        if self.STATE.capture is not None:
+            self.STATE.capture.record(time.monotonic(), report)
+        
+        
+def _optional_float(kwargs: typing.Dict[str, str], key: str) -> typing.Optional[float]:
+    value = kwargs.get(key, None)
+    return None if value is None else float(value)
         
         
-def hid_devices(config: GadgetConfig) -> typing.Dict[str, HIDDevice]:
+def hid_devices(config: GadgetConfig, capture: bool = True, keep_open: bool = False) -> typing.Dict[str, HIDDevice]:
     devices: typing.Dict[str, HIDDevice] = {}
-    for function, (function_type, _) in config.functions.items():
+    stats_period = config.endpoint_stats_period
+    for function, (function_type, kwargs) in config.functions.items():
         if issubclass(function_type, HIDFunction):
             devices[function] = HIDDevice(
                 HIDDeviceSettings(
                     function_name = function, 
+                    config_file = config.path,
+                    backend = kwargs.get('backend', BACKEND_AIOFILE),
+                    queue_latency = _optional_float(kwargs, 'queue_latency'),
+                    poll_interval = _optional_float(kwargs, 'poll_interval'),
+                    stats_period = stats_period,
+                    stats_dir = None if stats_period is None else config.endpoint_stats_dir,
+                    capture_path = config.endpoint_capture_path if capture else None,
+                    keep_open = keep_open
                 )
             )
     return devices
\ No newline at end of file
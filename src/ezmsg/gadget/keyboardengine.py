@@ -0,0 +1,165 @@
+import asyncio
+import heapq
+import itertools
+import time
+import typing
+
+from dataclasses import dataclass, field
+
+import ezmsg.core as ez
+
+from .function.keyboard import Keyboard
+
+KEY_PRESS = 'press'
+KEY_RELEASE = 'release'
+KEY_HOLD = 'hold' # press, then release after `duration` seconds
+KEY_RELEASE_ALL = 'release_all'
+
+
+@dataclass
+class KeyEvent:
+    hid_keycode: int = Keyboard.KEYCODE_NONE # Modifiers are KEYCODE_LEFT_CTRL...KEYCODE_RIGHT_META
+    action: str = KEY_PRESS
+    duration: float = 0.0 # sec; only used by KEY_HOLD
+
+
+def _modifier_bit(hid_keycode: int) -> int:
+    if Keyboard.KEYCODE_LEFT_CTRL <= hid_keycode <= Keyboard.KEYCODE_RIGHT_META:
+        return 1 << (hid_keycode - Keyboard.KEYCODE_LEFT_CTRL)
+    return 0
+
+
+class KeyboardState:
+    # Tracks which keys are held down and produces the 6-key-rollover report
+    # for that state.  Pressing more than 6 non-modifier keys reports
+    # ErrorRollOver in every slot (per HID 1.11) until enough are released.
+
+    control_keys: int
+    hid_keycodes: typing.List[int]
+
+    def __init__(self) -> None:
+        self.control_keys = 0x00
+        self.hid_keycodes = []
+
+    def press(self, hid_keycode: int) -> None:
+        bit = _modifier_bit(hid_keycode)
+        if bit:
+            self.control_keys |= bit
+        elif hid_keycode != Keyboard.KEYCODE_NONE and hid_keycode not in self.hid_keycodes:
+            self.hid_keycodes.append(hid_keycode)
+
+    def release(self, hid_keycode: int) -> None:
+        bit = _modifier_bit(hid_keycode)
+        if bit:
+            self.control_keys &= ~bit
+        elif hid_keycode in self.hid_keycodes:
+            self.hid_keycodes.remove(hid_keycode)
+
+    def release_all(self) -> None:
+        self.control_keys = 0x00
+        self.hid_keycodes.clear()
+
+    def is_pressed(self, hid_keycode: int) -> bool:
+        bit = _modifier_bit(hid_keycode)
+        if bit:
+            return bool(self.control_keys & bit)
+        return hid_keycode in self.hid_keycodes
+
+    def report(self) -> Keyboard.Report:
+        keys = self.hid_keycodes
+        if len(keys) > Keyboard.ROLLOVER_KEYS:
+            keys = [Keyboard.KEYCODE_ERROR_ROLLOVER] * Keyboard.ROLLOVER_KEYS
+        return Keyboard.Report(self.control_keys, tuple(keys))
+
+
+@dataclass(order = True)
+class _ScheduledRelease:
+    deadline: float
+    hid_keycode: int = field(compare = False)
+    token: int = field(compare = False)
+
+
+class KeyboardEngineState(ez.State):
+    keys: KeyboardState
+    events: "asyncio.Queue[KeyEvent]"
+    last: Keyboard.Report
+
+    # Pending releases for KEY_HOLD; a newer event for the same key
+    # invalidates the scheduled release by replacing its token
+    releases: typing.List[_ScheduledRelease]
+    hold_tokens: typing.Dict[int, int]
+    tokens: typing.Iterator[int]
+
+
+class KeyboardEngine(ez.Unit):
+    # Turns press/release/hold events into Keyboard.Reports, publishing
+    # only when the 8 byte report actually changes.  Held keys are
+    # reported once; key repeat is left up to the host.
+
+    STATE = KeyboardEngineState
+
+    INPUT_EVENT = ez.InputStream(KeyEvent)
+    OUTPUT_HID = ez.OutputStream(Keyboard.Report)
+
+    async def initialize(self) -> None:
+        self.STATE.keys = KeyboardState()
+        self.STATE.events = asyncio.Queue()
+        self.STATE.last = Keyboard.Report() # Host starts with every key up
+        self.STATE.releases = []
+        self.STATE.hold_tokens = {}
+        self.STATE.tokens = itertools.count()
+
+    @ez.subscriber(INPUT_EVENT)
+    async def on_event(self, event: KeyEvent) -> None:
+        self.STATE.events.put_nowait(event)
+
+    def _apply(self, event: KeyEvent) -> None:
+        keys = self.STATE.keys
+        self.STATE.hold_tokens.pop(event.hid_keycode, None)
+
+        if event.action == KEY_PRESS:
+            keys.press(event.hid_keycode)
+        elif event.action == KEY_RELEASE:
+            keys.release(event.hid_keycode)
+        elif event.action == KEY_HOLD:
+            keys.press(event.hid_keycode)
+            token = next(self.STATE.tokens)
+            self.STATE.hold_tokens[event.hid_keycode] = token
+            heapq.heappush(
+                self.STATE.releases,
+                _ScheduledRelease(time.monotonic() + event.duration, event.hid_keycode, token)
+            )
+        elif event.action == KEY_RELEASE_ALL:
+            keys.release_all()
+            self.STATE.hold_tokens.clear()
+            self.STATE.releases.clear()
+        else:
+            ez.logger.warning(f'Unknown key action {event.action!r}')
+
+    def _release_expired(self) -> None:
+        now = time.monotonic()
+        releases = self.STATE.releases
+        while releases and releases[0].deadline <= now:
+            release = heapq.heappop(releases)
+            if self.STATE.hold_tokens.get(release.hid_keycode) == release.token:
+                del self.STATE.hold_tokens[release.hid_keycode]
+                self.STATE.keys.release(release.hid_keycode)
+
+    @ez.publisher(OUTPUT_HID)
+    async def publish_reports(self) -> typing.AsyncGenerator:
+        while True:
+            timeout = None
+            if self.STATE.releases:
+                timeout = max(0.0, self.STATE.releases[0].deadline - time.monotonic())
+
+            try:
+                self._apply(await asyncio.wait_for(self.STATE.events.get(), timeout))
+            except asyncio.TimeoutError:
+                pass
+
+            self._release_expired()
+
+            report = self.STATE.keys.report()
+            if report != self.STATE.last:
+                self.STATE.last = report
+                yield self.OUTPUT_HID, report
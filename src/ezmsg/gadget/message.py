@@ -0,0 +1,146 @@
+import abc
+import copyreg
+import typing
+
+from dataclasses import dataclass
+
+
+class HIDMessage(abc.ABC):
+    __slots__ = () # Lets FrozenMessage subclasses go without a __dict__
+
+    @abc.abstractmethod
+    def report(self) -> bytearray:
+        raise NotImplementedError()
+
+    def report_size(self) -> int:
+        return len(self.report())
+
+    def report_into(self, buffer: bytearray, offset: int = 0) -> int:
+        # Encode this message into buffer at offset and return bytes written;
+        # subclasses override this with a precompiled struct.Struct.pack_into
+        report = self.report()
+        buffer[offset:offset + len(report)] = report
+        return len(report)
+
+    def schedule(self) -> typing.Optional[typing.Sequence[float]]:
+        # time.time() at which each report this message encodes should be
+        # written (see Mouse.Batch); None writes them all at once
+        return None
+
+    def merge(self, other: "HIDMessage") -> typing.Optional["HIDMessage"]:
+        # Return one message equivalent to writing self followed by other,
+        # or None if coalescing them would lose a transition (the default)
+        return None
+
+    @classmethod
+    def mergeable(cls) -> bool:
+        return cls.merge is not HIDMessage.merge
+
+
+@dataclass(frozen = True)
+class RawReport(HIDMessage):
+    # One or more already-encoded reports, written back-to-back
+    data: bytes = b''
+
+    def report(self) -> bytearray:
+        return bytearray(self.data)
+
+    def report_size(self) -> int:
+        return len(self.data)
+
+    def report_into(self, buffer: bytearray, offset: int = 0) -> int:
+        buffer[offset:offset + len(self.data)] = self.data
+        return len(self.data)
+
+
+class FrozenMessage(HIDMessage):
+    # An immutable message holding its encoded report(s): encoding happens
+    # once, in the constructor; report_into() is a copy, and pickling (across
+    # ezmsg processes or the network) sends just the class and report bytes.
+    # Subclasses encode their fields in __init__ (via _freeze), expose them
+    # as read-only properties decoded from _report, list them in _FIELDS and
+    # declare __slots__ = () so there is no __dict__ to set anything else in
+
+    __slots__ = ('_report',)
+    _FIELDS: typing.ClassVar[typing.Tuple[str, ...]] = ()
+    _report: bytes
+
+    @classmethod
+    def from_report(cls, report: bytes) -> "FrozenMessage":
+        # Without running __init__ (and re-encoding)
+        msg = cls.__new__(cls)
+        msg._freeze(bytes(report))
+        return msg
+
+    def _freeze(self, report: bytes) -> None:
+        self._report = report
+
+    def __reduce__(self) -> typing.Tuple[typing.Any, ...]:
+        # cls.__new__(cls), then the report bytes restored straight into the
+        # slot; all in C when unpickling
+        return (copyreg.__newobj__, (type(self),), (None, {'_report': self._report}))
+
+    def __eq__(self, other: object) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._report == typing.cast(FrozenMessage, other)._report
+
+    def __hash__(self) -> int:
+        return hash((type(self), self._report))
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self._FIELDS)
+        return f'{type(self).__qualname__}({fields})'
+
+    def report(self) -> bytearray:
+        return bytearray(self._report)
+
+    def report_size(self) -> int:
+        return len(self._report)
+
+    def report_into(self, buffer: bytearray, offset: int = 0) -> int:
+        buffer[offset:offset + len(self._report)] = self._report
+        return len(self._report)
+
+
+# Keyboard LED output report bits, in the keyboard's REPORT_DESC order
+LED_NUM_LOCK = 1 << 0
+LED_CAPS_LOCK = 1 << 1
+LED_SCROLL_LOCK = 1 << 2
+LED_GENERIC_INDICATOR = 1 << 3
+
+
+@dataclass(frozen = True)
+class LEDs:
+    # Decoded 1 byte LED output report sent by the host (Keyboard.LEDs); here
+    # so HIDDevice can declare its output stream without importing a codec
+    leds: int = 0x00
+    timestamp: float = 0.0 # time.time() when the report was read
+
+    @property
+    def num_lock(self) -> bool:
+        return bool(self.leds & LED_NUM_LOCK)
+
+    @property
+    def caps_lock(self) -> bool:
+        return bool(self.leds & LED_CAPS_LOCK)
+
+    @property
+    def scroll_lock(self) -> bool:
+        return bool(self.leds & LED_SCROLL_LOCK)
+
+
+def encode_reports(messages: typing.Sequence[HIDMessage]) -> bytearray:
+    # Encode many messages back-to-back into one contiguous buffer
+    buffer = bytearray(sum(msg.report_size() for msg in messages))
+    offset = 0
+    for msg in messages:
+        offset += msg.report_into(buffer, offset)
+    return buffer
+
+
+def split_reports(reports: memoryview, length: int) -> typing.List[memoryview]:
+    # Back-to-back reports of length bytes, one view each (hidg takes one per write)
+    if length <= 0:
+        return [reports]
+    return [reports[i:i + length] for i in range(0, len(reports), length)]
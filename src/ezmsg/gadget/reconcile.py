@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import typing
+
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .config import GadgetConfig, setup_gadget
+
+# Diff-based gadget setup.  The desired gadget is rendered into a scratch
+# directory by the usual setup_gadget (configfs attributes are just files),
+# then compared with the live tree so only differing attributes and links
+# are written.  Everything under a gadget is descriptor-level: if nothing
+# differs, a bound gadget is left alone and the host sees no re-enumeration.
+
+_CONFIG_DIR = 'configs'
+_FUNCTIONS_DIR = 'functions'
+
+
+@dataclass
+class GadgetDiff:
+    directories: typing.List[str] = field(default_factory = list) # to create, parents first
+    attributes: typing.Dict[str, bytes] = field(default_factory = dict) # path -> desired contents
+    links: typing.Dict[str, str] = field(default_factory = dict) # config link -> function dir
+    unlinks: typing.List[str] = field(default_factory = list) # config links to remove
+    removed: typing.List[str] = field(default_factory = list) # function dirs to remove
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.directories or self.attributes or self.links or self.unlinks or self.removed)
+
+
+def _same(desired: bytes, live: bytes) -> bool:
+    # configfs reads back text attributes with a trailing newline and
+    # sometimes in its own case (e.g. MAC addresses)
+    if desired == live:
+        return True
+    try:
+        return desired.decode().strip().lower() == live.decode().strip().lower()
+    except UnicodeDecodeError:
+        return False
+
+
+def _read(path: Path) -> typing.Optional[bytes]:
+    try:
+        return path.read_bytes()
+    except OSError:
+        return None
+
+
+def diff_gadget(config: GadgetConfig, gadget_dir: Path) -> GadgetDiff:
+    diff = GadgetDiff()
+    with tempfile.TemporaryDirectory() as scratch:
+        setup_gadget(gadget_path = Path(scratch), config = config)
+        staged = Path(scratch) / config.gadget_name
+
+        for path in sorted(staged.rglob('*')):
+            rel = path.relative_to(staged)
+            live = gadget_dir / rel
+            if path.is_symlink():
+                target = Path(os.readlink(path)).name
+                if not (live.is_symlink() and Path(os.readlink(live)).name == target):
+                    if live.is_symlink():
+                        diff.unlinks.append(str(rel))
+                    diff.links[str(rel)] = target
+            elif path.is_dir():
+                if not live.is_dir():
+                    diff.directories.append(str(rel))
+            else:
+                contents = path.read_bytes()
+                current = _read(live)
+                if current is None or not _same(contents, current):
+                    diff.attributes[str(rel)] = contents
+
+        # Functions and links that are no longer configured
+        for config_dir in (gadget_dir / _CONFIG_DIR).glob('*'):
+            for link in config_dir.iterdir():
+                rel = link.relative_to(gadget_dir)
+                if link.is_symlink() and not (staged / rel).is_symlink():
+                    diff.unlinks.append(str(rel))
+        for function in (gadget_dir / _FUNCTIONS_DIR).glob('*'):
+            if not (staged / _FUNCTIONS_DIR / function.name).is_dir():
+                diff.removed.append(str(function.relative_to(gadget_dir)))
+
+    return diff
+
+
+def _remove_dir(path: Path) -> None:
+    # configfs removes a group's attribute files itself; a plain directory
+    # standing in for configfs (tests, simulation) needs them removed
+    try:
+        os.rmdir(path)
+    except OSError:
+        shutil.rmtree(path)
+
+
+def _linked(gadget_dir: Path, functions: typing.Set[str]) -> typing.List[typing.Tuple[Path, Path]]:
+    # (link, target) for every config link to one of functions; a config
+    # holding any of them is listed whole, in link order, so relinking it
+    # keeps its interface numbering
+    links = []
+    for config_dir in sorted((gadget_dir / _CONFIG_DIR).glob('*')):
+        config_links = [link for link in config_dir.iterdir() if link.is_symlink()]
+        if any(Path(os.readlink(link)).name in functions for link in config_links):
+            links += [(link, Path(os.readlink(link))) for link in config_links]
+    return links
+
+
+def apply_gadget_diff(gadget_dir: Path, diff: GadgetDiff) -> None:
+    # The gadget must not be bound to a UDC while this runs
+    for rel in diff.unlinks:
+        os.unlink(gadget_dir / rel)
+    for rel in diff.removed:
+        _remove_dir(gadget_dir / rel)
+    for rel in diff.directories:
+        (gadget_dir / rel).mkdir(parents = True, exist_ok = True)
+
+    # configfs refuses (EBUSY) attribute writes to a function that is linked
+    # into a config, so those come out of their configs until written
+    changed = {
+        Path(rel).parts[1] for rel in diff.attributes
+        if Path(rel).parts[0] == _FUNCTIONS_DIR and len(Path(rel).parts) > 2
+    }
+    relinks = _linked(gadget_dir, changed)
+    for link, _ in relinks:
+        os.unlink(link)
+    for rel, contents in diff.attributes.items():
+        with open(gadget_dir / rel, 'wb', buffering = 0) as f:
+            f.write(contents)
+    for link, target in relinks:
+        os.symlink(target, link)
+
+    for rel, function in diff.links.items():
+        os.symlink(gadget_dir / _FUNCTIONS_DIR / function, gadget_dir / rel)
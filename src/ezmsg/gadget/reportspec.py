@@ -0,0 +1,330 @@
+import struct
+import typing
+
+from dataclasses import dataclass
+
+import numpy as np
+
+# Declarative HID report layouts.  A ReportSpec generates the REPORT_DESC
+# bytes, the report length and precompiled struct/NumPy codecs from one
+# list of fields, so a HIDDefinition can't drift out of sync with itself.
+# Source: Device Class Definition for HID 1.11, section 6.2.2
+
+# Short item prefixes (tag | type) without the size bits
+_USAGE_PAGE = 0x04
+_LOGICAL_MINIMUM = 0x14
+_LOGICAL_MAXIMUM = 0x24
+_REPORT_SIZE = 0x74
+_REPORT_ID = 0x84
+_REPORT_COUNT = 0x94
+_USAGE = 0x08
+_USAGE_MINIMUM = 0x18
+_USAGE_MAXIMUM = 0x28
+_INPUT = 0x80
+_OUTPUT = 0x90
+_COLLECTION = 0xA0
+_END_COLLECTION = 0xC0
+
+# Main item flags
+DATA = 0x00
+CONSTANT = 0x01
+ARRAY = 0x00
+VARIABLE = 0x02
+ABSOLUTE = 0x00
+RELATIVE = 0x04
+
+# Collection types
+COLLECTION_PHYSICAL = 0x00
+COLLECTION_APPLICATION = 0x01
+COLLECTION_LOGICAL = 0x02
+
+# Usage pages (HID Usage Tables 1.21)
+PAGE_GENERIC_DESKTOP = 0x01
+PAGE_KEYBOARD = 0x07
+PAGE_LED = 0x08
+PAGE_BUTTON = 0x09
+PAGE_DIGITIZER = 0x0D
+
+# Generic Desktop usages
+USAGE_POINTER = 0x01
+USAGE_MOUSE = 0x02
+USAGE_KEYBOARD = 0x06
+USAGE_X = 0x30
+USAGE_Y = 0x31
+USAGE_WHEEL = 0x38
+
+# LED usages
+USAGE_NUM_LOCK = 0x01
+USAGE_CAPS_LOCK = 0x02
+USAGE_SCROLL_LOCK = 0x03
+USAGE_GENERIC_INDICATOR = 0x4B
+
+# Digitizer usages
+USAGE_PEN = 0x02
+USAGE_TOUCH_SCREEN = 0x04
+USAGE_STYLUS = 0x20
+USAGE_FINGER = 0x22
+USAGE_IN_RANGE = 0x32
+USAGE_TIP_SWITCH = 0x42
+USAGE_CONTACT_IDENTIFIER = 0x51
+USAGE_CONTACT_COUNT = 0x54
+
+INPUT = 'input'
+OUTPUT = 'output'
+
+
+@dataclass(frozen = True)
+class Field:
+    # One main item; name = None for constant padding
+    name: typing.Optional[str]
+    size: int # bits per element (REPORT_SIZE)
+    count: int = 1 # elements (REPORT_COUNT)
+    usage_page: typing.Optional[int] = None # None inherits the enclosing page
+    usages: typing.Tuple[int, ...] = ()
+    usage_minimum: typing.Optional[int] = None
+    usage_maximum: typing.Optional[int] = None
+    logical_minimum: int = 0
+    logical_maximum: int = 1
+    flags: int = DATA | VARIABLE | ABSOLUTE
+    direction: str = INPUT
+
+    @property
+    def bits(self) -> int:
+        return self.size * self.count
+
+    @property
+    def signed(self) -> bool:
+        return self.logical_minimum < 0
+
+
+def padding(bits: int, direction: str = INPUT) -> Field:
+    return Field(None, size = 1, count = bits, flags = CONSTANT, direction = direction)
+
+
+@dataclass(frozen = True)
+class Collection:
+    usage_page: int
+    usage: int
+    kind: int
+    items: typing.Tuple[typing.Union[Field, "Collection"], ...]
+
+
+def _data(value: int, signed: bool) -> bytes:
+    # Shortest little-endian encoding (1, 2 or 4 bytes) that round-trips
+    for size in (1, 2, 4):
+        lo, hi = (-(1 << (8 * size - 1)), (1 << (8 * size - 1)) - 1) if signed else (0, (1 << (8 * size)) - 1)
+        if lo <= value <= hi:
+            return value.to_bytes(size, 'little', signed = signed)
+    raise ValueError(f'{value} does not fit in a short item')
+
+
+def _item(prefix: int, value: int, signed: bool = False) -> bytes:
+    data = _data(value, signed)
+    return bytes([prefix | {1: 1, 2: 2, 4: 3}[len(data)]]) + data
+
+
+class _Emitter:
+    # Tracks global item state so each global is only written when it changes
+
+    def __init__(self) -> None:
+        self.out = bytearray()
+        self.globals: typing.Dict[int, int] = {}
+
+    def set_global(self, prefix: int, value: int, signed: bool = False) -> None:
+        if self.globals.get(prefix, None) != value:
+            self.out += _item(prefix, value, signed)
+            self.globals[prefix] = value
+
+    def local(self, prefix: int, value: int) -> None:
+        self.out += _item(prefix, value)
+
+    def collection(self, collection: Collection, report_id: int = 0) -> None:
+        self.set_global(_USAGE_PAGE, collection.usage_page)
+        self.local(_USAGE, collection.usage)
+        self.local(_COLLECTION, collection.kind)
+        if report_id:
+            self.set_global(_REPORT_ID, report_id)
+        for group in _coalesce(collection.items):
+            if isinstance(group, Collection):
+                self.collection(group)
+            else:
+                self.field(*group)
+        self.out.append(_END_COLLECTION)
+
+    def field(self, field: Field, usages: typing.Tuple[int, ...], count: int) -> None:
+        if field.name is not None:
+            if field.usage_page is not None:
+                self.set_global(_USAGE_PAGE, field.usage_page)
+            for usage in usages:
+                self.local(_USAGE, usage)
+            if field.usage_minimum is not None:
+                self.local(_USAGE_MINIMUM, field.usage_minimum)
+            if field.usage_maximum is not None:
+                self.local(_USAGE_MAXIMUM, field.usage_maximum)
+            self.set_global(_LOGICAL_MINIMUM, field.logical_minimum, signed = True)
+            self.set_global(_LOGICAL_MAXIMUM, field.logical_maximum, signed = True)
+        self.set_global(_REPORT_SIZE, field.size)
+        self.set_global(_REPORT_COUNT, count)
+        self.local(_INPUT if field.direction == INPUT else _OUTPUT, field.flags)
+
+
+def _coalesce(
+    items: typing.Iterable[typing.Union[Field, Collection]]
+) -> typing.Iterator[typing.Union[Collection, typing.Tuple[Field, typing.Tuple[int, ...], int]]]:
+    # Consecutive single-usage variable fields with identical attributes
+    # (e.g. X and Y) share one main item, as a hand-written descriptor would
+    run: typing.List[Field] = []
+
+    def key(f: Field) -> typing.Tuple:
+        return (f.usage_page, f.size, f.logical_minimum, f.logical_maximum, f.flags, f.direction)
+
+    def flush() -> typing.Iterator[typing.Tuple[Field, typing.Tuple[int, ...], int]]:
+        if run:
+            usages = tuple(u for f in run for u in f.usages)
+            yield run[0], usages, sum(f.count for f in run)
+            run.clear()
+
+    for item in items:
+        joinable = (
+            isinstance(item, Field) and item.name is not None and item.flags & VARIABLE
+            and len(item.usages) == item.count and item.usage_minimum is None
+        )
+        if joinable and run and key(run[-1]) == key(item): # type: ignore
+            run.append(item) # type: ignore
+            continue
+        yield from flush()
+        if joinable:
+            run.append(item) # type: ignore
+        elif isinstance(item, Collection):
+            yield item
+        else:
+            yield item, item.usages, item.count # type: ignore
+    yield from flush()
+
+
+def _flatten(items: typing.Iterable[typing.Union[Field, Collection]]) -> typing.Iterator[Field]:
+    for item in items:
+        if isinstance(item, Collection):
+            yield from _flatten(item.items)
+        else:
+            yield item
+
+
+class ReportLayout:
+    # Byte layout of one report direction, compiled to struct and NumPy codecs
+
+    fields: typing.Tuple[Field, ...] # named fields, in report order
+    length: int # bytes
+    struct: struct.Struct
+    dtype: np.dtype
+
+    def __init__(self, fields: typing.Sequence[Field]) -> None:
+        fmt = '<'
+        names: typing.List[str] = []
+        formats: typing.List[typing.Any] = []
+        offsets: typing.List[int] = []
+        named: typing.List[Field] = []
+
+        bit = 0
+        for i, field in enumerate(fields):
+            aligned = bit % 8 == 0
+            if field.name is None:
+                # Padding either fills whole bytes or closes an open bitmask byte
+                rest = field.bits if aligned else field.bits - (8 - bit % 8)
+                if rest < 0 or rest % 8 != 0:
+                    raise ValueError(f'Padding at bit {bit} must end on a byte boundary')
+                if rest:
+                    fmt += f'{rest // 8}x'
+            elif aligned and field.size in (8, 16, 32):
+                code = {8: 'B', 16: 'H', 32: 'I'}[field.size]
+                fmt += f'{field.count}{code}' if field.count > 1 else code
+                dtype = np.dtype(f'<u{field.size // 8}')
+                formats.append(dtype if field.count == 1 else (dtype, (field.count,)))
+            elif aligned and field.bits <= 8:
+                # A bitmask (buttons, modifiers, LEDs) packed as one integer;
+                # anything after it up to the byte boundary must be padding
+                if field.bits < 8 and (i + 1 == len(fields) or fields[i + 1].name is not None):
+                    raise ValueError(f'Bitmask field {field.name} must be padded to a byte')
+                fmt += 'B'
+                formats.append(np.dtype('u1'))
+            else:
+                raise ValueError(f'Unsupported layout for field {field.name} at bit {bit}')
+
+            if field.name is not None:
+                names.append(field.name)
+                offsets.append(bit // 8)
+                named.append(field)
+            bit += field.bits
+
+        if bit % 8 != 0:
+            raise ValueError('Report is not a whole number of bytes')
+
+        self.fields = tuple(named)
+        self.length = bit // 8
+        self.struct = struct.Struct(fmt)
+        self.dtype = np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': self.length})
+        assert self.struct.size == self.length
+
+    def unpack(self, report: bytes, offset: int = 0) -> typing.Dict[str, typing.Any]:
+        values = iter(self.struct.unpack_from(report, offset))
+        out: typing.Dict[str, typing.Any] = {}
+        for field in self.fields:
+            if field.size in (8, 16, 32):
+                elements = tuple(_signed(next(values), field) for _ in range(field.count))
+                out[typing.cast(str, field.name)] = elements if field.count > 1 else elements[0]
+            else:
+                out[typing.cast(str, field.name)] = next(values)
+        return out
+
+
+def _signed(value: int, field: Field) -> int:
+    if field.signed and value >= 1 << (field.size - 1):
+        return value - (1 << field.size)
+    return value
+
+
+class ReportSpec:
+
+    usage_page: int
+    usage: int
+    items: typing.Tuple[typing.Union[Field, Collection], ...]
+    report_id: int # 0 for a device with a single, unnumbered report
+    descriptor: bytes
+    input: ReportLayout # Layouts exclude the report ID byte
+    output: ReportLayout
+
+    def __init__(
+        self,
+        usage_page: int,
+        usage: int,
+        items: typing.Sequence[typing.Union[Field, Collection]],
+        report_id: int = 0
+    ) -> None:
+        if not 0 <= report_id <= 255:
+            raise ValueError(f'Report ID {report_id} does not fit in a byte')
+        self.usage_page = usage_page
+        self.usage = usage
+        self.items = tuple(items)
+        self.report_id = report_id
+
+        emitter = _Emitter()
+        emitter.collection(Collection(usage_page, usage, COLLECTION_APPLICATION, self.items), report_id)
+        self.descriptor = bytes(emitter.out)
+
+        fields = list(_flatten(self.items))
+        self.input = ReportLayout([f for f in fields if f.direction == INPUT])
+        self.output = ReportLayout([f for f in fields if f.direction == OUTPUT])
+
+    @property
+    def report_length(self) -> int:
+        # hidg's report_length covers both directions (and the report ID)
+        return max(self.input.length, self.output.length) + (1 if self.report_id else 0)
+
+    def with_report_id(self, report_id: int) -> "ReportSpec":
+        return ReportSpec(self.usage_page, self.usage, self.items, report_id)
+
+    def __getitem__(self, name: str) -> Field:
+        for field in self.input.fields + self.output.fields:
+            if field.name == name:
+                return field
+        raise KeyError(name)
@@ -0,0 +1,278 @@
+import asyncio
+import collections
+import os
+import socket
+import struct
+import typing
+
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+import ezmsg.core as ez
+
+from usb_gadget import HIDFunction
+
+from .config import GadgetConfig
+from .discovery import discover
+from .function import Composite
+from .reportspec import ReportLayout
+
+# Raw report ingestion for producers that can't (or shouldn't) join an
+# ezmsg graph.  Each datagram, on a Unix datagram socket and/or UDP, is
+#
+#   [version (u8), flags (u8), function id (u8), sequence (u32, if FLAG_SEQUENCE), payload]
+#
+# little-endian, where function id is the function's position among the HID
+# functions in the config file (0 = first) and payload is either
+#
+#   raw:    the report bytes exactly as written to /dev/hidgN (a Composite
+#           report starts with its report ID)
+#   fields (FLAG_FIELDS): one i32 per value of the function's input report,
+#           in descriptor order (arrays element by element); the server does
+#           the bit packing.  Not available for Composite functions
+#
+# With FLAG_SEQUENCE, a packet whose sequence isn't newer than the last one
+# accepted for that function (serial number arithmetic, so it may wrap) is
+# dropped as stale; sequence 0 is always accepted so a restarted producer
+# can start over.  Use one sequenced producer per function.
+#
+# Writes are made straight from the socket callback on an O_NONBLOCK
+# descriptor; while the host isn't taking reports, they queue (in order) and
+# are flushed as soon as the node is writable again.
+
+PACKET_VERSION = 1
+FLAG_SEQUENCE = 0x01
+FLAG_FIELDS = 0x02
+
+_HEADER = struct.Struct('<BBB')
+_SEQUENCE = struct.Struct('<I')
+_HALF = 1 << 31
+
+
+def encode_packet(
+        function_id: int,
+        payload: bytes,
+        sequence: typing.Optional[int] = None,
+        fields: bool = False
+    ) -> bytes:
+    # For Python producers and tests; anything that can build a few bytes works
+    flags = (FLAG_FIELDS if fields else 0) | (0 if sequence is None else FLAG_SEQUENCE)
+    header = _HEADER.pack(PACKET_VERSION, flags, function_id)
+    if sequence is not None:
+        header += _SEQUENCE.pack(sequence & 0xFFFFFFFF)
+    return header + bytes(payload)
+
+
+def encode_fields(*values: int) -> bytes:
+    return struct.pack(f'<{len(values)}i', *values)
+
+
+class FieldCodec:
+    # Packs a fields payload into one input report
+
+    layout: ReportLayout
+    values: struct.Struct
+    masks: typing.Tuple[int, ...] # two's complement wrap for each struct argument
+
+    def __init__(self, layout: ReportLayout) -> None:
+        masks: typing.List[int] = []
+        for field in layout.fields:
+            if field.size in (8, 16, 32):
+                masks += [(1 << field.size) - 1] * field.count
+            else:
+                masks.append(0xFF) # bitmask packed as one byte
+        self.layout = layout
+        self.values = struct.Struct(f'<{len(masks)}i')
+        self.masks = tuple(masks)
+
+    def pack_into(self, buffer: bytearray, payload: memoryview) -> int:
+        values = self.values.unpack(payload)
+        self.layout.struct.pack_into(buffer, 0, *[v & m for v, m in zip(values, self.masks)])
+        return self.layout.length
+
+
+@dataclass
+class ServeCounters:
+    received: int = 0
+    written: int = 0 # reports written to a node
+    stale: int = 0 # dropped for an old sequence number
+    invalid: int = 0 # dropped as malformed or for an unknown function
+    write_errors: int = 0
+
+
+class _Target:
+    # One HID function being served
+
+    name: str
+    fd: int
+    report_length: int
+    codec: typing.Optional[FieldCodec]
+    sequence: typing.Optional[int] # last accepted
+    pending: typing.Deque[bytes] # reports waiting for the node to become writable
+
+    def __init__(self, name: str, fd: int, function_type: typing.Type[HIDFunction]) -> None:
+        self.name = name
+        self.fd = fd
+        self.report_length = getattr(function_type, 'REPORT_LENGTH', 0)
+        spec = getattr(function_type, 'SPEC', None)
+        composite = issubclass(function_type, Composite)
+        self.codec = None if spec is None or composite else FieldCodec(spec.input)
+        self.sequence = None
+        self.pending = collections.deque()
+
+
+class ReportServer:
+
+    targets: typing.List[_Target] # indexed by function id
+    counters: ServeCounters
+
+    def __init__(self, targets: typing.List[_Target]) -> None:
+        self.targets = targets
+        self.counters = ServeCounters()
+        self._buffer = bytearray(64) # Max interrupt packet size for full-speed HID
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    async def open(
+            cls,
+            config: GadgetConfig,
+            device_paths: typing.Optional[typing.Dict[str, Path]] = None
+        ) -> "ReportServer":
+        # device_paths overrides discovery per function name
+        device_paths = device_paths or {}
+        targets = []
+        for name, (function_type, _) in config.functions.items():
+            if not issubclass(function_type, HIDFunction):
+                continue
+            path = device_paths.get(name, None)
+            if path is None:
+                path = await discover(config, name)
+            fd = os.open(str(path), os.O_RDWR | os.O_NONBLOCK)
+            targets.append(_Target(name, fd, function_type))
+        return cls(targets)
+
+    def close(self) -> None:
+        for target in self.targets:
+            if target.pending and self._loop is not None:
+                self._loop.remove_writer(target.fd)
+            os.close(target.fd)
+        self.targets = []
+
+    def handle(self, packet: bytes) -> None:
+        self.counters.received += 1
+        view = memoryview(packet)
+        try:
+            version, flags, function_id = _HEADER.unpack_from(view)
+            if version != PACKET_VERSION:
+                raise ValueError(f'Unsupported packet version {version}')
+            target = self.targets[function_id]
+            offset = _HEADER.size
+            sequence = None
+            if flags & FLAG_SEQUENCE:
+                sequence, = _SEQUENCE.unpack_from(view, offset)
+                offset += _SEQUENCE.size
+                last = target.sequence
+                if sequence != 0 and last is not None and not 0 < (sequence - last) % (1 << 32) < _HALF:
+                    self.counters.stale += 1
+                    return
+            payload = view[offset:]
+            if flags & FLAG_FIELDS:
+                if target.codec is None:
+                    raise ValueError(f'{target.name} does not take field-encoded reports')
+                size = target.codec.pack_into(self._buffer, payload)
+                report = memoryview(self._buffer)[:size]
+            else:
+                if not payload or (target.report_length and len(payload) > target.report_length):
+                    raise ValueError(f'Bad report length {len(payload)} for {target.name}')
+                report = payload
+        except (ValueError, IndexError, struct.error):
+            self.counters.invalid += 1
+            return
+        # Only a valid packet moves the sequence on; a malformed one mustn't
+        # make the good packets that follow it look stale
+        if sequence is not None:
+            target.sequence = sequence
+        self._write(target, report)
+
+    def _write(self, target: _Target, report: memoryview) -> None:
+        if not target.pending:
+            try:
+                os.write(target.fd, report)
+                self.counters.written += 1
+                return
+            except BlockingIOError:
+                self._loop = asyncio.get_running_loop()
+                self._loop.add_writer(target.fd, self._flush, target)
+            except OSError:
+                self.counters.write_errors += 1
+                return
+        target.pending.append(bytes(report))
+
+    def _flush(self, target: _Target) -> None:
+        while target.pending:
+            try:
+                os.write(target.fd, target.pending[0])
+            except BlockingIOError:
+                return # Still busy; wait for the next writable callback
+            except OSError:
+                self.counters.write_errors += 1
+            else:
+                self.counters.written += 1
+            target.pending.popleft()
+        typing.cast(asyncio.AbstractEventLoop, self._loop).remove_writer(target.fd)
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, server: ReportServer) -> None:
+        self.server = server
+
+    def datagram_received(self, data: bytes, addr: typing.Any) -> None:
+        self.server.handle(data)
+
+
+async def listen(
+        server: ReportServer,
+        unix_path: typing.Optional[Path] = None,
+        udp_addr: typing.Optional[typing.Tuple[str, int]] = None
+    ) -> typing.List[asyncio.DatagramTransport]:
+    # Returns the transports; close them to stop listening
+    loop = asyncio.get_running_loop()
+    transports = []
+    if unix_path is not None:
+        unix_path.parent.mkdir(parents = True, exist_ok = True)
+        if unix_path.is_socket():
+            unix_path.unlink() # Left behind by a previous server
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(str(unix_path))
+        transport, _ = await loop.create_datagram_endpoint(lambda: _Protocol(server), sock = sock)
+        transports.append(transport)
+    if udp_addr is not None:
+        transport, _ = await loop.create_datagram_endpoint(lambda: _Protocol(server), local_addr = udp_addr)
+        transports.append(transport)
+    return transports
+
+
+def serve(config_path: typing.Optional[Path] = None) -> None:
+    config = GadgetConfig(config_path)
+    unix_path, udp_addr = config.serve_unix_path, config.serve_udp_addr
+
+    async def run() -> None:
+        server = await ReportServer.open(config)
+        transports = await listen(server, unix_path, udp_addr)
+        for function_id, target in enumerate(server.targets):
+            ez.logger.info(f'Serving {target.name} as function id {function_id}')
+        ez.logger.info(f'Listening on {[t.get_extra_info("sockname") for t in transports]}')
+        try:
+            await asyncio.Event().wait()
+        finally:
+            for transport in transports:
+                transport.close()
+            server.close()
+            if unix_path is not None:
+                unix_path.unlink(missing_ok = True)
+            ez.logger.info(f'Served {asdict(server.counters)}')
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
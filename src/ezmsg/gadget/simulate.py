@@ -0,0 +1,91 @@
+import os
+import shutil
+import typing
+
+from pathlib import Path
+
+# Set this to a directory to run activate/deactivate/endpoint against a
+# simulated configfs, UDC, /sys/dev/char and /dev tree rooted there
+# instead of the real kernel interfaces.  No USB hardware or root needed.
+SIMULATE_ENV = 'EZMSG_GADGET_SIMULATE'
+
+SIMULATED_UDC = 'dummy_udc.0'
+SIMULATED_HIDG_MAJOR = 240 # First dynamically allocated char major
+
+_UDC_DIR = lambda root: root / 'sys' / 'class' / 'udc'
+_DEV_CHAR_DIR = lambda root: root / 'sys' / 'dev' / 'char'
+_DEV_DIR = lambda root: root / 'dev'
+
+
+def simulation_root() -> typing.Optional[Path]:
+    root = os.environ.get(SIMULATE_ENV, None)
+    return Path(root) if root else None
+
+
+def system_path(path: Path, root: typing.Optional[Path] = None) -> Path:
+    # Re-root an absolute system path under the simulation root (if any)
+    root = simulation_root() if root is None else root
+    return path if root is None else root / path.relative_to('/')
+
+
+def prepare(root: Path, gadget_path: Path) -> None:
+    # What modprobe dwc2/libcomposite/dummy_hcd would have provided
+    gadget_path.mkdir(parents = True, exist_ok = True)
+    (_UDC_DIR(root) / SIMULATED_UDC).mkdir(parents = True, exist_ok = True)
+    _DEV_CHAR_DIR(root).mkdir(parents = True, exist_ok = True)
+    _DEV_DIR(root).mkdir(parents = True, exist_ok = True)
+
+
+def udc_ports(root: typing.Optional[Path] = None) -> typing.List[str]:
+    udc_dir = system_path(Path('/sys/class/udc'), root)
+    return sorted(os.listdir(udc_dir)) if udc_dir.is_dir() else []
+
+
+def bind(root: Path, gadget_dir: Path) -> typing.Dict[str, Path]:
+    # Stand in for the kernel when a gadget is bound to a UDC: each hid.*
+    # function gets a dev attribute, a /sys/dev/char/<maj:min>/uevent and
+    # a /dev/hidgN node (a regular file, so every backend can open it)
+    nodes: typing.Dict[str, Path] = {}
+    functions = sorted(p for p in (gadget_dir / 'functions').glob('hid.*') if p.is_dir())
+    for minor, function in enumerate(functions):
+        dev = f'{SIMULATED_HIDG_MAJOR}:{minor}'
+        devname = f'hidg{minor}'
+        (function / 'dev').write_text(f'{dev}\n')
+
+        kobj = _DEV_CHAR_DIR(root) / dev
+        kobj.mkdir(parents = True, exist_ok = True)
+        (kobj / 'uevent').write_text(
+            f'MAJOR={SIMULATED_HIDG_MAJOR}\nMINOR={minor}\nDEVNAME={devname}\n'
+        )
+
+        node = _DEV_DIR(root) / devname
+        node.touch()
+        nodes[function.name[len('hid.'):]] = node
+    return nodes
+
+
+def unbind(root: Path, gadget_dir: Path) -> None:
+    # Stand in for the kernel when the gadget is unbound from its UDC:
+    # the hidg nodes and their /sys/dev/char entries go away
+    from .discovery import device_node # discovery resolves paths through this module
+
+    for function in (gadget_dir / 'functions').glob('hid.*'):
+        dev = function / 'dev'
+        if dev.is_file():
+            try:
+                device_node(dev.read_text(), root).unlink(missing_ok = True)
+            except FileNotFoundError:
+                pass
+            shutil.rmtree(_DEV_CHAR_DIR(root) / dev.read_text().strip(), ignore_errors = True)
+            dev.unlink()
+
+    udc = gadget_dir / 'UDC'
+    if udc.is_file():
+        udc.write_text('')
+
+
+def destroy(root: Path, gadget_dir: Path) -> None:
+    # Drop the device nodes and the gadget tree; configfs removes attribute
+    # files and default groups by itself, so USBGadget.destroy can't be used
+    unbind(root, gadget_dir)
+    shutil.rmtree(gadget_dir)
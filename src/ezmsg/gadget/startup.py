@@ -0,0 +1,109 @@
+import contextlib
+import json
+import platform
+import sys
+import time
+import typing
+
+from pathlib import Path
+
+import ezmsg.core as ez
+
+from . import __version__
+from .config import GadgetConfig
+from .function import Composite
+from .hiddevice import hid_devices
+from .message import RawReport
+
+# Wall-clock breakdown of everything between 'activate' and the first
+# report reaching a hidg node, for checking releases against a boot budget
+
+
+class PhaseTimer:
+
+    phases: typing.List[typing.Dict[str, typing.Any]]
+
+    def __init__(self) -> None:
+        self.phases = []
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> typing.Iterator[None]:
+        start = time.perf_counter()
+        entry: typing.Dict[str, typing.Any] = {'phase': name}
+        try:
+            yield
+        except Exception as e:
+            entry['error'] = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            entry['seconds'] = time.perf_counter() - start
+            self.phases.append(entry)
+
+    @property
+    def total(self) -> float:
+        return sum(entry['seconds'] for entry in self.phases)
+
+
+def _neutral_report(function_type: type) -> RawReport:
+    # An all-released report, harmless to send to a real host
+    if issubclass(function_type, Composite):
+        return RawReport(bytes([1]) + bytes(function_type.SPECS[0].input.length))
+    return RawReport(bytes(function_type.SPEC.input.length))
+
+
+async def profile_endpoint(config: GadgetConfig, timer: PhaseTimer) -> None:
+    # The endpoint's own startup: GraphServer session, device setup, first write
+    try:
+        with timer.phase('graphserver connect'):
+            async with ez.GraphContext(config.endpoint_remote_addr, auto_start = False):
+                pass
+    except OSError as e:
+        ez.logger.warning(f'No GraphServer at {config.endpoint_remote_addr}: {e}')
+
+    devices = hid_devices(config, capture = False)
+    with timer.phase('device setup'):
+        for device in devices.values():
+            await device.setup()
+
+    try:
+        for name, device in devices.items():
+            function_type, _ = config.functions[name]
+            with timer.phase('first write'):
+                await device.write(_neutral_report(function_type))
+            break
+    finally:
+        for device in devices.values():
+            await device.shutdown()
+
+
+def profile_record(timer: PhaseTimer, config: GadgetConfig, simulated: bool) -> typing.Dict[str, typing.Any]:
+    return {
+        'meta': {
+            'version': __version__,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'config': str(config.path),
+            'simulated': simulated,
+        },
+        'phases': timer.phases,
+        'total': timer.total
+    }
+
+
+def format_profile(record: typing.Dict[str, typing.Any]) -> str:
+    total = record['total'] or 1.0
+    lines = [f'{"phase":<20} {"ms":>9} {"share":>6}']
+    for entry in record['phases']:
+        line = f'{entry["phase"]:<20} {entry["seconds"] * 1e3:>9.2f} {entry["seconds"] / total:>6.1%}'
+        if 'error' in entry:
+            line += f'  ({entry["error"]})'
+        lines.append(line)
+    lines.append(f'{"total":<20} {record["total"] * 1e3:>9.2f}')
+    return '\n'.join(lines)
+
+
+def save_profile(record: typing.Dict[str, typing.Any], path: Path) -> None:
+    path.parent.mkdir(parents = True, exist_ok = True)
+    path.write_text(json.dumps(record, indent = 2))
@@ -0,0 +1,158 @@
+import bisect
+import json
+import time
+import typing
+
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+
+# Latency histogram bucket upper edges (sec): 10 us ... ~10 s, 4 per decade
+LATENCY_BUCKETS: typing.Tuple[float, ...] = tuple(10 ** (e / 4) * 1e-5 for e in range(25))
+
+
+class LatencyHistogram:
+    # Fixed log-spaced buckets; the last count is for anything slower
+
+    counts: typing.List[int]
+    max: float
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.max = 0.0
+
+    def record(self, latency: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        if latency > self.max:
+            self.max = latency
+
+    def percentile(self, q: float) -> float:
+        # Upper bucket edge containing the q-th percentile (q in [0, 100])
+        total = sum(self.counts)
+        if total == 0:
+            return 0.0
+        rank = q / 100.0 * total
+        seen = 0
+        for edge, count in zip(LATENCY_BUCKETS + (self.max,), self.counts):
+            seen += count
+            if seen >= rank:
+                return min(edge, self.max)
+        return self.max
+
+
+@dataclass(frozen = True)
+class HIDDeviceStats:
+    function_name: str
+    timestamp: float # time.time()
+    uptime: float # sec since the device was opened
+    received: int # messages received on INPUT_HID
+    writes: int # writes to the hidg node (after coalescing)
+    reports: int # reports written
+    bytes: int # bytes written
+    merged: int # messages coalesced away by the write queue
+    write_errors: int
+    backlog: int # messages waiting in the write queue
+    write_span: float # sec between the first and last completed write
+    latency_p50: float # sec; message arrival to write completion
+    latency_p99: float
+    latency_max: float
+    latency_histogram: typing.Tuple[int, ...] = field(default = ()) # counts per LATENCY_BUCKETS
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, text: str) -> "HIDDeviceStats":
+        data = json.loads(text)
+        data['latency_histogram'] = tuple(data.get('latency_histogram', ()))
+        return cls(**data)
+
+
+class DeviceCounters:
+    # Mutable counters updated on the HIDDevice write path
+
+    function_name: str
+    received: int
+    writes: int
+    reports: int
+    bytes: int
+    write_errors: int
+    latency: LatencyHistogram
+    first_write: typing.Optional[float]
+    last_write: float
+    _start: float
+
+    def __init__(self, function_name: str) -> None:
+        self.function_name = function_name
+        self.received = 0
+        self.writes = 0
+        self.reports = 0
+        self.bytes = 0
+        self.write_errors = 0
+        self.latency = LatencyHistogram()
+        self.first_write = None
+        self.last_write = 0.0
+        self._start = time.perf_counter()
+
+    def record_write(self, nbytes: int, report_length: int, arrival: float) -> None:
+        now = time.perf_counter()
+        if self.first_write is None:
+            self.first_write = now
+        self.last_write = now
+        self.writes += 1
+        self.reports += max(1, nbytes // report_length) if report_length > 0 else 1
+        self.bytes += nbytes
+        self.latency.record(now - arrival)
+
+    def snapshot(self, backlog: int = 0, merged: int = 0) -> HIDDeviceStats:
+        return HIDDeviceStats(
+            function_name = self.function_name,
+            timestamp = time.time(),
+            uptime = time.perf_counter() - self._start,
+            received = self.received,
+            writes = self.writes,
+            reports = self.reports,
+            bytes = self.bytes,
+            merged = merged,
+            write_errors = self.write_errors,
+            backlog = backlog,
+            write_span = 0.0 if self.first_write is None else self.last_write - self.first_write,
+            latency_p50 = self.latency.percentile(50),
+            latency_p99 = self.latency.percentile(99),
+            latency_max = self.latency.max,
+            latency_histogram = tuple(self.latency.counts),
+        )
+
+
+def write_stats(stats: HIDDeviceStats, stats_dir: Path) -> None:
+    # Atomically replace <stats_dir>/<function>.json
+    stats_dir.mkdir(parents = True, exist_ok = True)
+    path = stats_dir / f'{stats.function_name}.json'
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(stats.to_json())
+    tmp.replace(path)
+
+
+def read_stats(stats_dir: Path) -> typing.List[HIDDeviceStats]:
+    stats: typing.List[HIDDeviceStats] = []
+    if stats_dir.is_dir():
+        for path in sorted(stats_dir.glob('*.json')):
+            try:
+                stats.append(HIDDeviceStats.from_json(path.read_text()))
+            except (ValueError, TypeError):
+                continue
+    return stats
+
+
+def format_stats(stats: typing.Sequence[HIDDeviceStats]) -> str:
+    lines = [
+        f'{"function":<12} {"age s":>6} {"received":>9} {"reports":>9} {"bytes":>10} '
+        f'{"merged":>8} {"errors":>6} {"backlog":>7} {"p50 ms":>7} {"p99 ms":>7} {"max ms":>7}'
+    ]
+    now = time.time()
+    for s in stats:
+        lines.append(
+            f'{s.function_name:<12} {now - s.timestamp:>6.1f} {s.received:>9} {s.reports:>9} {s.bytes:>10} '
+            f'{s.merged:>8} {s.write_errors:>6} {s.backlog:>7} {s.latency_p50 * 1e3:>7.2f} '
+            f'{s.latency_p99 * 1e3:>7.2f} {s.latency_max * 1e3:>7.2f}'
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,200 @@
+import asyncio
+import random
+import threading
+import time
+import typing
+
+import ezmsg.core as ez
+
+from ezmsg.core.graphserver import GraphService
+from ezmsg.core.netprotocol import Address, close_stream_writer
+
+from .config import GadgetConfig
+from .handle import HANDLE_POOL
+from .hiddevice import hid_devices
+
+# Keep the endpoint alive across GraphServer restarts.  ezmsg doesn't notice
+# when its GraphServer goes away, so a watchdog holds an idle connection
+# open and ends the graph when the server closes it, or when the server
+# stops answering pings (a rebooted remote host never closes the
+# connection; nor does a GraphServer stopped in-process).  The supervisor then
+# waits for the server to come back (jittered exponential backoff) and
+# starts a fresh graph.  Device nodes stay open in HANDLE_POOL and their
+# discovery results stay cached, so a restart only rebuilds the ezmsg side.
+# Setting the stop event (or Ctrl-C) ends the graph and any backoff within
+# a watchdog period.
+
+RECONNECT_INITIAL = 0.05 # sec
+RECONNECT_MAX = 2.0 # sec
+WATCHDOG_PERIOD = 0.25 # sec between pings
+SHUTDOWN_TIMEOUT = 2.0 # sec to wait for a graph to wind down once it has ended
+
+# Set by the watchdog; distinguishes a lost server from a normal shutdown
+_graph_lost = threading.Event()
+
+# The running supervisor's stop event; the watchdog ends the graph when it is
+# set (ezmsg settings must pickle, so it can't go in GraphWatchdogSettings)
+_stop = threading.Event()
+
+
+def backoff(
+        initial: float = RECONNECT_INITIAL,
+        maximum: float = RECONNECT_MAX,
+        rng: typing.Optional[random.Random] = None
+    ) -> typing.Iterator[float]:
+    # "Equal jitter": each delay is uniform in [d/2, d] for d = initial * 2^n,
+    # so several endpoints restarting at once don't reconnect in lockstep
+    rng = random.Random() if rng is None else rng
+    delay = initial
+    while True:
+        yield delay / 2 + rng.uniform(0, delay / 2)
+        delay = min(maximum, delay * 2)
+
+
+async def _probe(address: typing.Tuple[str, int], timeout: float = WATCHDOG_PERIOD) -> bool:
+    # An unreachable host can leave connect() hanging for minutes
+    try:
+        _, writer = await asyncio.wait_for(GraphService(Address(*address)).open_connection(), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    await _close(writer, timeout)
+    return True
+
+
+async def _close(writer: asyncio.StreamWriter, timeout: float) -> None:
+    # Don't wait on a peer that is gone for the close to complete
+    try:
+        await asyncio.wait_for(close_stream_writer(writer), timeout)
+    except (OSError, asyncio.TimeoutError):
+        pass
+
+
+def wait_for_graphserver(
+        address: typing.Tuple[str, int],
+        delays: typing.Optional[typing.Iterator[float]] = None,
+        timeout: typing.Optional[float] = None,
+        stop: typing.Optional[threading.Event] = None
+    ) -> bool:
+    # True once a GraphServer accepts connections; False after timeout sec
+    # or as soon as stop is set
+    delays = backoff() if delays is None else delays
+    stop = threading.Event() if stop is None else stop
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not asyncio.run(_probe(address)):
+        delay = next(delays)
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            delay = min(delay, remaining)
+        if stop.wait(delay):
+            return False
+    return True
+
+
+class GraphWatchdogSettings(ez.Settings):
+    address: typing.Tuple[str, int]
+    period: float = WATCHDOG_PERIOD
+
+
+class GraphWatchdog(ez.Unit):
+    SETTINGS = GraphWatchdogSettings
+
+    @ez.task
+    async def watch(self) -> None:
+        address, period = self.SETTINGS.address, self.SETTINGS.period
+        try:
+            reader, writer = await asyncio.wait_for(GraphService(Address(*address)).open_connection(), period)
+        except (OSError, asyncio.TimeoutError):
+            lost = True # Gone again before the graph was up
+        else:
+            try:
+                lost = False
+                while not _stop.is_set():
+                    # Nothing is ever sent on this connection; EOF means the server is gone
+                    try:
+                        await asyncio.wait_for(reader.read(), timeout = period)
+                        lost = True
+                        break
+                    except asyncio.TimeoutError:
+                        pass
+                    if not await _probe(address, period):
+                        lost = True
+                        break
+            finally:
+                await _close(writer, period)
+
+        if lost:
+            ez.logger.warning(f'Lost GraphServer at {address}')
+            _graph_lost.set()
+        raise ez.NormalTermination
+
+
+def _run_graph(
+        components: typing.Dict[str, ez.Component],
+        address: typing.Tuple[str, int],
+        stop: threading.Event
+    ) -> None:
+    # ez.run in a daemon thread: once the server is gone, ezmsg's teardown can
+    # wait forever on the reply to its last session command, so stop waiting
+    # SHUTDOWN_TIMEOUT sec after the watchdog (or stop) has ended the graph
+    errors: typing.List[BaseException] = []
+
+    def run() -> None:
+        try:
+            ez.run(components = components, graph_address = address)
+        except BaseException as e:
+            errors.append(e)
+
+    thread = threading.Thread(target = run, name = 'ezmsg-graph', daemon = True)
+    thread.start()
+    try:
+        while thread.is_alive() and not (stop.is_set() or _graph_lost.is_set()):
+            thread.join(WATCHDOG_PERIOD)
+    except KeyboardInterrupt:
+        stop.set()
+    thread.join(SHUTDOWN_TIMEOUT)
+    if thread.is_alive():
+        ez.logger.warning(f'Graph did not shut down within {SHUTDOWN_TIMEOUT} sec; abandoning it')
+    if errors:
+        raise errors[0]
+
+
+def supervise(
+        config: GadgetConfig,
+        reconnect_timeout: typing.Optional[float] = None,
+        stop: typing.Optional[threading.Event] = None,
+        watchdog_period: float = WATCHDOG_PERIOD
+    ) -> None:
+    # Runs the endpoint until it is interrupted or shut down, stop is set, or
+    # (if given) no GraphServer has been reachable for reconnect_timeout sec
+    global _stop
+    address = config.endpoint_remote_addr
+    _stop = stop = threading.Event() if stop is None else stop
+    try:
+        while not stop.is_set():
+            if not wait_for_graphserver(address, timeout = 0.0):
+                ez.logger.info(f'Waiting for GraphServer at {address}')
+                if not wait_for_graphserver(address, timeout = reconnect_timeout, stop = stop):
+                    if not stop.is_set():
+                        ez.logger.warning(f'No GraphServer at {address} after {reconnect_timeout} sec')
+                    break
+
+            _graph_lost.clear()
+            devices = hid_devices(config, keep_open = True)
+            ez.logger.info(f'Starting ezmsg graph with {devices=}')
+            watchdog = GraphWatchdogSettings(address = address, period = watchdog_period)
+            try:
+                _run_graph({**devices, 'WATCHDOG': GraphWatchdog(watchdog)}, address, stop)
+            except (ConnectionError, EOFError):
+                # Server went away between the probe and the connection,
+                # or while the graph was starting
+                ez.logger.warning(f'Failed to connect to GraphServer at {address}')
+                continue
+
+            if stop.is_set() or not _graph_lost.is_set():
+                break # Interrupted, stopped or shut down on purpose
+
+            ez.logger.info('Reconnecting to GraphServer')
+    finally:
+        HANDLE_POOL.close()
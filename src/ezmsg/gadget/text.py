@@ -0,0 +1,234 @@
+import functools
+import re
+import typing
+
+import ezmsg.core as ez
+
+from .function.keyboard import Keyboard
+from .message import RawReport
+
+# A stroke is (control_keys, hid_keycode); most characters take one stroke
+# but dead-key characters are typed as the dead key followed by a space
+Stroke = typing.Tuple[int, int]
+LayoutTable = typing.Dict[str, typing.Tuple[Stroke, ...]]
+
+_SHIFT = Keyboard.MODIFIER_LEFT_SHIFT
+_ALTGR = Keyboard.MODIFIER_RIGHT_ALT
+
+_NUMBER_ROW = [
+    Keyboard.KEYCODE_NUMBER_1, Keyboard.KEYCODE_NUMBER_2, Keyboard.KEYCODE_NUMBER_3,
+    Keyboard.KEYCODE_NUMBER_4, Keyboard.KEYCODE_NUMBER_5, Keyboard.KEYCODE_NUMBER_6,
+    Keyboard.KEYCODE_NUMBER_7, Keyboard.KEYCODE_NUMBER_8, Keyboard.KEYCODE_NUMBER_9,
+    Keyboard.KEYCODE_NUMBER_0,
+]
+
+_CONTROL_CHARACTERS = {
+    '\n': Keyboard.KEYCODE_ENTER,
+    '\t': Keyboard.KEYCODE_TAB,
+    ' ': Keyboard.KEYCODE_SPACEBAR,
+    '\b': Keyboard.KEYCODE_BACKSPACE_DELETE,
+    '\x1b': Keyboard.KEYCODE_ESCAPE,
+}
+
+
+def _build_layout(
+    keys: typing.Dict[int, typing.Tuple[str, ...]],
+    letters: typing.Optional[typing.Dict[str, int]] = None,
+    dead_keys: typing.Optional[typing.Dict[str, Stroke]] = None
+) -> LayoutTable:
+    # keys: keycode -> characters typed with (no modifier, shift, altgr);
+    #   an empty string means that combination types nothing useful
+    # letters: overrides for letters that aren't at their US (QWERTY) position
+    # dead_keys: characters that are typed as a dead key + space
+    table: LayoutTable = {}
+
+    for char, keycode in _CONTROL_CHARACTERS.items():
+        table[char] = ((0x00, keycode),)
+
+    for offset in range(26):
+        char = chr(ord('a') + offset)
+        keycode = Keyboard.KEYCODE_A + offset
+        if letters is not None:
+            keycode = letters.get(char, keycode)
+        table[char] = ((0x00, keycode),)
+        table[char.upper()] = ((_SHIFT, keycode),)
+
+    for keycode, chars in keys.items():
+        for modifiers, char in zip((0x00, _SHIFT, _ALTGR), chars):
+            if char and char not in table:
+                table[char] = ((modifiers, keycode),)
+
+    if dead_keys is not None:
+        space = (0x00, Keyboard.KEYCODE_SPACEBAR)
+        for char, stroke in dead_keys.items():
+            table.setdefault(char, (stroke, space))
+
+    return table
+
+
+LAYOUT_US = 'us'
+LAYOUT_GB = 'gb'
+LAYOUT_DE = 'de'
+LAYOUT_FR = 'fr'
+
+LAYOUTS: typing.Dict[str, LayoutTable] = {
+    # US ANSI QWERTY
+    LAYOUT_US: _build_layout({
+        **{keycode: chars for keycode, chars in zip(_NUMBER_ROW, [
+            ('1', '!'), ('2', '@'), ('3', '#'), ('4', '$'), ('5', '%'),
+            ('6', '^'), ('7', '&'), ('8', '*'), ('9', '('), ('0', ')'),
+        ])},
+        Keyboard.KEYCODE_MINUS: ('-', '_'),
+        Keyboard.KEYCODE_EQUAL_SIGN: ('=', '+'),
+        Keyboard.KEYCODE_LEFT_BRACKET: ('[', '{'),
+        Keyboard.KEYCODE_RIGHT_BRACKET: (']', '}'),
+        Keyboard.KEYCODE_BACKSLASH: ('\\', '|'),
+        Keyboard.KEYCODE_SEMICOLON: (';', ':'),
+        Keyboard.KEYCODE_SINGLE_QUOTE: ("'", '"'),
+        Keyboard.KEYCODE_ACCENT_GRAVE: ('`', '~'),
+        Keyboard.KEYCODE_COMMA: (',', '<'),
+        Keyboard.KEYCODE_PERIOD: ('.', '>'),
+        Keyboard.KEYCODE_FORWARD_SLASH: ('/', '?'),
+    }),
+
+    # UK ISO QWERTY
+    LAYOUT_GB: _build_layout({
+        **{keycode: chars for keycode, chars in zip(_NUMBER_ROW, [
+            ('1', '!'), ('2', '"'), ('3', '£'), ('4', '$', '€'), ('5', '%'),
+            ('6', '^'), ('7', '&'), ('8', '*'), ('9', '('), ('0', ')'),
+        ])},
+        Keyboard.KEYCODE_MINUS: ('-', '_'),
+        Keyboard.KEYCODE_EQUAL_SIGN: ('=', '+'),
+        Keyboard.KEYCODE_LEFT_BRACKET: ('[', '{'),
+        Keyboard.KEYCODE_RIGHT_BRACKET: (']', '}'),
+        Keyboard.KEYCODE_HASH: ('#', '~'),
+        Keyboard.KEYCODE_SEMICOLON: (';', ':'),
+        Keyboard.KEYCODE_SINGLE_QUOTE: ("'", '@'),
+        Keyboard.KEYCODE_ACCENT_GRAVE: ('`', '¬', '¦'),
+        Keyboard.KEYCODE_102ND: ('\\', '|'),
+        Keyboard.KEYCODE_COMMA: (',', '<'),
+        Keyboard.KEYCODE_PERIOD: ('.', '>'),
+        Keyboard.KEYCODE_FORWARD_SLASH: ('/', '?'),
+    }),
+
+    # German ISO QWERTZ
+    LAYOUT_DE: _build_layout({
+        **{keycode: chars for keycode, chars in zip(_NUMBER_ROW, [
+            ('1', '!'), ('2', '"', '²'), ('3', '§', '³'), ('4', '$'), ('5', '%'),
+            ('6', '&'), ('7', '/', '{'), ('8', '(', '['), ('9', ')', ']'), ('0', '=', '}'),
+        ])},
+        Keyboard.KEYCODE_MINUS: ('ß', '?', '\\'),
+        Keyboard.KEYCODE_LEFT_BRACKET: ('ü', 'Ü'),
+        Keyboard.KEYCODE_RIGHT_BRACKET: ('+', '*', '~'),
+        Keyboard.KEYCODE_HASH: ('#', "'"),
+        Keyboard.KEYCODE_SEMICOLON: ('ö', 'Ö'),
+        Keyboard.KEYCODE_SINGLE_QUOTE: ('ä', 'Ä'),
+        Keyboard.KEYCODE_ACCENT_GRAVE: ('', '°'),
+        Keyboard.KEYCODE_102ND: ('<', '>', '|'),
+        Keyboard.KEYCODE_COMMA: (',', ';'),
+        Keyboard.KEYCODE_PERIOD: ('.', ':'),
+        Keyboard.KEYCODE_FORWARD_SLASH: ('-', '_'),
+        Keyboard.KEYCODE_Q: ('', '', '@'),
+        Keyboard.KEYCODE_E: ('', '', '€'),
+        Keyboard.KEYCODE_M: ('', '', 'µ'),
+    }, letters = {
+        'y': Keyboard.KEYCODE_Z,
+        'z': Keyboard.KEYCODE_Y,
+    }, dead_keys = {
+        '^': (0x00, Keyboard.KEYCODE_ACCENT_GRAVE),
+        '´': (0x00, Keyboard.KEYCODE_EQUAL_SIGN),
+        '`': (_SHIFT, Keyboard.KEYCODE_EQUAL_SIGN),
+    }),
+
+    # French ISO AZERTY
+    LAYOUT_FR: _build_layout({
+        **{keycode: chars for keycode, chars in zip(_NUMBER_ROW, [
+            ('&', '1'), ('é', '2'), ('"', '3', '#'), ("'", '4', '{'), ('(', '5', '['),
+            ('-', '6', '|'), ('è', '7'), ('_', '8', '\\'), ('ç', '9', '^'), ('à', '0', '@'),
+        ])},
+        Keyboard.KEYCODE_MINUS: (')', '°', ']'),
+        Keyboard.KEYCODE_EQUAL_SIGN: ('=', '+', '}'),
+        Keyboard.KEYCODE_RIGHT_BRACKET: ('$', '£', '¤'),
+        Keyboard.KEYCODE_HASH: ('*', 'µ'),
+        Keyboard.KEYCODE_SINGLE_QUOTE: ('ù', '%'),
+        Keyboard.KEYCODE_ACCENT_GRAVE: ('²',),
+        Keyboard.KEYCODE_102ND: ('<', '>'),
+        Keyboard.KEYCODE_M: (',', '?'),
+        Keyboard.KEYCODE_COMMA: (';', '.'),
+        Keyboard.KEYCODE_PERIOD: (':', '/'),
+        Keyboard.KEYCODE_FORWARD_SLASH: ('!', '§'),
+        Keyboard.KEYCODE_E: ('', '', '€'),
+    }, letters = {
+        'a': Keyboard.KEYCODE_Q,
+        'q': Keyboard.KEYCODE_A,
+        'z': Keyboard.KEYCODE_W,
+        'w': Keyboard.KEYCODE_Z,
+        'm': Keyboard.KEYCODE_SEMICOLON,
+    }, dead_keys = {
+        '~': (_ALTGR, Keyboard.KEYCODE_NUMBER_2),
+        '`': (_ALTGR, Keyboard.KEYCODE_NUMBER_7),
+    }),
+}
+
+# Fragments are words plus their trailing whitespace; each compiles
+# independently (it ends with all keys up) so they can be cached and joined
+_FRAGMENT = re.compile(r'\S*\s*')
+_FRAGMENT_CACHE_SIZE = 4096
+
+_RELEASE = bytes(8)
+
+
+@functools.lru_cache(maxsize = _FRAGMENT_CACHE_SIZE)
+def _compile_fragment(fragment: str, layout: str) -> bytes:
+    table = LAYOUTS[layout]
+    reports = bytearray()
+    last: typing.Optional[Stroke] = None
+    for char in fragment:
+        strokes = table.get(char, None)
+        if strokes is None:
+            raise ValueError(f'{char!r} cannot be typed with the {layout!r} layout')
+        for modifiers, keycode in strokes:
+            # Going straight from one key to the next is one report; we only
+            # need an explicit release to repeat a key or change modifiers
+            if last is not None and (last[1] == keycode or last[0] != modifiers):
+                reports += _RELEASE
+            reports += Keyboard.Report(modifiers, (keycode,)).report()
+            last = (modifiers, keycode)
+    if last is not None:
+        reports += _RELEASE
+    return bytes(reports)
+
+
+def compile_text(text: str, layout: str = LAYOUT_US) -> bytes:
+    # Compile text into back-to-back 8 byte keyboard reports
+    if layout not in LAYOUTS:
+        raise ValueError(f'Unknown keyboard layout {layout!r}; expected one of {list(LAYOUTS)}')
+    text = text.replace('\r\n', '\n')
+    return b''.join(_compile_fragment(fragment, layout) for fragment in _FRAGMENT.findall(text))
+
+
+class TypeTextSettings(ez.Settings):
+    layout: str = LAYOUT_US # Keyboard layout the *host* is configured for
+
+
+class TypeText(ez.Unit):
+    # Types incoming strings by publishing their precompiled reports;
+    # connect OUTPUT_HID to a Keyboard HIDDevice, which writes them as
+    # fast as the host polls the endpoint
+
+    SETTINGS = TypeTextSettings
+
+    INPUT_TEXT = ez.InputStream(str)
+    OUTPUT_HID = ez.OutputStream(RawReport)
+
+    @ez.subscriber(INPUT_TEXT)
+    @ez.publisher(OUTPUT_HID)
+    async def type_text(self, text: str) -> typing.AsyncGenerator:
+        try:
+            reports = compile_text(text, self.SETTINGS.layout)
+        except ValueError as e:
+            ez.logger.warning(f'Not typing text: {e}')
+            return
+
+        if reports:
+            yield self.OUTPUT_HID, RawReport(reports)
@@ -0,0 +1,174 @@
+import asyncio
+import math
+import time
+import typing
+
+import numpy as np
+import ezmsg.core as ez
+
+from .function.touch import Touch
+
+# Turns sparse absolute pointer targets (e.g. a 20-50 Hz cursor decoder)
+# into a smooth Touch.Message stream at a fixed output rate.  Each new
+# target renders the whole segment from the current pointer position to
+# that target in one vectorized step; the segment is played out over the
+# time since the previous target, so output lags input by one target period.
+
+INTERPOLATION_LINEAR = 'linear'
+INTERPOLATION_SPLINE = 'spline' # Cubic Hermite with Catmull-Rom tangents
+INTERPOLATIONS = (INTERPOLATION_LINEAR, INTERPOLATION_SPLINE)
+
+# Touch.Message positions are fractions of the descriptor's logical range
+_X, _Y = Touch.SPEC['x'], Touch.SPEC['y']
+_LOWER = np.array([_X.logical_minimum / _X.logical_maximum, _Y.logical_minimum / _Y.logical_maximum])
+_UPPER = np.ones(2)
+
+
+def interpolate(
+    start: np.ndarray,
+    end: np.ndarray,
+    n: int,
+    interpolation: str = INTERPOLATION_LINEAR,
+    before: typing.Optional[np.ndarray] = None
+) -> np.ndarray:
+    # n samples (n, 2) along start -> end, excluding start and ending on end;
+    # 'before' is the target preceding start, used for the spline's tangent
+    s = (np.arange(1, n + 1, dtype = np.float64) / n)[:, np.newaxis]
+    if interpolation == INTERPOLATION_LINEAR or before is None:
+        return start + s * (end - start)
+    if interpolation != INTERPOLATION_SPLINE:
+        raise ValueError(f'Unknown interpolation {interpolation!r}; expected one of {INTERPOLATIONS}')
+
+    m0 = (end - before) / 2.0 # Catmull-Rom tangent at start
+    m1 = end - start # The next target is unknown; carry the segment's own direction
+    s2, s3 = s * s, s * s * s
+    return (
+        (2 * s3 - 3 * s2 + 1) * start + (s3 - 2 * s2 + s) * m0 +
+        (-2 * s3 + 3 * s2) * end + (s3 - s2) * m1
+    )
+
+
+def smooth(samples: np.ndarray, alpha: float, initial: np.ndarray) -> np.ndarray:
+    # Exponential moving average y[i] = alpha * y[i-1] + (1 - alpha) * x[i]
+    # over a whole window at once; windows are short, so an (n, n) weight
+    # matrix is cheaper than a Python loop
+    if alpha <= 0.0:
+        return samples
+    n = samples.shape[0]
+    lag = np.subtract.outer(np.arange(n), np.arange(n))
+    weights = np.where(lag >= 0, (1.0 - alpha) * alpha ** np.maximum(lag, 0), 0.0)
+    carry = alpha ** np.arange(1, n + 1)[:, np.newaxis]
+    return weights @ samples + carry * initial
+
+
+class TrajectoryResampler:
+    # The resampling math behind TouchResampler, free of any scheduling
+
+    rate: float
+    interpolation: str
+    alpha: float
+    clamp: bool
+    max_gap: float
+
+    def __init__(
+        self,
+        rate: float,
+        interpolation: str = INTERPOLATION_LINEAR,
+        smoothing: float = 0.0,
+        clamp: bool = True,
+        max_gap: float = 0.1
+    ) -> None:
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError(f'Unknown interpolation {interpolation!r}; expected one of {INTERPOLATIONS}')
+        self.rate = rate
+        self.interpolation = interpolation
+        self.alpha = math.exp(-1.0 / (rate * smoothing)) if smoothing > 0.0 else 0.0
+        self.clamp = clamp
+        self.max_gap = max_gap
+        self._touch: typing.Optional[int] = None
+        self._arrival = 0.0
+        self._before: typing.Optional[np.ndarray] = None # Target preceding the last one
+        self._target = np.zeros(2)
+        self._position = np.zeros(2) # Last emitted (smoothed) position
+
+    def window(self, arrival: float, target: Touch.Message) -> typing.Tuple[int, np.ndarray]:
+        # Returns (touch, (n, 2) positions) to emit at `rate` from now; report
+        # each one with emitted() as it goes out, since a newer target may cut
+        # the window short and the next one has to start where the pointer is
+        end = np.array([target.absolute_x, target.absolute_y], dtype = np.float64)
+
+        if target.touch != self._touch:
+            # Contact/range changed: jump straight there, never interpolate across it
+            samples = end[np.newaxis, :]
+            self._before = None
+        else:
+            gap = min(arrival - self._arrival, self.max_gap)
+            n = max(1, int(round(gap * self.rate)))
+            samples = interpolate(self._position, end, n, self.interpolation, self._before)
+            samples = smooth(samples, self.alpha, self._position)
+            self._before = self._target
+
+        if self.clamp:
+            samples = np.clip(samples, _LOWER, _UPPER)
+
+        self._touch = target.touch
+        self._arrival = arrival
+        self._target = end
+        return target.touch, samples
+
+    def emitted(self, position: np.ndarray) -> None:
+        self._position = position
+
+
+class TouchResamplerSettings(ez.Settings):
+    rate: float = 250.0 # Hz; match the endpoint's polling rate
+    interpolation: str = INTERPOLATION_LINEAR
+    smoothing: float = 0.0 # sec; EMA time constant, 0 disables
+    clamp: bool = True # Clamp to the descriptor's logical range
+    max_gap: float = 0.1 # sec; longest segment, so a pause doesn't become a slow glide
+
+
+class TouchResamplerState(ez.State):
+    resampler: TrajectoryResampler
+    targets: "asyncio.Queue[typing.Tuple[float, Touch.Message]]"
+
+
+class TouchResampler(ez.Unit):
+    # Connect INPUT_TARGET to a cursor decoder and OUTPUT_HID to a Touch HIDDevice
+
+    SETTINGS = TouchResamplerSettings
+    STATE = TouchResamplerState
+
+    INPUT_TARGET = ez.InputStream(Touch.Message)
+    OUTPUT_HID = ez.OutputStream(Touch.Message)
+
+    async def initialize(self) -> None:
+        self.STATE.resampler = TrajectoryResampler(
+            rate = self.SETTINGS.rate,
+            interpolation = self.SETTINGS.interpolation,
+            smoothing = self.SETTINGS.smoothing,
+            clamp = self.SETTINGS.clamp,
+            max_gap = self.SETTINGS.max_gap
+        )
+        self.STATE.targets = asyncio.Queue()
+
+    @ez.subscriber(INPUT_TARGET)
+    async def on_target(self, msg: Touch.Message) -> None:
+        self.STATE.targets.put_nowait((time.monotonic(), msg))
+
+    @ez.publisher(OUTPUT_HID)
+    async def resample(self) -> typing.AsyncGenerator:
+        period = 1.0 / self.SETTINGS.rate
+        while True:
+            arrival, target = await self.STATE.targets.get()
+            touch, samples = self.STATE.resampler.window(arrival, target)
+
+            start = time.monotonic()
+            for i, (x, y) in enumerate(samples.tolist()):
+                delay = start + i * period - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                yield self.OUTPUT_HID, Touch.Message(touch = touch, absolute_x = x, absolute_y = y)
+                self.STATE.resampler.emitted(samples[i])
+                if not self.STATE.targets.empty():
+                    break # A newer target supersedes the rest of this segment
@@ -0,0 +1,95 @@
+import asyncio
+import time
+import typing
+
+from dataclasses import dataclass
+
+from .message import HIDMessage
+
+
+@dataclass
+class WriteQueueStats:
+    received: int = 0 # messages put on the queue
+    written: int = 0 # (possibly coalesced) messages handed to the writer
+    merged: int = 0 # messages folded into a neighbor instead of being written
+    max_added_latency: float = 0.0 # sec; worst time a message waited in the queue
+
+
+# Per-device queue that coalesces messages before they are written.
+# The oldest queued message waits at most `latency` seconds for newer
+# messages to merge into it (see HIDMessage.merge).  Messages that can't
+# be merged (button/key transitions) are never dropped; they flush the
+# pending message and are written in order.
+#
+# With a pacing `interval`, at most one message is handed to the writer per
+# interval (e.g. the host's polling interval); mergeable messages keep merging
+# into the newest state until their slot comes up.
+class WriteQueue:
+
+    latency: float
+    interval: float
+    stats: WriteQueueStats
+    arrival: float # perf_counter() arrival of the oldest message in the last get()
+
+    _queue: "asyncio.Queue[typing.Tuple[float, HIDMessage]]"
+    _pending: typing.Optional[typing.Tuple[float, HIDMessage]]
+    _next_slot: float
+
+    def __init__(self, latency: float = 0.0, interval: float = 0.0) -> None:
+        self.latency = latency
+        self.interval = interval
+        self.stats = WriteQueueStats()
+        self.arrival = 0.0
+        self._queue = asyncio.Queue()
+        self._pending = None
+        self._next_slot = 0.0
+
+    @property
+    def backlog(self) -> int:
+        return self._queue.qsize() + (0 if self._pending is None else 1)
+
+    def put(self, msg: HIDMessage) -> None:
+        self._queue.put_nowait((time.perf_counter(), msg))
+        self.stats.received += 1
+
+    async def get(self) -> HIDMessage:
+        if self._pending is not None:
+            arrival, msg = self._pending
+            self._pending = None
+        else:
+            arrival, msg = await self._queue.get()
+
+        deadline = max(arrival + self.latency, self._next_slot)
+        while msg.mergeable():
+            if not self._queue.empty():
+                nxt = self._queue.get_nowait()
+            else:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0.0:
+                    break
+                try:
+                    nxt = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            merged = msg.merge(nxt[1])
+            if merged is None:
+                self._pending = nxt
+                break
+
+            msg = merged
+            self.stats.merged += 1
+
+        if self.interval > 0.0:
+            delay = self._next_slot - time.perf_counter()
+            if delay > 0.0:
+                await asyncio.sleep(delay)
+            self._next_slot = max(time.perf_counter(), self._next_slot) + self.interval
+
+        self.arrival = arrival
+        added_latency = time.perf_counter() - arrival
+        if added_latency > self.stats.max_added_latency:
+            self.stats.max_added_latency = added_latency
+        self.stats.written += 1
+
+        return msg
@@ -0,0 +1,140 @@
+import asyncio
+import tempfile
+import time
+import typing
+
+from pathlib import Path
+
+import numpy as np
+
+from ezmsg.gadget.function import Composite, Mouse, Touch
+from ezmsg.gadget.handle import HIDHandle
+from ezmsg.gadget.hiddevice import HIDDevice, HIDDeviceSettings
+
+
+def test_batch_reports_match_messages() -> None:
+    rng = np.random.default_rng(0)
+    n = 50
+    buttons = rng.integers(0, 8, n)
+    x, y = rng.uniform(-1, 1, n), rng.uniform(-1, 1, n)
+    wheel = rng.integers(-127, 128, n)
+
+    batch = Mouse.Batch(buttons, x, y, wheel)
+    assert len(batch) == n
+    expected = b''.join(Mouse.Message(int(b), float(dx), float(dy), int(w)).report() for b, dx, dy, w in zip(buttons, x, y, wheel))
+    assert batch.report() == expected
+    assert bytes(batch.report()) == Mouse.encode_batch(buttons, x, y, wheel)
+
+    buf = bytearray(b'\xff' * (batch.report_size() + 4))
+    assert batch.report_into(buf, 2) == n * 6
+    assert buf[2:-2] == expected and buf[:2] == b'\xff\xff' and buf[-2:] == b'\xff\xff'
+
+    # Scalars broadcast
+    touches = Touch.Batch(0x03, x.clip(0, 1), 0.5)
+    assert touches.report() == b''.join(Touch.Message(3, float(v), 0.5).report() for v in x.clip(0, 1))
+
+    assert Mouse.Batch().report() == b''
+    try:
+        Mouse.Batch(0, x, y, timestamps = np.zeros(n + 1))
+        assert False, 'expected ValueError'
+    except ValueError:
+        pass
+
+
+def test_batch_routes_through_composite() -> None:
+    batch = Mouse.Batch(1, np.array([0.1, 0.2, 0.3]), 0.0)
+    routed = Composite.route(batch)
+    assert routed.report() == b''.join(Composite.route(Mouse.Message(1, v)).report() for v in (0.1, 0.2, 0.3))
+    assert routed.schedule() is None
+
+
+class RecordingHandle(HIDHandle):
+    # Truncates each write to report_length, as /dev/hidgN does
+    def __init__(self, report_length: int) -> None:
+        self.report_length = report_length
+        self.writes: typing.List[typing.Tuple[float, bytes]] = []
+
+    async def write(self, data: typing.Union[bytes, bytearray, memoryview]) -> None:
+        self.writes.append((time.time(), bytes(data[:self.report_length])))
+
+    async def read(self, size: int) -> bytes:
+        return b''
+
+    async def close(self) -> None:
+        pass
+
+
+def test_device_writes_batch_on_schedule() -> None:
+    async def run(path: Path, config: str) -> RecordingHandle:
+        path.with_suffix('.conf').write_text(config)
+        device = HIDDevice(HIDDeviceSettings(
+            function_name = 'hid0',
+            config_file = path.with_suffix('.conf'),
+            device_path = path
+        ))
+        await device.setup()
+        handle = RecordingHandle(device.STATE.report_length)
+        device.STATE.handle = handle
+
+        start = time.time()
+        timestamps = start + np.array([-0.05, 0.0, 0.02, 0.04, 0.06]) # first one is overdue
+        await device.write(Touch.Batch(0x03, np.linspace(0.1, 0.5, 5), 0.5, timestamps = timestamps))
+        await device.write(Touch.Batch(0x00, 0.5, np.array([0.5]))) # unscheduled, after the batch
+        await device.shutdown()
+
+        assert len(handle.writes) == 6
+        for (written, _), when in zip(handle.writes, timestamps):
+            assert written >= when - 0.002 # asyncio.sleep may wake a hair early
+            assert written - max(when, start) < 0.05
+        assert device.stats().reports == 6
+        return handle
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'hidg0'
+        path.touch()
+
+        handle = asyncio.run(run(path, '[function.Touch.hid0]\n'))
+        expected = [Touch.Message(3, v, 0.5).report() for v in np.linspace(0.1, 0.5, 5)] + [Touch.Message(0, 0.5, 0.5).report()]
+        assert [report for _, report in handle.writes] == expected
+
+        # Composite: each scheduled report carries its report ID
+        handle = asyncio.run(run(path, '[function.Composite.hid0]\n'))
+        routed = [Composite.route(Touch.Message(3, v, 0.5)).report() for v in np.linspace(0.1, 0.5, 5)]
+        assert [report for _, report in handle.writes][:5] == routed
+
+
+def test_composite_device_writes_batch_reports() -> None:
+    async def run(path: Path) -> RecordingHandle:
+        device = HIDDevice(HIDDeviceSettings(
+            function_name = 'hid0',
+            config_file = path.with_suffix('.conf'),
+            device_path = path
+        ))
+        await device.setup()
+        handle = RecordingHandle(Composite.REPORT_LENGTH)
+        device.STATE.handle = handle
+        await device.write(Mouse.Batch(0x01, np.array([0.1, 0.2, 0.3]), -0.1))
+        await device.write(Touch.Batch(0x03, np.array([0.25, 0.75]), 0.5))
+        await device.shutdown()
+        assert device.stats().reports == 5
+        return handle
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'hidg0'
+        path.touch()
+        path.with_suffix('.conf').write_text('[function.Composite.hid0]\n')
+        handle = asyncio.run(run(path))
+
+    # Each sample is its own write: report ID, then exactly one member report
+    mouse_id, touch_id = Composite.report_id(Mouse), Composite.report_id(Touch)
+    expected = [bytes([mouse_id]) + Mouse.Message(0x01, v, -0.1).report() for v in (0.1, 0.2, 0.3)]
+    expected += [bytes([touch_id]) + Touch.Message(0x03, v, 0.5).report() for v in (0.25, 0.75)]
+    assert [report for _, report in handle.writes] == expected
+    assert [len(report) for _, report in handle.writes] == [Mouse.SPEC.input.length + 1] * 3 + [Touch.SPEC.input.length + 1] * 2
+
+
+if __name__ == '__main__':
+    test_batch_reports_match_messages()
+    test_batch_routes_through_composite()
+    test_device_writes_batch_on_schedule()
+    test_composite_device_writes_batch_reports()
@@ -0,0 +1,115 @@
+import asyncio
+import tempfile
+import time
+import typing
+
+from pathlib import Path
+
+import pytest
+
+from ezmsg.gadget.capture import CaptureWriter, Replay, ReplaySettings, capture_origin, read_capture, CAPTURE_ORIGIN_MARGIN
+from ezmsg.gadget.function import Keyboard, Mouse
+from ezmsg.gadget.hiddevice import HIDDevice, HIDDeviceSettings
+from ezmsg.gadget.message import HIDMessage, RawReport
+
+
+def test_capture_from_device() -> None:
+    async def run(tmpdir: Path) -> None:
+        devices = {}
+        for name in ['keyboard0', 'mouse0']:
+            (tmpdir / name).touch()
+            devices[name] = HIDDevice(HIDDeviceSettings(
+                function_name = name,
+                config_file = tmpdir / 'none.conf',
+                device_path = tmpdir / name,
+                capture_path = tmpdir / 'capture.bin'
+            ))
+            await devices[name].setup()
+
+        await devices['keyboard0'].write(Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A))
+        await asyncio.sleep(0.01)
+        await devices['mouse0'].write(Mouse.Message(relative_x = 0.5))
+        for device in devices.values():
+            await device.shutdown()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        asyncio.run(run(Path(tmpdir)))
+        records = list(read_capture(Path(tmpdir) / 'capture.bin'))
+        assert [r.function_name for r in records] == ['keyboard0', 'mouse0']
+        assert records[0].report == (Path(tmpdir) / 'keyboard0').read_bytes()
+        assert records[1].report == Mouse.Message(relative_x = 0.5).report()
+        assert records[1].timestamp - records[0].timestamp >= 0.01
+        assert [r.function_name for r in read_capture(Path(tmpdir) / 'capture.bin', 'mouse0')] == ['mouse0']
+
+
+def test_replay_schedule() -> None:
+    async def run(path: Path) -> typing.List[typing.Tuple[float, HIDMessage]]:
+        replay = Replay(ReplaySettings(path = path, function_name = 'mouse0', speed = 2.0))
+        await replay.setup()
+        out: typing.List[typing.Tuple[float, HIDMessage]] = []
+        start = time.monotonic()
+        async for _, msg in replay.replay():
+            out.append((time.monotonic() - start, msg))
+        await replay.shutdown()
+        return out
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'capture.bin'
+        keyboard = CaptureWriter(path, 'keyboard0')
+        mouse = CaptureWriter(path, 'mouse0')
+
+        # Out of order across writers, as concurrent devices would flush them
+        t0 = 1000.0
+        mouse.record(t0 + 0.2, Mouse.Message(relative_x = 0.1).report())
+        mouse.record(t0 + 0.4, Mouse.Message(relative_x = 0.2).report())
+        mouse.close()
+        keyboard.record(t0, Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A).report())
+        keyboard.close()
+
+        out = asyncio.run(run(path))
+        assert [msg for _, msg in out] == [
+            RawReport(bytes(Mouse.Message(relative_x = 0.1).report())),
+            RawReport(bytes(Mouse.Message(relative_x = 0.2).report())),
+        ]
+
+        # Offsets from the keyboard's earlier record, at 2x speed
+        assert 0.09 <= out[0][0] < 0.15
+        assert 0.19 <= out[1][0] < 0.25
+
+
+def test_replay_stalled_writer(caplog: pytest.LogCaptureFixture) -> None:
+    async def run(path: Path) -> typing.List[HIDMessage]:
+        replay = Replay(ReplaySettings(path = path, function_name = 'keyboard0'))
+        await replay.setup()
+        out = [msg async for _, msg in replay.replay()]
+        await replay.shutdown()
+        return out
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'capture.bin'
+        keyboard = CaptureWriter(path, 'keyboard0')
+        mouse = CaptureWriter(path, 'mouse0')
+
+        # The keyboard's writer stalled for longer than the origin scan allows
+        t0 = 1000.0
+        mouse.record(t0, Mouse.Message(relative_x = 0.1).report())
+        mouse.record(t0 + CAPTURE_ORIGIN_MARGIN + 1.0, Mouse.Message(relative_x = 0.2).report())
+        mouse.close()
+        keyboard.record(t0 - 1.0, Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A).report())
+        keyboard.close()
+        assert capture_origin(path) == t0
+
+        start = time.monotonic()
+        assert len(asyncio.run(run(path))) == 1
+        assert time.monotonic() - start < 0.5
+        assert 'before the replay origin' in caplog.text
+
+
+def test_replay_speed() -> None:
+    for speed in (0.0, -1.0):
+        with pytest.raises(ValueError):
+            ReplaySettings(path = Path('capture.bin'), function_name = 'mouse0', speed = speed)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,261 @@
+import asyncio
+import os
+import tempfile
+import time
+import typing
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from ezmsg.gadget import client, simulate
+from ezmsg.gadget.client import AsyncGadgetClient, GadgetClient
+from ezmsg.gadget.command import activate
+from ezmsg.gadget.function import Composite, Keyboard, Mouse, Touch
+from ezmsg.gadget.handle import HIDHandle, BACKEND_AIOFILE, BACKEND_NONBLOCKING
+
+CONFIG = """
+[gadget]
+name = sim
+
+[function.Keyboard.keyboard0]
+
+[function.Mouse.mouse0]
+
+[function.Composite.combo0]
+"""
+
+
+def _simulated(tmpdir: str) -> Path:
+    config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+    config_path.write_text(CONFIG)
+    activate(config_path)
+    return config_path
+
+
+def _node(root: Path, name: str) -> Path:
+    from ezmsg.gadget.discovery import device_node
+    from ezmsg.gadget.config import GADGET_PATH
+    dev = (simulate.system_path(GADGET_PATH, root) / 'sim' / 'functions' / f'hid.{name}' / 'dev').read_text()
+    return device_node(dev, root)
+
+
+def test_sync_client(monkeypatch: pytest.MonkeyPatch) -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / 'root'
+        monkeypatch.setenv(simulate.SIMULATE_ENV, str(root))
+        config_path = _simulated(tmpdir)
+        key = Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A)
+        moves = [Mouse.Message(relative_x = x) for x in (0.1, 0.2, 0.3)]
+        with GadgetClient(config_path) as gadget:
+            gadget.open()
+            gadget.send('keyboard0', key)
+            gadget.batch('mouse0', moves)
+            gadget.send('combo0', moves[0])
+
+        assert _node(root, 'keyboard0').read_bytes() == key.report()
+        assert _node(root, 'mouse0').read_bytes() == b''.join(m.report() for m in moves)
+        assert _node(root, 'combo0').read_bytes() == Composite.route(moves[0]).report()
+
+        # Blocking, but usable from a coroutine: discovery doesn't need this thread's loop
+        async def from_coroutine() -> None:
+            with GadgetClient(config_path) as gadget:
+                gadget.send('mouse0', Mouse.Message())
+
+        asyncio.run(from_coroutine())
+        assert _node(root, 'mouse0').read_bytes().startswith(Mouse.Message().report())
+
+
+def test_async_client(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def send(config_path: Path, backend: str) -> None:
+        async with AsyncGadgetClient(config_path, backend = backend) as gadget:
+            await gadget.send('mouse0', Mouse.Message(buttons = 0x01))
+            await gadget.batch('mouse0', [Mouse.Message(relative_y = -0.1), Mouse.Message()])
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / 'root'
+        monkeypatch.setenv(simulate.SIMULATE_ENV, str(root))
+        config_path = _simulated(tmpdir)
+        expected = b''.join(m.report() for m in [
+            Mouse.Message(buttons = 0x01), Mouse.Message(relative_y = -0.1), Mouse.Message()
+        ])
+        asyncio.run(send(config_path, BACKEND_AIOFILE))
+        assert _node(root, 'mouse0').read_bytes() == expected
+
+
+def test_device_paths_and_unknown_function() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text(CONFIG)
+        node = Path(tmpdir) / 'hidg'
+        node.touch()
+        with GadgetClient(config_path, device_paths = {'mouse0': node, 'nope': node}) as gadget:
+            gadget.send('mouse0', Mouse.Message(relative_x = 0.5))
+            try:
+                gadget.send('nope', Mouse.Message())
+                assert False, 'expected KeyError'
+            except KeyError:
+                pass
+        assert node.read_bytes() == Mouse.Message(relative_x = 0.5).report()
+
+
+class RecordingHandle(HIDHandle):
+    def __init__(self) -> None:
+        self.writes: typing.List[bytes] = []
+
+    async def write(self, data: typing.Union[bytes, bytearray, memoryview]) -> None:
+        self.writes.append(bytes(data))
+
+    async def read(self, size: int) -> bytes:
+        return b''
+
+    async def close(self) -> None:
+        pass
+
+
+def test_one_report_per_write(monkeypatch: pytest.MonkeyPatch) -> None:
+    # hidg truncates each write to report_length, so reports go one at a time
+    tap = Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A)
+    moves = [Mouse.Message(relative_x = x) for x in (0.1, 0.2)]
+    press_release = bytes(Composite.route(tap).report())
+    expected = [
+        press_release[:Composite.REPORT_LENGTH],
+        press_release[Composite.REPORT_LENGTH:],
+        *[bytes(Composite.route(m).report()) for m in moves],
+        *[bytes(m.report()) for m in moves]
+    ]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text(CONFIG)
+        node = Path(tmpdir) / 'hidg'
+        node.touch()
+        device_paths = {'combo0': node, 'mouse0': node}
+
+        writes: typing.List[bytes] = []
+        monkeypatch.setattr(client, '_write', lambda fd, report: writes.append(bytes(report)))
+        with GadgetClient(config_path, device_paths = device_paths) as gadget:
+            gadget.send('combo0', tap)
+            gadget.batch('combo0', moves)
+            gadget.batch('mouse0', moves)
+        assert writes == expected
+
+        handle = RecordingHandle()
+
+        async def open_recording(path: Path, backend: str) -> HIDHandle:
+            return handle
+
+        async def send() -> None:
+            async with AsyncGadgetClient(config_path, device_paths = device_paths) as gadget:
+                await gadget.send('combo0', tap)
+                await gadget.batch('combo0', moves)
+                await gadget.batch('mouse0', moves)
+
+        monkeypatch.setattr(client, 'open_handle', open_recording)
+        asyncio.run(send())
+        assert handle.writes == expected
+
+
+class TimedHandle(RecordingHandle):
+    def __init__(self) -> None:
+        super().__init__()
+        self.timed: typing.List[typing.Tuple[float, bytes]] = []
+
+    async def write(self, data: typing.Union[bytes, bytearray, memoryview]) -> None:
+        self.timed.append((time.time(), bytes(data)))
+
+
+def test_batch_on_schedule(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Timestamped samples go out at their times, as HIDDevice writes them
+    def check(writes: typing.List[typing.Tuple[float, bytes]], start: float, timestamps: np.ndarray) -> None:
+        assert [report for _, report in writes] == [Touch.Message(3, v, 0.5).report() for v in np.linspace(0.1, 0.5, 5)]
+        for (written, _), when in zip(writes, timestamps):
+            assert written >= when - 0.002 # sleep may wake a hair early
+            assert written - max(when, start) < 0.05
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text('[function.Touch.touch0]\n')
+        node = Path(tmpdir) / 'hidg'
+        node.touch()
+        device_paths = {'touch0': node}
+
+        def batch() -> Touch.Batch:
+            timestamps = time.time() + np.array([-0.05, 0.0, 0.02, 0.04, 0.06]) # first one is overdue
+            return Touch.Batch(0x03, np.linspace(0.1, 0.5, 5), 0.5, timestamps = timestamps)
+
+        writes: typing.List[typing.Tuple[float, bytes]] = []
+        monkeypatch.setattr(client, '_write', lambda fd, report: writes.append((time.time(), bytes(report))))
+        with GadgetClient(config_path, device_paths = device_paths) as gadget:
+            start, msg = time.time(), batch()
+            gadget.batch('touch0', [msg])
+        check(writes, start, msg.timestamps)
+
+        handle = TimedHandle()
+
+        async def open_recording(path: Path, backend: str) -> HIDHandle:
+            return handle
+
+        async def send() -> typing.Tuple[float, Touch.Batch]:
+            async with AsyncGadgetClient(config_path, device_paths = device_paths) as gadget:
+                start, msg = time.time(), batch()
+                await gadget.send('touch0', msg)
+                return start, msg
+
+        monkeypatch.setattr(client, 'open_handle', open_recording)
+        start, msg = asyncio.run(send())
+        check(handle.timed, start, msg.timestamps)
+
+
+def test_concurrent_sends() -> None:
+    # Two sends racing on a node the host isn't reading: both wait their
+    # turn and go out whole, in order, once it drains
+    async def race(config_path: Path, fifo: Path) -> bytes:
+        reader = os.open(str(fifo), os.O_RDONLY | os.O_NONBLOCK)
+        filler = os.open(str(fifo), os.O_WRONLY | os.O_NONBLOCK)
+        filled = 0
+        try:
+            while True:
+                filled += os.write(filler, bytes(4096))
+        except BlockingIOError:
+            pass
+
+        async with AsyncGadgetClient(config_path, backend = BACKEND_NONBLOCKING, device_paths = {'mouse0': fifo}) as gadget:
+            await gadget.open('mouse0')
+            sends = asyncio.gather(
+                gadget.batch('mouse0', [Mouse.Message(relative_x = 0.1)] * 200),
+                gadget.send('mouse0', Mouse.Message(buttons = 0x01))
+            )
+            await asyncio.sleep(0.05) # Both are waiting for the node now
+            assert not sends.done()
+            received = bytearray()
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + 5.0
+            while not sends.done():
+                assert loop.time() < deadline, 'A send never completed'
+                try:
+                    received += os.read(reader, 65536)
+                except BlockingIOError:
+                    await asyncio.sleep(0.01)
+            await sends
+            try:
+                received += os.read(reader, 65536)
+            except BlockingIOError:
+                pass
+        os.close(filler)
+        os.close(reader)
+        return bytes(received[filled:])
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text(CONFIG)
+        fifo = Path(tmpdir) / 'hidg'
+        os.mkfifo(fifo)
+        received = asyncio.run(race(config_path, fifo))
+
+    assert received == Mouse.Message(relative_x = 0.1).report() * 200 + Mouse.Message(buttons = 0x01).report()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,135 @@
+import asyncio
+import tempfile
+import typing
+
+from pathlib import Path
+
+from ezmsg.gadget.descriptor import parse_descriptor
+from ezmsg.gadget.function import Composite, Keyboard, Mouse, MultiTouch, Touch
+from ezmsg.gadget.handle import HIDHandle
+from ezmsg.gadget.hiddevice import HIDDevice, HIDDeviceSettings
+from ezmsg.gadget.message import RawReport
+
+
+class KeyboardTouch(Composite):
+    MEMBERS = (Keyboard, MultiTouch)
+
+
+def test_descriptor() -> None:
+    for definition in (Composite, KeyboardTouch):
+        definition.check_report_length()
+
+    layout = parse_descriptor(Composite.REPORT_DESC)
+    assert layout.report_ids == (1, 2, 3)
+    assert layout.length('input', 1) == Keyboard.REPORT_LENGTH + 1
+    assert layout.length('input', 2) == Mouse.REPORT_LENGTH + 1
+    assert layout.length('input', 3) == Touch.REPORT_LENGTH + 1
+    assert layout.length('output', 1) == 2
+    assert Composite.REPORT_LENGTH == Keyboard.REPORT_LENGTH + 1
+
+    assert KeyboardTouch.report_id(MultiTouch) == 2
+    assert KeyboardTouch.REPORT_LENGTH == MultiTouch.REPORT_LENGTH + 1
+
+
+def test_route() -> None:
+    # A tap is two keyboard reports; each gets the ID
+    tap = Composite.route(Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A)).report()
+    assert bytes(tap) == b'\x01' + Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A, tap = False).report() + b'\x01' + bytes(8)
+
+    click = Mouse.Message(buttons = 0x01)
+    assert bytes(Composite.route(click).report()) == b'\x02' + bytes(click.report())
+
+    # Merging still works through the wrapper, but never across members
+    a, b = Composite.route(Mouse.Message(relative_x = 0.1)), Composite.route(Mouse.Message(relative_x = 0.2))
+    assert bytes(a.merge(b).report()) == b'\x02' + bytes(Mouse.Message(relative_x = 0.1 + 0.2).report())
+    assert a.merge(Composite.route(Touch.Message())) is None
+
+    raw = RawReport(b'\x03' + bytes(5))
+    assert Composite.route(raw) is raw
+
+    try:
+        KeyboardTouch.route(click)
+        assert False, 'Mouse is not a KeyboardTouch member'
+    except TypeError:
+        pass
+
+    assert Composite.leds(b'\x01\x02') == 0x02
+    assert Composite.leds(b'\x02\x02') is None
+
+
+def test_device_writes_in_order() -> None:
+    async def run(path: Path) -> None:
+        device = HIDDevice(HIDDeviceSettings(
+            function_name = 'hid0',
+            config_file = path.with_suffix('.conf'),
+            device_path = path
+        ))
+        await device.setup()
+        await device.write(Keyboard.Message(control_keys = Keyboard.MODIFIER_LEFT_SHIFT, tap = False))
+        await device.write(Mouse.Message(buttons = 0x01))
+        await device.shutdown()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'hidg0'
+        path.touch()
+        path.with_suffix('.conf').write_text('[function.Composite.hid0]\n')
+        asyncio.run(run(path))
+
+        reports = path.read_bytes()
+        layout = parse_descriptor(Composite.REPORT_DESC)
+        keyboard = layout.decode(reports[:9], report_id = 1)
+        mouse = layout.decode(reports[9:], report_id = 2)
+        assert keyboard['key_e1'][0] == 1 # Left shift
+        assert mouse['button_01'][0] == 1
+
+
+class TruncatingHandle(HIDHandle):
+    # Like /dev/hidgN: each write takes at most report_length bytes, the rest is lost
+    def __init__(self, report_length: int) -> None:
+        self.report_length = report_length
+        self.writes: typing.List[bytes] = []
+
+    async def write(self, data: typing.Union[bytes, bytearray, memoryview]) -> None:
+        self.writes.append(bytes(data[:self.report_length]))
+
+    async def read(self, size: int) -> bytes:
+        return b''
+
+    async def close(self) -> None:
+        pass
+
+
+def test_device_writes_one_report_per_write() -> None:
+    async def run(path: Path) -> TruncatingHandle:
+        device = HIDDevice(HIDDeviceSettings(
+            function_name = 'hid0',
+            config_file = path.with_suffix('.conf'),
+            device_path = path
+        ))
+        await device.setup()
+        device.STATE.handle = handle = TruncatingHandle(Composite.REPORT_LENGTH)
+        await device.write(Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A)) # press + release
+        await device.write(RawReport(bytes(Composite.route(Mouse.Message(buttons = 0x01)).report()) + b'\x03' + bytes(5)))
+        await device.shutdown()
+        assert device.stats().writes == 4
+        return handle
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'hidg0'
+        path.touch()
+        path.with_suffix('.conf').write_text('[function.Composite.hid0]\n')
+        handle = asyncio.run(run(path))
+
+    tap = Composite.route(Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A)).report()
+    assert handle.writes == [
+        tap[:9], tap[9:],
+        b'\x02' + bytes(Mouse.Message(buttons = 0x01).report()),
+        b'\x03' + bytes(5)
+    ]
+
+
+if __name__ == '__main__':
+    test_descriptor()
+    test_route()
+    test_device_writes_in_order()
+    test_device_writes_one_report_per_write()
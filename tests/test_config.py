@@ -1,4 +1,8 @@
+import os
+import subprocess
+import sys
 import tempfile
+import time
 from pathlib import Path
 from importlib.resources import files
 
@@ -23,5 +27,68 @@ def test_config() -> None:
     assert extra_function.split('.')[-1] in config.functions
     assert 'dev_addr' in config.functions['usb0'][1]
 
+def test_snapshot() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text('[gadget]\nname = snap\n[function.Mouse.mouse0]\npoll_interval = 0.001\n')
+        conf_dir = config_path.with_suffix('.d')
+        conf_dir.mkdir()
+
+        config = GadgetConfig(config_path)
+        assert not config.from_snapshot
+        config.write_snapshot()
+
+        config = GadgetConfig(config_path)
+        assert config.from_snapshot
+        assert config.gadget_name == 'snap'
+        assert config.function_specs == {'mouse0': ('ezmsg.gadget.function:Mouse', {'poll_interval': '0.001'})}
+        assert config.functions is config.functions # Memoized
+
+        # Adding a .d file invalidates the snapshot
+        time.sleep(0.01)
+        (conf_dir / 'extra.conf').write_text('[function.Keyboard.keyboard0]\n')
+        os.utime(conf_dir, ns = (time.time_ns(), time.time_ns()))
+        config = GadgetConfig(config_path)
+        assert not config.from_snapshot
+        assert set(config.function_specs) == {'mouse0', 'keyboard0'}
+
+        # ...as does editing the config itself
+        config.write_snapshot()
+        assert GadgetConfig(config_path).from_snapshot
+        config_path.write_text('[gadget]\nname = edited\n')
+        config = GadgetConfig(config_path)
+        assert not config.from_snapshot and config.gadget_name == 'edited'
+
+
+def test_lazy_function_import() -> None:
+    # Only the functions actually looked up are imported
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text('[function.Mouse.mouse0]\n[function.MultiTouch.touch0]\n')
+        script = (
+            'import sys; from pathlib import Path; from ezmsg.gadget.config import GadgetConfig; '
+            f'config = GadgetConfig(Path({str(config_path)!r})); '
+            'assert len(config.function_specs) == 2; '
+            'assert config.function("mouse0")[0].__name__ == "Mouse"; '
+            'assert "ezmsg.gadget.function.mouse" in sys.modules; '
+            'assert "ezmsg.gadget.function.multitouch" not in sys.modules'
+        )
+        subprocess.run([sys.executable, '-c', script], check = True)
+
+
+def test_command_imports_no_codecs() -> None:
+    # The CLI (and the HIDDevice unit) load report codecs only once a
+    # subcommand actually needs a function
+    script = (
+        'import sys; import ezmsg.gadget.command; import ezmsg.gadget.hiddevice; '
+        'codecs = [m for m in sys.modules if m.startswith("ezmsg.gadget.function.")]; '
+        'assert not codecs, codecs'
+    )
+    subprocess.run([sys.executable, '-c', script], check = True)
+
+
 if __name__ == '__main__':
-    test_config()
\ No newline at end of file
+    test_config()
+    test_snapshot()
+    test_lazy_function_import()
+    test_command_imports_no_codecs()
\ No newline at end of file
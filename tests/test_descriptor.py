@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from ezmsg.gadget.descriptor import parse_descriptor
+from ezmsg.gadget.function import Keyboard, Mouse, Touch
+from ezmsg.gadget.reportspec import OUTPUT
+
+
+def test_definition_lengths() -> None:
+    for definition in (Keyboard, Mouse, Touch):
+        layout = parse_descriptor(definition.REPORT_DESC)
+        assert layout.report_length == definition.REPORT_LENGTH
+        assert layout.length() == definition.SPEC.input.length
+        definition.check_report_length()
+
+    assert parse_descriptor(Keyboard.REPORT_DESC).length(OUTPUT) == 1
+
+    class BrokenMouse(Mouse):
+        REPORT_LENGTH = 7
+
+    with pytest.raises(ValueError):
+        BrokenMouse.check_report_length()
+
+
+def test_bulk_decode() -> None:
+    rng = np.random.default_rng(0)
+    n = 1000
+    buttons = rng.integers(0, 8, n)
+    x = rng.uniform(-1.0, 1.0, n)
+    y = rng.uniform(-1.0, 1.0, n)
+    wheel = rng.integers(-127, 128, n)
+
+    decoded = parse_descriptor(Mouse.REPORT_DESC).decode(Mouse.encode_batch(buttons, x, y, wheel))
+    assert np.array_equal(decoded['button_01'] | decoded['button_02'] << 1 | decoded['button_03'] << 2, buttons)
+    assert np.array_equal(decoded['x'], (x * Mouse.SPEC['x'].logical_maximum).astype(int))
+    assert np.array_equal(decoded['y'], (y * Mouse.SPEC['y'].logical_maximum).astype(int))
+    assert np.array_equal(decoded['wheel'], wheel)
+
+    keys = parse_descriptor(Keyboard.REPORT_DESC).decode(Keyboard.encode_batch(0x02, [4, 5, 6], tap = True))
+    assert list(keys['key'][:, 0]) == [4, 0, 5, 0, 6, 0]
+    assert list(keys['key_e1']) == [1, 0, 1, 0, 1, 0]
+
+    with pytest.raises(ValueError):
+        parse_descriptor(Mouse.REPORT_DESC).decode(bytes(7))
+
+
+def test_unaligned_fields_and_report_ids() -> None:
+    desc = bytes([
+        0x05, 0x01,       # Usage Page (Generic Desktop)
+        0x09, 0x02,       # Usage (Mouse)
+        0xA1, 0x01,       # Collection (Application)
+        0x85, 0x02,       #   Report ID (2)
+        0x09, 0x30,       #   Usage (X)
+        0x09, 0x31,       #   Usage (Y)
+        0x16, 0x01, 0xF8, #   Logical Minimum (-2047)
+        0x26, 0xFF, 0x07, #   Logical Maximum (2047)
+        0x75, 0x0C,       #   Report Size (12)
+        0x95, 0x02,       #   Report Count (2)
+        0x81, 0x06,       #   Input (Data,Var,Rel)
+        0xC0,             # End Collection
+    ])
+    layout = parse_descriptor(desc)
+    assert layout.report_ids == (2,)
+    assert layout.length(report_id = 2) == layout.report_length == 4
+
+    # x = -5, y = 1000 packed as two 12 bit fields after the report ID
+    packed = (-5 & 0xfff) | (1000 << 12)
+    report = bytes([2]) + packed.to_bytes(3, 'little')
+    decoded = layout.decode(report * 3, report_id = 2)
+    assert list(decoded['x']) == [-5] * 3
+    assert list(decoded['y']) == [1000] * 3
+
+    with pytest.raises(ValueError):
+        layout.decode(bytes([1]) + report[1:], report_id = 2)
+
+
+if __name__ == '__main__':
+    test_definition_lengths()
+    test_bulk_decode()
+    test_unaligned_fields_and_report_ids()
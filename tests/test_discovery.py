@@ -0,0 +1,147 @@
+import asyncio
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+from pathlib import Path
+
+import pytest
+
+from ezmsg.gadget import discovery, simulate
+from ezmsg.gadget.command import activate, deactivate
+from ezmsg.gadget.config import GadgetConfig, GADGET_PATH
+from ezmsg.gadget.function import Keyboard
+from ezmsg.gadget.hiddevice import hid_devices
+
+FUNCTIONS = 4
+UDEV_DELAY = 0.2 # sec before the simulated udev creates the nodes
+
+CONFIG = '[gadget]\nname = discovery\n' + ''.join(
+    f'[function.Keyboard.keyboard{i}]\n' for i in range(FUNCTIONS)
+)
+
+
+def test_startup_timing(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def no_subprocess(*args, **kwargs):
+        raise AssertionError('Discovery must not fork')
+
+    async def start_endpoint(config: GadgetConfig, nodes: list) -> float:
+        # Nodes show up a little after the gadget is bound, as with udev
+        async def udev() -> None:
+            await asyncio.sleep(UDEV_DELAY)
+            for node in nodes:
+                node.touch()
+
+        start = time.perf_counter()
+        udev_task = asyncio.create_task(udev())
+        devices = hid_devices(config)
+        await asyncio.gather(*[device.setup() for device in devices.values()])
+        await devices['keyboard0'].write(Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A))
+        ready = time.perf_counter() - start
+        await udev_task
+        for device in devices.values():
+            await device.shutdown()
+        return ready
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / 'root'
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text(CONFIG)
+
+        monkeypatch.setenv(simulate.SIMULATE_ENV, str(root))
+        monkeypatch.setattr(asyncio, 'create_subprocess_shell', no_subprocess)
+        activate(config_path)
+        config = GadgetConfig(config_path)
+        nodes = list(asyncio.run(discovery.discover_all(config)).values())
+        assert len(set(nodes)) == FUNCTIONS
+        for node in nodes:
+            node.unlink()
+
+        # Every function waits on udev concurrently, not one after another
+        ready = asyncio.run(start_endpoint(config, nodes))
+        assert UDEV_DELAY <= ready < UDEV_DELAY * 2, ready
+        assert nodes[0].read_bytes() == Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A).report()
+
+        # Cached for the rest of the activation; rebinding invalidates it
+        gadget_dir = simulate.system_path(GADGET_PATH) / 'discovery'
+        start = time.perf_counter()
+        assert asyncio.run(discovery.discover(config, 'keyboard1')) == nodes[1]
+        assert time.perf_counter() - start < UDEV_DELAY
+        (gadget_dir / 'functions' / 'hid.keyboard1' / 'dev').write_text('240:9\n')
+        with pytest.raises(FileNotFoundError): # Not the stale cache entry
+            asyncio.run(discovery.discover(config, 'keyboard1', timeout = 0.05))
+        (gadget_dir / 'functions' / 'hid.keyboard1' / 'dev').write_text('240:1\n')
+
+        deactivate(config_path)
+
+
+def test_shared_discovery(monkeypatch: pytest.MonkeyPatch) -> None:
+    resolved: typing.List[str] = []
+    resolve = discovery._resolve
+
+    async def record_resolve(gadget_dir: Path, function_name: str, timeout: float) -> typing.Tuple[str, Path]:
+        resolved.append(function_name)
+        return await resolve(gadget_dir, function_name, timeout)
+
+    async def start_endpoint(config: GadgetConfig) -> typing.List[typing.Union[Path, BaseException]]:
+        names = [f'keyboard{i}' for i in range(FUNCTIONS)]
+        return await asyncio.gather(*[discovery.discover(config, name, timeout = 0.2) for name in names], return_exceptions = True)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / 'root'
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text(CONFIG)
+
+        monkeypatch.setenv(simulate.SIMULATE_ENV, str(root))
+        monkeypatch.setattr(discovery, '_resolve', record_resolve)
+        activate(config_path)
+        resolved.clear()
+        config = GadgetConfig(config_path)
+        gadget_dir = simulate.system_path(GADGET_PATH) / 'discovery'
+        for i in range(FUNCTIONS):
+            (gadget_dir / 'functions' / f'hid.keyboard{i}' / 'dev').write_text(f'240:{i + 10}\n')
+        (gadget_dir / 'functions' / 'hid.keyboard3' / 'dev').write_text('240:99\n') # Never shows up
+        for i in range(FUNCTIONS - 1):
+            (root / 'sys' / 'dev' / 'char' / f'240:{i + 10}').mkdir(parents = True)
+            (root / 'sys' / 'dev' / 'char' / f'240:{i + 10}' / 'uevent').write_text(f'DEVNAME=hidg{i + 10}\n')
+            (root / 'dev' / f'hidg{i + 10}').touch()
+
+        # Devices starting together share one pass over the functions, and a
+        # missing node fails only its own function
+        nodes = asyncio.run(start_endpoint(config))
+        assert sorted(resolved) == [f'keyboard{i}' for i in range(FUNCTIONS)]
+        assert nodes[:-1] == [root / 'dev' / f'hidg{i + 10}' for i in range(FUNCTIONS - 1)]
+        assert isinstance(nodes[-1], FileNotFoundError)
+
+        with pytest.raises(FileNotFoundError):
+            asyncio.run(discovery.discover_all(config, timeout = 0.05))
+
+        deactivate(config_path)
+
+
+def test_discovery_imports_no_functions(monkeypatch: pytest.MonkeyPatch) -> None:
+    # An endpoint or client resolving nodes shouldn't pay for importing
+    # every configured function's module
+    script = (
+        'import asyncio, sys\n'
+        'from pathlib import Path\n'
+        'from ezmsg.gadget.config import GadgetConfig\n'
+        'from ezmsg.gadget.discovery import discover_all\n'
+        'nodes = asyncio.run(discover_all(GadgetConfig(Path(sys.argv[1]))))\n'
+        f'assert len(nodes) == {FUNCTIONS}, nodes\n'
+        'assert not [m for m in sys.modules if m.startswith("ezmsg.gadget.function")]\n'
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / 'root'
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text(CONFIG)
+        monkeypatch.setenv(simulate.SIMULATE_ENV, str(root))
+        activate(config_path)
+        subprocess.run([sys.executable, '-c', script, str(config_path)], check = True)
+        deactivate(config_path)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,90 @@
+import pickle
+import random
+
+from ezmsg.gadget.function import Composite, Keyboard, Mouse, Touch
+from ezmsg.gadget.message import FrozenMessage
+
+
+def test_frozen_reports_match_messages() -> None:
+    rng = random.Random(0)
+    for _ in range(500):
+        args = (rng.randrange(256), rng.randrange(256), rng.random() > 0.5)
+        assert Keyboard.Frozen(*args).report() == Keyboard.Message(*args).report()
+
+        args = (rng.randrange(8), rng.uniform(-1, 1), rng.uniform(-1, 1), rng.randrange(-127, 128))
+        assert Mouse.Frozen(*args).report() == Mouse.Message(*args).report()
+        assert Mouse.Message(*args).freeze() == Mouse.Frozen(*args)
+
+        args = (rng.randrange(4), rng.random(), rng.random())
+        assert Touch.Frozen(*args).report() == Touch.Message(*args).report()
+
+        buf = bytearray(b'\xff' * 20)
+        frozen = Touch.Frozen(*args)
+        assert frozen.report_into(buf, 3) == frozen.report_size() == 5
+        assert buf[3:8] == frozen.report()
+
+
+def test_frozen_fields() -> None:
+    key = Keyboard.Frozen(control_keys = Keyboard.MODIFIER_LEFT_SHIFT, hid_keycode = Keyboard.KEYCODE_A, tap = False)
+    assert (key.control_keys, key.hid_keycode, key.tap) == (Keyboard.MODIFIER_LEFT_SHIFT, Keyboard.KEYCODE_A, False)
+
+    move = Mouse.Frozen(buttons = 0x02, relative_x = -0.5, relative_y = 0.25, relative_wheel = -3)
+    assert move.buttons == 0x02 and move.relative_wheel == -3
+    assert abs(move.relative_x + 0.5) < 1e-4 and abs(move.relative_y - 0.25) < 1e-4
+
+    touch = Touch.Frozen(touch = 0x03, absolute_x = 0.5, absolute_y = 0.125)
+    assert (touch.touch, touch.absolute_x, touch.absolute_y) == (0x03, 0.5, 0.125)
+    assert repr(touch) == 'Touch.Frozen(touch=3, absolute_x=0.5, absolute_y=0.125)'
+
+
+def test_frozen_is_slotted_and_immutable() -> None:
+    for msg in [Keyboard.Frozen(), Mouse.Frozen(), Touch.Frozen()]:
+        assert not hasattr(msg, '__dict__')
+        for name in type(msg)._FIELDS + ('other',):
+            try:
+                setattr(msg, name, 1)
+                assert False, f'set {name}'
+            except AttributeError:
+                pass
+        assert hash(msg) == hash(type(msg).from_report(msg.report()))
+
+
+def test_frozen_pickles_as_report() -> None:
+    for msg in [Keyboard.Frozen(0x01, 0x04), Mouse.Frozen(1, 0.1, -0.1, 1), Touch.Frozen(3, 0.2, 0.8)]:
+        data = pickle.dumps(msg, protocol = pickle.HIGHEST_PROTOCOL)
+        assert msg._report in data
+        restored = pickle.loads(data)
+        assert type(restored) is type(msg) and restored == msg
+        assert isinstance(restored, FrozenMessage)
+
+
+def test_frozen_merge_and_route() -> None:
+    a = Mouse.Frozen(buttons = 1, relative_x = 0.25, relative_wheel = 2)
+    b = Mouse.Frozen(buttons = 1, relative_x = 0.25, relative_y = -0.5, relative_wheel = 3)
+    merged = a.merge(b)
+    assert isinstance(merged, Mouse.Frozen)
+    # Sums of the encoded deltas: exactly what the two reports would have moved
+    assert merged.buttons == 1 and merged.relative_wheel == 5
+    assert abs(merged.relative_x - (a.relative_x + b.relative_x)) < 1e-9
+    assert abs(merged.relative_y - b.relative_y) < 1e-9
+    assert a.merge(Mouse.Frozen(buttons = 0)) is None
+    assert a.merge(Mouse.Frozen(buttons = 1, relative_x = 0.9)) is None
+
+    t0, t1 = Touch.Frozen(3, 0.1, 0.1), Touch.Frozen(3, 0.2, 0.2)
+    assert t0.merge(t1) is t1
+    assert t0.merge(Touch.Frozen(0, 0.2, 0.2)) is None
+
+    for frozen, message in [
+        (Keyboard.Frozen(0, Keyboard.KEYCODE_A), Keyboard.Message(0, Keyboard.KEYCODE_A)),
+        (Mouse.Frozen(1, 0.1), Mouse.Message(1, 0.1)),
+        (Touch.Frozen(3, 0.5, 0.5), Touch.Message(3, 0.5, 0.5)),
+    ]:
+        assert Composite.route(frozen).report() == Composite.route(message).report()
+
+
+if __name__ == '__main__':
+    test_frozen_reports_match_messages()
+    test_frozen_fields()
+    test_frozen_is_slotted_and_immutable()
+    test_frozen_pickles_as_report()
+    test_frozen_merge_and_route()
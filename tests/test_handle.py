@@ -0,0 +1,143 @@
+import asyncio
+import os
+import socket
+import tempfile
+import typing
+
+from pathlib import Path
+
+import pytest
+
+from ezmsg.gadget import hiddevice
+from ezmsg.gadget.function import Keyboard
+from ezmsg.gadget.handle import open_handle, HIDHandle, NonBlockingHandle, BACKENDS, BACKEND_AIOFILE, BACKEND_NONBLOCKING
+from ezmsg.gadget.hiddevice import HIDDevice, HIDDeviceSettings
+
+REPORT = bytes([0x02, 0x00, 0x04, 0x00, 0x00, 0x00, 0x00, 0x00])
+
+
+def test_backends_write_file() -> None:
+    async def run(path: Path, backend: str) -> None:
+        handle = await open_handle(path, backend)
+        for _ in range(4):
+            await handle.write(REPORT)
+        await handle.close()
+
+    for backend in BACKENDS:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'hidg0'
+            path.touch()
+            asyncio.run(run(path, backend))
+            assert path.read_bytes() == REPORT * 4
+
+
+def test_nonblocking_backpressure() -> None:
+    async def run(path: Path) -> bytes:
+        reader = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        handle = await open_handle(path, BACKEND_NONBLOCKING)
+        payload = REPORT * 65536 # Larger than the pipe buffer
+
+        async def drain() -> bytes:
+            received = bytearray()
+            while len(received) < len(payload):
+                await asyncio.sleep(0.001)
+                try:
+                    received += os.read(reader, 65536)
+                except BlockingIOError:
+                    pass
+            return bytes(received)
+
+        drain_task = asyncio.create_task(drain())
+        await handle.write(payload)
+        received = await drain_task
+        await handle.close()
+        os.close(reader)
+        return received
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'hidg0'
+        os.mkfifo(path)
+        assert asyncio.run(run(path)) == REPORT * 65536
+
+
+def test_nonblocking_read() -> None:
+    # A socketpair stands in for a hidg node: the host end sends LED reports
+    async def run() -> bytes:
+        host, gadget = socket.socketpair()
+        gadget.setblocking(False)
+        handle = NonBlockingHandle(gadget.detach())
+
+        read = asyncio.create_task(handle.read(64))
+        await asyncio.sleep(0.01)
+        assert not read.done()
+        host.send(bytes([Keyboard.LED_CAPS_LOCK | Keyboard.LED_NUM_LOCK]))
+        report = await asyncio.wait_for(read, 1.0)
+
+        await handle.close()
+        host.close()
+        return report
+
+    leds = Keyboard.LEDs(asyncio.run(run())[0])
+    assert leds.caps_lock and leds.num_lock and not leds.scroll_lock
+
+
+def test_device_writes_while_reading_leds(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Writes go through aiofile (default backend) to a file; LED reports come
+    # in on a nonblocking descriptor of their own, here a socketpair whose
+    # other end is the host
+    host, gadget = socket.socketpair()
+    gadget.setblocking(False)
+    opened: typing.List[str] = []
+
+    async def fake_open_handle(path: typing.Union[str, Path], backend: str = BACKEND_AIOFILE) -> HIDHandle:
+        opened.append(backend)
+        if backend == BACKEND_NONBLOCKING:
+            return NonBlockingHandle(gadget.fileno(), owned = False)
+        return await open_handle(path, backend)
+
+    monkeypatch.setattr(hiddevice, 'open_handle', fake_open_handle)
+
+    async def run(path: Path) -> Keyboard.LEDs:
+        device = HIDDevice(HIDDeviceSettings(
+            function_name = 'keyboard0',
+            config_file = path.with_suffix('.conf'),
+            device_path = path
+        ))
+        await device.setup()
+        assert opened == [BACKEND_AIOFILE, BACKEND_NONBLOCKING]
+        leds = device.read_leds()
+        pending = asyncio.create_task(leds.__anext__())
+        await asyncio.sleep(0.05)
+        assert not pending.done()
+
+        # The pending LED read doesn't hold up writes
+        await asyncio.wait_for(device.write(Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A)), 1.0)
+        assert not pending.done()
+
+        host.send(bytes([Keyboard.LED_CAPS_LOCK]))
+        _, report = await asyncio.wait_for(pending, 1.0)
+        await leds.aclose()
+        await device.shutdown()
+        return report
+
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'hidg0'
+            path.touch()
+            path.with_suffix('.conf').write_text('[function.Keyboard.keyboard0]\n')
+            leds = asyncio.run(run(path))
+            assert path.read_bytes() == b'\x00\x00\x04' + bytes(5) + bytes(8) # Press, release
+    finally:
+        host.close()
+        gadget.close()
+
+    assert leds.caps_lock and not leds.num_lock
+
+
+def test_unknown_backend() -> None:
+    with pytest.raises(ValueError):
+        asyncio.run(open_handle('/dev/null', 'mmap'))
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -1,52 +1,67 @@
+import asyncio
 import tempfile
 import unittest
 
-from ezmsg.hid import keyboard
-from ezmsg.hid import keycodes
+from pathlib import Path
+
+from ezmsg.gadget.function import Keyboard
+from ezmsg.gadget.hiddevice import HIDDevice, HIDDeviceSettings
+from ezmsg.gadget.message import HIDMessage
+
+
+def write_through_device(msg: HIDMessage, function_name: str = 'keyboard') -> bytes:
+    # Write one message through a HIDDevice into a file standing in for /dev/hidgN
+    async def run(path: Path) -> None:
+        device = HIDDevice(
+            HIDDeviceSettings(
+                function_name = function_name,
+                config_file = path.with_suffix('.conf'),
+                device_path = path
+            )
+        )
+        await device.setup()
+        await device.write(msg)
+        await device.shutdown()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'hidg0'
+        path.touch()
+        asyncio.run(run(path))
+        return path.read_bytes()
+
 
 class KeyboardTest(unittest.TestCase):
 
     def test_send_hid_keycode_to_hid_interface(self):
-        with tempfile.NamedTemporaryFile() as input_file:
-            keyboard.send_keystroke(
-                keyboard_path=input_file.name,
-                control_keys=keycodes.KEYCODE_NONE,
-                hid_keycode=keycodes.KEYCODE_A,
-            )
-            input_file.seek(0)
-            # Press the key then release the key.
-            self.assertEqual(
-                b'\x00\x00\x04\x00\x00\x00\x00\x00'
-                b'\x00\x00\x00\x00\x00\x00\x00\x00', input_file.read())
+        # Press the key then release the key.
+        self.assertEqual(
+            b'\x00\x00\x04\x00\x00\x00\x00\x00'
+            b'\x00\x00\x00\x00\x00\x00\x00\x00',
+            write_through_device(Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A)))
 
     def test_send_control_key_to_hid_interface(self):
-        with tempfile.NamedTemporaryFile() as input_file:
-            keyboard.send_keystroke(
-                keyboard_path=input_file.name,
-                control_keys=keycodes.MODIFIER_LEFT_SHIFT,
-                hid_keycode=keycodes.KEYCODE_NONE,
-            )
-            input_file.seek(0)
-            # Press the key, but do not release the key. This is to allow for
-            # shift+click type behavior.
-            self.assertEqual(b'\x02\x00\x00\x00\x00\x00\x00\x00',
-                             input_file.read())
+        # Press the key, but do not release the key. This is to allow for
+        # shift+click type behavior.
+        self.assertEqual(
+            b'\x02\x00\x00\x00\x00\x00\x00\x00',
+            write_through_device(Keyboard.Message(
+                control_keys = Keyboard.MODIFIER_LEFT_SHIFT,
+                tap = False)))
 
     def test_send_control_key_and_hid_keycode_to_hid_interface(self):
-        with tempfile.NamedTemporaryFile() as input_file:
-            keyboard.send_keystroke(
-                keyboard_path=input_file.name,
-                control_keys=keycodes.MODIFIER_LEFT_SHIFT,
-                hid_keycode=keycodes.KEYCODE_A,
-            )
-            input_file.seek(0)
-            # Press the key then release the key.
-            self.assertEqual(
-                b'\x02\x00\x04\x00\x00\x00\x00\x00'
-                b'\x00\x00\x00\x00\x00\x00\x00\x00', input_file.read())
+        # Press the key then release the key.
+        self.assertEqual(
+            b'\x02\x00\x04\x00\x00\x00\x00\x00'
+            b'\x00\x00\x00\x00\x00\x00\x00\x00',
+            write_through_device(Keyboard.Message(
+                control_keys = Keyboard.MODIFIER_LEFT_SHIFT,
+                hid_keycode = Keyboard.KEYCODE_A)))
 
     def test_send_release_keys_to_hid_interface(self):
-        with tempfile.NamedTemporaryFile() as input_file:
-            keyboard.release_keys(keyboard_path=input_file.name)
-            self.assertEqual(b'\x00\x00\x00\x00\x00\x00\x00\x00',
-                             input_file.read())
\ No newline at end of file
+        self.assertEqual(
+            b'\x00\x00\x00\x00\x00\x00\x00\x00',
+            write_through_device(Keyboard.Report()))
+
+
+if __name__ == '__main__':
+    unittest.main()
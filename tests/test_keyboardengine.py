@@ -0,0 +1,74 @@
+import asyncio
+import typing
+
+from ezmsg.gadget.function import Keyboard
+from ezmsg.gadget.keyboardengine import (
+    KeyboardEngine,
+    KeyboardState,
+    KeyEvent,
+    KEY_PRESS,
+    KEY_RELEASE,
+    KEY_HOLD,
+    KEY_RELEASE_ALL
+)
+
+
+def test_keyboard_state() -> None:
+    keys = KeyboardState()
+    keys.press(Keyboard.KEYCODE_LEFT_CTRL)
+    keys.press(Keyboard.KEYCODE_LEFT_SHIFT)
+    keys.press(Keyboard.KEYCODE_T)
+    assert keys.report().report() == bytes([0x03, 0x00, Keyboard.KEYCODE_T, 0, 0, 0, 0, 0])
+
+    keys.release(Keyboard.KEYCODE_LEFT_SHIFT)
+    keys.press(Keyboard.KEYCODE_T) # Already down; no duplicate slot
+    assert keys.report() == Keyboard.Report(Keyboard.MODIFIER_LEFT_CTRL, (Keyboard.KEYCODE_T,))
+
+    for keycode in range(Keyboard.KEYCODE_A, Keyboard.KEYCODE_A + 6):
+        keys.press(keycode)
+    assert keys.report().hid_keycodes == (Keyboard.KEYCODE_ERROR_ROLLOVER,) * 6
+
+    keys.release(Keyboard.KEYCODE_T)
+    assert keys.report().hid_keycodes == tuple(range(Keyboard.KEYCODE_A, Keyboard.KEYCODE_A + 6))
+
+    keys.release_all()
+    assert keys.report().report() == bytes(8)
+
+
+def test_keyboard_engine_diffs() -> None:
+    async def run() -> typing.List[Keyboard.Report]:
+        engine = KeyboardEngine()
+        await engine.setup()
+
+        events = [
+            KeyEvent(Keyboard.KEYCODE_LEFT_SHIFT, KEY_PRESS),
+            KeyEvent(Keyboard.KEYCODE_A, KEY_PRESS),
+            KeyEvent(Keyboard.KEYCODE_A, KEY_PRESS), # No change
+            KeyEvent(Keyboard.KEYCODE_B, KEY_HOLD, duration = 0.05),
+            KeyEvent(Keyboard.KEYCODE_C, KEY_RELEASE), # Not down; no change
+            KeyEvent(Keyboard.KEYCODE_A, KEY_RELEASE),
+        ]
+        for event in events:
+            await engine.on_event(event)
+
+        reports: typing.List[Keyboard.Report] = []
+        publisher = engine.publish_reports()
+        for _ in range(5):
+            _, report = await asyncio.wait_for(publisher.__anext__(), 1.0)
+            reports.append(report)
+            if len(reports) == 4:
+                await engine.on_event(KeyEvent(action = KEY_RELEASE_ALL))
+        return reports
+
+    assert asyncio.run(run()) == [
+        Keyboard.Report(Keyboard.MODIFIER_LEFT_SHIFT, ()),
+        Keyboard.Report(Keyboard.MODIFIER_LEFT_SHIFT, (Keyboard.KEYCODE_A,)),
+        Keyboard.Report(Keyboard.MODIFIER_LEFT_SHIFT, (Keyboard.KEYCODE_A, Keyboard.KEYCODE_B)),
+        Keyboard.Report(Keyboard.MODIFIER_LEFT_SHIFT, (Keyboard.KEYCODE_B,)),
+        Keyboard.Report(),
+    ]
+
+
+if __name__ == '__main__':
+    test_keyboard_state()
+    test_keyboard_engine_diffs()
@@ -0,0 +1,60 @@
+import numpy as np
+
+from ezmsg.gadget.descriptor import parse_descriptor
+from ezmsg.gadget.function import MultiTouch
+
+
+def test_descriptor() -> None:
+    MultiTouch.check_report_length()
+    assert MultiTouch.REPORT_LENGTH == MultiTouch.CONTACTS * 6 + 1
+    layout = parse_descriptor(MultiTouch.REPORT_DESC)
+    assert [f.name for f in layout.fields[:4]] == ['digitizer', 'contact_id', 'desktop', 'digitizer']
+    assert layout.fields[-1].name == 'contact_count'
+    assert layout.fields[-1].logical_maximum == MultiTouch.CONTACTS
+
+
+def test_pinch_frame() -> None:
+    msg = MultiTouch.Message(absolute_x = np.array([0.25, 0.75]), absolute_y = np.array([0.5, 0.5]))
+    report = msg.report()
+    assert len(report) == msg.report_size() == MultiTouch.REPORT_LENGTH
+
+    fields = MultiTouch.SPEC.input.unpack(report)
+    assert fields['contact_count'] == 2
+    assert (fields['touch0'], fields['contact_id0'], fields['x0'], fields['y0']) == (3, 0, 2500, 5000)
+    assert (fields['touch1'], fields['contact_id1'], fields['x1'], fields['y1']) == (3, 1, 7500, 5000)
+    assert fields['x2'] == 0 and fields['touch2'] == 0
+
+    decoded = parse_descriptor(MultiTouch.REPORT_DESC).decode(report)
+    assert decoded['x_2'][0] == 7500 and decoded['contact_count'][0] == 2
+
+
+def test_batch() -> None:
+    # A 3-frame swipe of 2 fingers, the last frame lifting finger 7
+    x = np.array([[0.1, 0.2], [0.3, 0.4], [0.5, 0.6]])
+    touch = np.array([[3, 3], [3, 3], [3, 0]])
+    reports = MultiTouch.encode_batch(touch, x, 0.5, contact_id = np.array([4, 7]))
+    assert len(reports) == 3 * MultiTouch.REPORT_LENGTH
+
+    decoded = parse_descriptor(MultiTouch.REPORT_DESC).decode(reports)
+    assert list(decoded['x']) == [1000, 3000, 5000]
+    assert list(decoded['contact_id_2']) == [7, 7, 7]
+    assert list(decoded['tip_switch_2']) == [1, 1, 0]
+
+    single = MultiTouch.Message(touch = touch[0], absolute_x = x[0], absolute_y = np.full(2, 0.5), contact_id = np.array([4, 7]))
+    assert bytes(single.report()) == reports[:MultiTouch.REPORT_LENGTH]
+
+
+def test_merge() -> None:
+    a = MultiTouch.Message(absolute_x = np.array([0.1, 0.2]), absolute_y = np.array([0.1, 0.2]))
+    b = MultiTouch.Message(absolute_x = np.array([0.3, 0.4]), absolute_y = np.array([0.3, 0.4]))
+    assert a.merge(b) is b
+    lifted = MultiTouch.Message(touch = np.array([3, 0]), absolute_x = np.array([0.3, 0.4]), absolute_y = np.array([0.3, 0.4]))
+    assert a.merge(lifted) is None
+    assert a.merge(MultiTouch.Message(absolute_x = np.array([0.3]), absolute_y = np.array([0.3]))) is None
+
+
+if __name__ == '__main__':
+    test_descriptor()
+    test_pinch_frame()
+    test_batch()
+    test_merge()
@@ -0,0 +1,59 @@
+import json
+import tempfile
+
+from pathlib import Path
+
+import pytest
+
+from ezmsg.gadget import simulate
+from ezmsg.gadget.command import profile, deactivate
+from ezmsg.gadget.function import Keyboard
+
+CONFIG = """
+[gadget]
+name = profile
+
+[endpoint]
+remote_host = 127.0.0.1
+remote_port = 1
+
+[function.Keyboard.keyboard0]
+
+[function.Mouse.mouse0]
+"""
+
+
+def test_profile(monkeypatch: pytest.MonkeyPatch) -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / 'root'
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text(CONFIG)
+        output = Path(tmpdir) / 'profile.json'
+
+        monkeypatch.setenv(simulate.SIMULATE_ENV, str(root))
+        profile(config_path, output)
+        record = json.loads(output.read_text())
+        phases = [entry['phase'] for entry in record['phases']]
+        assert phases == [
+            'config parse', 'function import', 'configfs writes', 'udc bind',
+            'discovery', 'chmod', 'graphserver connect', 'device setup', 'first write'
+        ]
+        assert record['meta']['simulated']
+        assert abs(record['total'] - sum(entry['seconds'] for entry in record['phases'])) < 1e-9
+
+        # No GraphServer is listening; that's recorded, not fatal
+        connect = record['phases'][phases.index('graphserver connect')]
+        assert 'error' in connect
+
+        # The first write is an all-released report
+        assert (root / 'dev' / 'hidg0').read_bytes() == bytes(Keyboard.SPEC.input.length)
+
+        # Already active and unchanged: no rebind to time
+        profile(config_path, output)
+        assert 'udc bind' not in [entry['phase'] for entry in json.loads(output.read_text())['phases']]
+
+        deactivate(config_path)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,140 @@
+import builtins
+import errno
+import os
+import tempfile
+import typing
+
+from pathlib import Path
+
+import pytest
+
+from ezmsg.gadget import reconcile, simulate
+from ezmsg.gadget.command import activate, deactivate
+from ezmsg.gadget.config import GadgetConfig, GADGET_PATH
+from ezmsg.gadget.reconcile import diff_gadget, apply_gadget_diff
+
+CONFIG = """
+[gadget]
+name = g1
+
+[function.Keyboard.keyboard0]
+
+[function.Mouse.mouse0]
+
+[function.Ethernet.usb0]
+host_addr = 60:6D:3C:3E:0C:7B
+"""
+
+
+def test_reconcile() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text(CONFIG)
+        gadget_dir = Path(tmpdir) / 'configfs' / 'g1'
+
+        # A fresh tree gets everything
+        diff = diff_gadget(GadgetConfig(config_path), gadget_dir)
+        assert diff.changed
+        assert 'functions/hid.keyboard0/report_desc' in diff.attributes
+        assert diff.links == {'configs/c.1/hid.keyboard0': 'hid.keyboard0', 'configs/c.1/hid.mouse0': 'hid.mouse0', 'configs/c.1/ecm.usb0': 'ecm.usb0'}
+        apply_gadget_diff(gadget_dir, diff)
+        assert (gadget_dir / 'functions' / 'hid.mouse0' / 'report_length').read_text() == '6'
+        assert (gadget_dir / 'configs' / 'c.1' / 'hid.mouse0').is_symlink()
+
+        # configfs reads attributes back in its own format; that's not a change
+        (gadget_dir / 'idVendor').write_text('0x1d6b\n')
+        (gadget_dir / 'functions' / 'ecm.usb0' / 'host_addr').write_text('60:6d:3c:3e:0c:7b\n')
+        assert not diff_gadget(GadgetConfig(config_path), gadget_dir).changed
+
+        # Only what differs is written
+        config_path.write_text(CONFIG.replace('[function.Mouse.mouse0]', '[function.Touch.touch0]'))
+        diff = diff_gadget(GadgetConfig(config_path), gadget_dir)
+        assert diff.removed == ['functions/hid.mouse0']
+        assert diff.unlinks == ['configs/c.1/hid.mouse0']
+        assert diff.links == {'configs/c.1/hid.touch0': 'hid.touch0'}
+        assert diff.directories == ['functions/hid.touch0']
+        assert all(rel.startswith('functions/hid.touch0/') for rel in diff.attributes)
+
+        untouched = (gadget_dir / 'functions' / 'hid.keyboard0' / 'report_desc').stat().st_mtime_ns
+        apply_gadget_diff(gadget_dir, diff)
+        assert (gadget_dir / 'functions' / 'hid.keyboard0' / 'report_desc').stat().st_mtime_ns == untouched
+        assert not (gadget_dir / 'functions' / 'hid.mouse0').exists()
+        assert not (gadget_dir / 'configs' / 'c.1' / 'hid.mouse0').exists()
+        assert not diff_gadget(GadgetConfig(config_path), gadget_dir).changed
+
+
+def _refuse_linked_writes(monkeypatch: pytest.MonkeyPatch, gadget_dir: Path) -> None:
+    # Like configfs: writing an attribute of a function that is linked into
+    # a config fails with EBUSY
+    def configfs_open(file: typing.Any, mode: str = 'r', *args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        path = Path(file)
+        if 'w' in mode and path.parent.parent == gadget_dir / 'functions':
+            for link in (gadget_dir / 'configs').glob('*/*'):
+                if link.is_symlink() and Path(os.readlink(link)).name == path.parent.name:
+                    raise OSError(errno.EBUSY, os.strerror(errno.EBUSY), str(path))
+        return builtins.open(file, mode, *args, **kwargs)
+
+    monkeypatch.setattr(reconcile, 'open', configfs_open, raising = False)
+
+
+def test_linked_function_attributes(monkeypatch: pytest.MonkeyPatch) -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text(CONFIG)
+        gadget_dir = Path(tmpdir) / 'configfs' / 'g1'
+        _refuse_linked_writes(monkeypatch, gadget_dir)
+        apply_gadget_diff(gadget_dir, diff_gadget(GadgetConfig(config_path), gadget_dir))
+        config_dir = gadget_dir / 'configs' / 'c.1'
+        order = [link.name for link in config_dir.iterdir()]
+
+        # The function comes out of its config for the write and goes back in
+        # where it was, next to the links left as they were
+        config_path.write_text(CONFIG.replace('60:6D:3C:3E:0C:7B', '60:6D:3C:3E:0C:7C'))
+        diff = diff_gadget(GadgetConfig(config_path), gadget_dir)
+        assert list(diff.attributes) == ['functions/ecm.usb0/host_addr'] and not diff.links
+        apply_gadget_diff(gadget_dir, diff)
+        assert (gadget_dir / 'functions' / 'ecm.usb0' / 'host_addr').read_text() == '60:6D:3C:3E:0C:7C'
+        assert [link.name for link in config_dir.iterdir()] == order
+        links = [link for link in config_dir.iterdir() if link.is_symlink()]
+        assert len(links) == 3 and all(link.resolve().is_dir() for link in links)
+        assert not diff_gadget(GadgetConfig(config_path), gadget_dir).changed
+
+
+def test_activate_skips_rebind(monkeypatch: pytest.MonkeyPatch) -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / 'root'
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text(CONFIG)
+        gadget_dir = simulate.system_path(GADGET_PATH, root) / 'g1'
+
+        monkeypatch.setenv(simulate.SIMULATE_ENV, str(root))
+        _refuse_linked_writes(monkeypatch, gadget_dir)
+        activate(config_path)
+        node = root / 'dev' / 'hidg0'
+        inode = node.stat().st_ino
+
+        # Unchanged: the gadget stays bound and the node an open endpoint
+        # holds stays valid
+        activate(config_path)
+        assert node.stat().st_ino == inode
+        assert (gadget_dir / 'UDC').read_text() == simulate.SIMULATED_UDC
+
+        # Changed: unbind, write the difference, rebind
+        config_path.write_text(CONFIG + '[function.Touch.touch0]\n')
+        activate(config_path)
+        assert node.stat().st_ino != inode
+        assert (gadget_dir / 'functions' / 'hid.touch0' / 'dev').is_file()
+        assert len(list((root / 'dev').iterdir())) == 3
+
+        # A changed attribute of a function that is already linked
+        config_path.write_text(CONFIG.replace('60:6D:3C:3E:0C:7B', '60:6D:3C:3E:0C:7C') + '[function.Touch.touch0]\n')
+        activate(config_path)
+        assert (gadget_dir / 'functions' / 'ecm.usb0' / 'host_addr').read_text() == '60:6D:3C:3E:0C:7C'
+        assert (gadget_dir / 'configs' / 'c.1' / 'ecm.usb0').is_symlink()
+        assert (gadget_dir / 'UDC').read_text() == simulate.SIMULATED_UDC
+
+        deactivate(config_path)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
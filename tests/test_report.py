@@ -0,0 +1,91 @@
+import random
+
+import numpy as np
+
+from ezmsg.gadget.function import Keyboard, Mouse, Touch
+from ezmsg.gadget.message import encode_reports
+
+# Reference encoders; these are the original list-building report() bodies
+
+def keyboard_report(control_keys: int, hid_keycode: int, tap: bool) -> bytearray:
+    buf = [0] * 16
+    buf[0] = control_keys
+    buf[2] = hid_keycode
+    return bytearray(buf[:(16 if tap else 8)])
+
+def mouse_report(buttons: int, relative_x: float, relative_y: float, relative_wheel: int) -> bytearray:
+    x = int(relative_x * ((2 ** 15) - 1))
+    y = int(relative_y * ((2 ** 15) - 1))
+    return bytearray([
+        buttons, x & 0xff, (x >> 8) & 0xff,
+        y & 0xff, (y >> 8) & 0xff, relative_wheel & 0xff
+    ])
+
+def touch_report(touch: int, absolute_x: float, absolute_y: float) -> bytearray:
+    x = int(absolute_x * 10000)
+    y = int(absolute_y * 10000)
+    return bytearray([touch, x & 0xff, (x >> 8) & 0xff, y & 0xff, (y >> 8) & 0xff])
+
+
+def test_keyboard_report() -> None:
+    rng = random.Random(0)
+    for _ in range(1000):
+        args = (rng.randrange(256), rng.randrange(256), rng.random() > 0.5)
+        msg = Keyboard.Message(*args)
+        assert msg.report() == keyboard_report(*args)
+
+        buf = bytearray(b'\xff' * 20)
+        assert msg.report_into(buf, 2) == msg.report_size()
+        assert buf[2:2 + msg.report_size()] == keyboard_report(*args)
+
+
+def test_mouse_report() -> None:
+    rng = random.Random(1)
+    for _ in range(1000):
+        args = (rng.randrange(8), rng.uniform(-1.0, 1.0), rng.uniform(-1.0, 1.0), rng.randrange(-127, 128))
+        assert Mouse.Message(*args).report() == mouse_report(*args)
+    assert Mouse.Message(0, -1.0, 1.0, -127).report() == mouse_report(0, -1.0, 1.0, -127)
+
+
+def test_touch_report() -> None:
+    rng = random.Random(2)
+    for _ in range(1000):
+        args = (rng.randrange(4), rng.random(), rng.random())
+        assert Touch.Message(*args).report() == touch_report(*args)
+    assert Touch.Message(3, 1.0, 1.0).report() == touch_report(3, 1.0, 1.0)
+
+
+def test_batch_encoders() -> None:
+    rng = np.random.default_rng(3)
+    n = 500
+
+    control_keys = rng.integers(0, 256, n)
+    keycodes = rng.integers(0, 256, n)
+    for tap in (True, False):
+        expected = b''.join(keyboard_report(int(c), int(k), tap) for c, k in zip(control_keys, keycodes))
+        assert Keyboard.encode_batch(control_keys, keycodes, tap = tap) == expected
+
+    buttons = rng.integers(0, 8, n)
+    x, y = rng.uniform(-1.0, 1.0, (2, n))
+    wheel = rng.integers(-127, 128, n)
+    expected = b''.join(mouse_report(*args) for args in zip(buttons.tolist(), x.tolist(), y.tolist(), wheel.tolist()))
+    assert Mouse.encode_batch(buttons, x, y, wheel) == expected
+
+    touch = rng.integers(0, 4, n)
+    x, y = rng.uniform(0.0, 1.0, (2, n))
+    expected = b''.join(touch_report(*args) for args in zip(touch.tolist(), x.tolist(), y.tolist()))
+    assert Touch.encode_batch(touch, x, y) == expected
+
+    messages = [
+        Keyboard.Message(Keyboard.MODIFIER_LEFT_SHIFT, Keyboard.KEYCODE_A),
+        Mouse.Message(0x01, 0.5, -0.25, 1),
+        Touch.Message(0x03, 0.5, 0.5),
+    ]
+    assert encode_reports(messages) == b''.join(msg.report() for msg in messages)
+
+
+if __name__ == '__main__':
+    test_keyboard_report()
+    test_mouse_report()
+    test_touch_report()
+    test_batch_encoders()
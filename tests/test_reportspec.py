@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from ezmsg.gadget.function import Keyboard, Mouse, Touch
+from ezmsg.gadget.reportspec import (
+    ReportSpec, Field, padding,
+    PAGE_GENERIC_DESKTOP, PAGE_BUTTON, USAGE_MOUSE, USAGE_X, USAGE_Y,
+    DATA, VARIABLE, RELATIVE
+)
+
+
+def test_generated_definitions() -> None:
+    # Layouts match the previously hand-written definitions
+    assert Keyboard.REPORT_LENGTH == 8
+    assert Mouse.REPORT_LENGTH == 6
+    assert Touch.REPORT_LENGTH == 5
+    assert Keyboard.SPEC.input.struct.format == '<B1x6B'
+    assert Keyboard.SPEC.output.length == 1
+    assert Mouse.SPEC.input.struct.format == '<BHHB'
+    assert Touch.SPEC.input.struct.format == '<BHH'
+    assert Mouse.SPEC['x'].logical_maximum == (2 ** 15) - 1
+    assert Touch.SPEC['y'].logical_maximum == 10000
+
+    # Logical maximum 255 needs a 2 byte signed item; X/Y share one main item
+    assert bytes([0x26, 0xFF, 0x00]) in Keyboard.REPORT_DESC
+    assert bytes([0x09, 0x30, 0x09, 0x31, 0x16, 0x01, 0x80, 0x26, 0xFF, 0x7F]) in Mouse.REPORT_DESC
+    for definition in (Keyboard, Mouse, Touch):
+        assert definition.REPORT_DESC[:2] == bytes([0x05, definition.SPEC.usage_page])
+        assert definition.REPORT_DESC[-1] == 0xC0 # END_COLLECTION
+
+
+def test_roundtrip() -> None:
+    report = Mouse.Message(buttons = 0x05, relative_x = -1.0, relative_y = 0.5, relative_wheel = -3).report()
+    assert Mouse.SPEC.input.unpack(report) == {'buttons': 5, 'x': -32767, 'y': 16383, 'wheel': -3}
+
+    report = Keyboard.Report(Keyboard.MODIFIER_LEFT_SHIFT, (Keyboard.KEYCODE_A, Keyboard.KEYCODE_B)).report()
+    assert Keyboard.SPEC.input.unpack(report) == {
+        'control_keys': Keyboard.MODIFIER_LEFT_SHIFT,
+        'hid_keycodes': (Keyboard.KEYCODE_A, Keyboard.KEYCODE_B, 0, 0, 0, 0)
+    }
+
+    reports = Touch.encode_batch(0x03, [0.0, 0.5], [1.0, 0.25])
+    decoded = np.frombuffer(reports, dtype = Touch.SPEC.input.dtype)
+    assert list(decoded['x']) == [0, 5000] and list(decoded['y']) == [10000, 2500]
+
+
+def test_unsupported_layouts() -> None:
+    relative = DATA | VARIABLE | RELATIVE
+
+    # A bitmask that is not padded out to a byte
+    with pytest.raises(ValueError):
+        ReportSpec(PAGE_GENERIC_DESKTOP, USAGE_MOUSE, [
+            Field('buttons', size = 1, count = 3, usage_page = PAGE_BUTTON, usage_minimum = 1, usage_maximum = 3),
+            Field('x', size = 16, usages = (USAGE_X,), logical_minimum = -127, logical_maximum = 127, flags = relative),
+        ])
+
+    # 12 bit axes don't map onto a struct format
+    with pytest.raises(ValueError):
+        ReportSpec(PAGE_GENERIC_DESKTOP, USAGE_MOUSE, [
+            Field('x', size = 12, usages = (USAGE_X,), logical_minimum = -2047, logical_maximum = 2047, flags = relative),
+            Field('y', size = 12, usages = (USAGE_Y,), logical_minimum = -2047, logical_maximum = 2047, flags = relative),
+        ])
+
+    assert len(ReportSpec(PAGE_GENERIC_DESKTOP, USAGE_MOUSE, [padding(16)]).descriptor) > 0
+
+
+if __name__ == '__main__':
+    test_generated_definitions()
+    test_roundtrip()
+    test_unsupported_layouts()
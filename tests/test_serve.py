@@ -0,0 +1,190 @@
+import asyncio
+import os
+import socket
+import tempfile
+import typing
+
+from pathlib import Path
+
+from ezmsg.gadget.config import GadgetConfig
+from ezmsg.gadget.function import Composite, Keyboard, Mouse
+from ezmsg.gadget.serve import ReportServer, encode_packet, encode_fields, listen
+
+CONFIG = """
+[function.Keyboard.keyboard0]
+
+[function.Mouse.mouse0]
+
+[function.Composite.combo0]
+"""
+
+
+def _server(tmpdir: str) -> typing.Tuple[ReportServer, typing.Dict[str, Path]]:
+    config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+    config_path.write_text(CONFIG)
+    nodes = {}
+    for name in ['keyboard0', 'mouse0', 'combo0']:
+        nodes[name] = Path(tmpdir) / name
+        nodes[name].touch()
+    server = asyncio.run(ReportServer.open(GadgetConfig(config_path), device_paths = nodes))
+    return server, nodes
+
+
+def test_raw_and_fields() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        server, nodes = _server(tmpdir)
+        try:
+            press = Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A, tap = False).report()
+            server.handle(encode_packet(0, press))
+
+            # buttons, x, y, wheel; negative values wrap
+            move = Mouse.Message(buttons = 0x01, relative_x = -1.0, relative_y = 0.5, relative_wheel = -1)
+            x, y = -((2 ** 15) - 1), int(0.5 * ((2 ** 15) - 1))
+            server.handle(encode_packet(1, encode_fields(0x01, x, y, -1), fields = True))
+
+            routed = Composite.route(Mouse.Message(buttons = 0x02)).report()
+            server.handle(encode_packet(2, routed))
+        finally:
+            server.close()
+
+        assert nodes['keyboard0'].read_bytes() == press
+        assert nodes['mouse0'].read_bytes() == move.report()
+        assert nodes['combo0'].read_bytes() == routed
+        assert server.counters.written == 3
+        assert server.counters.invalid == 0
+
+
+def test_invalid_packets() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        server, nodes = _server(tmpdir)
+        try:
+            server.handle(b'\x01')                                       # truncated header
+            server.handle(b'\x02\x00\x00' + bytes(8))                    # unknown version
+            server.handle(encode_packet(7, bytes(8)))                    # unknown function
+            server.handle(encode_packet(0, bytes(9)))                    # longer than a report
+            server.handle(encode_packet(0, b''))                         # empty
+            server.handle(encode_packet(1, encode_fields(1, 2), fields = True)) # too few fields
+            server.handle(encode_packet(2, encode_fields(1), fields = True))    # composite
+        finally:
+            server.close()
+        assert server.counters.invalid == 7
+        assert server.counters.written == 0
+        assert all(node.read_bytes() == b'' for node in nodes.values())
+
+
+def test_sequence_drops_stale() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        server, nodes = _server(tmpdir)
+        reports = [Mouse.Message(relative_wheel = i).report() for i in range(6)]
+        try:
+            for sequence, report in [
+                (10, reports[0]),
+                (12, reports[1]),
+                (11, reports[2]), # stale
+                (12, reports[3]), # duplicate
+                (0, reports[4]),  # producer restarted
+                (0xFFFFFFFF, reports[5]), # far ahead is behind: stale
+            ]:
+                server.handle(encode_packet(1, report, sequence = sequence))
+
+            # Sequences wrap
+            server.targets[1].sequence = 0xFFFFFFFF
+            server.handle(encode_packet(1, reports[5], sequence = 1))
+        finally:
+            server.close()
+        assert nodes['mouse0'].read_bytes() == reports[0] + reports[1] + reports[4] + reports[5]
+        assert server.counters.stale == 3
+
+
+def test_invalid_packet_keeps_sequence() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        server, nodes = _server(tmpdir)
+        report = Mouse.Message(buttons = 0x01).report()
+        try:
+            server.handle(encode_packet(1, report, sequence = 4))
+            server.handle(encode_packet(1, bytes(7), sequence = 5))  # longer than a report
+            server.handle(encode_packet(1, encode_fields(1), sequence = 5, fields = True)) # too few fields
+            server.handle(encode_packet(1, report, sequence = 5))    # the good copy isn't stale
+        finally:
+            server.close()
+        assert nodes['mouse0'].read_bytes() == report + report
+        assert server.counters.invalid == 2
+        assert server.counters.stale == 0
+
+
+def test_listen_unix_and_udp() -> None:
+    async def roundtrip(server: ReportServer, unix_path: Path) -> None:
+        transports = await listen(server, unix_path, ('127.0.0.1', 0))
+        try:
+            udp_addr = transports[1].get_extra_info('sockname')
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+                sock.sendto(encode_packet(0, bytes([0, 0, Keyboard.KEYCODE_B, 0, 0, 0, 0, 0])), str(unix_path))
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.sendto(encode_packet(0, bytes(8)), udp_addr)
+            for _ in range(100):
+                if server.counters.written == 2:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            for transport in transports:
+                transport.close()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        server, nodes = _server(tmpdir)
+        try:
+            asyncio.run(roundtrip(server, Path(tmpdir) / 'serve.sock'))
+        finally:
+            server.close()
+        assert nodes['keyboard0'].read_bytes() == bytes([0, 0, Keyboard.KEYCODE_B, 0, 0, 0, 0, 0]) + bytes(8)
+
+
+def test_backpressure_keeps_order() -> None:
+    # A full FIFO stands in for a host that isn't polling
+    async def flood(server: ReportServer, reader: int) -> bytes:
+        packets = [encode_packet(1, Mouse.Message(relative_wheel = i % 100).report()) for i in range(20000)]
+        for packet in packets:
+            server.handle(packet)
+        assert server.targets[1].pending # Kernel pushed back
+
+        received = bytearray()
+        expected = sum(len(p) - 3 for p in packets)
+        while len(received) < expected:
+            try:
+                received += os.read(reader, 65536)
+            except BlockingIOError:
+                await asyncio.sleep(0.001)
+        return bytes(received)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text(CONFIG)
+        fifo = Path(tmpdir) / 'hidg.fifo'
+        os.mkfifo(fifo)
+        reader = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+        nodes = {name: Path(tmpdir) / name for name in ['keyboard0', 'combo0']}
+        for node in nodes.values():
+            node.touch()
+        nodes['mouse0'] = fifo
+
+        async def run() -> bytes:
+            server = await ReportServer.open(GadgetConfig(config_path), device_paths = nodes)
+            try:
+                return await flood(server, reader)
+            finally:
+                assert not server.targets[1].pending
+                server.close()
+
+        try:
+            received = asyncio.run(run())
+        finally:
+            os.close(reader)
+        assert received == b''.join(Mouse.Message(relative_wheel = i % 100).report() for i in range(20000))
+
+
+if __name__ == '__main__':
+    test_raw_and_fields()
+    test_invalid_packets()
+    test_sequence_drops_stale()
+    test_invalid_packet_keeps_sequence()
+    test_listen_unix_and_udp()
+    test_backpressure_keeps_order()
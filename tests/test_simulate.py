@@ -0,0 +1,65 @@
+import asyncio
+import tempfile
+
+from pathlib import Path
+
+import pytest
+
+from ezmsg.gadget import simulate
+from ezmsg.gadget.command import activate, deactivate
+from ezmsg.gadget.discovery import device_node
+from ezmsg.gadget.function import Keyboard, Mouse
+from ezmsg.gadget.hiddevice import hid_devices
+from ezmsg.gadget.config import GadgetConfig, GADGET_PATH
+
+CONFIG = """
+[gadget]
+name = sim
+
+[function.Keyboard.keyboard0]
+
+[function.Mouse.mouse0]
+backend = nonblocking
+"""
+
+
+def test_simulated_activate_endpoint(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def write_through_endpoint(config: GadgetConfig) -> None:
+        devices = hid_devices(config)
+        for device in devices.values():
+            await device.setup()
+        await devices['keyboard0'].write(Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A))
+        await devices['mouse0'].write(Mouse.Message(buttons = 0x01))
+        for device in devices.values():
+            await device.shutdown()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / 'root'
+        config_path = Path(tmpdir) / 'ezmsg-gadget.conf'
+        config_path.write_text(CONFIG)
+
+        monkeypatch.setenv(simulate.SIMULATE_ENV, str(root))
+        activate(config_path)
+
+        gadget_dir = simulate.system_path(GADGET_PATH) / 'sim'
+        assert (gadget_dir / 'UDC').read_text() == simulate.SIMULATED_UDC
+        assert (gadget_dir / 'functions' / 'hid.keyboard0' / 'report_length').read_text() == '8'
+
+        nodes = {}
+        for name in ['keyboard0', 'mouse0']:
+            dev = (gadget_dir / 'functions' / f'hid.{name}' / 'dev').read_text()
+            nodes[name] = device_node(dev, root)
+            assert nodes[name].parent == root / 'dev'
+        assert nodes['keyboard0'] != nodes['mouse0']
+
+        asyncio.run(write_through_endpoint(GadgetConfig(config_path)))
+        assert nodes['keyboard0'].read_bytes() == Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A).report()
+        assert nodes['mouse0'].read_bytes() == Mouse.Message(buttons = 0x01).report()
+
+        deactivate(config_path)
+        assert not gadget_dir.exists()
+        assert not any((root / 'dev').iterdir())
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
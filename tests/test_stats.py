@@ -0,0 +1,56 @@
+import tempfile
+import time
+
+from pathlib import Path
+
+from ezmsg.gadget.stats import (
+    DeviceCounters,
+    LatencyHistogram,
+    format_stats,
+    read_stats,
+    write_stats
+)
+
+
+def test_latency_histogram() -> None:
+    hist = LatencyHistogram()
+    assert hist.percentile(50) == 0.0
+
+    for _ in range(98):
+        hist.record(0.0005)
+    hist.record(0.02)
+    hist.record(0.5)
+
+    assert 0.0005 <= hist.percentile(50) < 0.001
+    assert 0.02 <= hist.percentile(99) < 0.05
+    assert hist.percentile(100) == hist.max == 0.5
+
+
+def test_counters_roundtrip() -> None:
+    counters = DeviceCounters('keyboard0')
+    counters.received += 3
+    counters.record_write(16, 8, time.perf_counter()) # Keyboard tap; two reports
+    counters.record_write(8, 8, time.perf_counter())
+    counters.write_errors += 1
+
+    stats = counters.snapshot(backlog = 2, merged = 1)
+    assert stats.received == 3
+    assert stats.writes == 2
+    assert stats.reports == 3
+    assert stats.bytes == 24
+    assert stats.backlog == 2
+    assert stats.merged == 1
+    assert sum(stats.latency_histogram) == 2
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        stats_dir = Path(tmpdir) / 'stats'
+        write_stats(stats, stats_dir)
+        write_stats(stats, stats_dir) # Replaces
+        assert read_stats(stats_dir) == [stats]
+
+    assert 'keyboard0' in format_stats([stats])
+
+
+if __name__ == '__main__':
+    test_latency_histogram()
+    test_counters_roundtrip()
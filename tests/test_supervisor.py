@@ -0,0 +1,169 @@
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import typing
+
+from pathlib import Path
+
+import pytest
+
+from ezmsg.gadget import simulate, supervisor
+from ezmsg.gadget.command import activate
+from ezmsg.gadget.config import GadgetConfig
+from ezmsg.gadget.handle import HANDLE_POOL
+from ezmsg.gadget.hiddevice import HIDDevice
+
+
+def _free_port() -> int:
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_backoff() -> None:
+    delays = supervisor.backoff(initial = 0.1, maximum = 1.0, rng = random.Random(0))
+    ceilings = [0.1, 0.2, 0.4, 0.8, 1.0, 1.0]
+    for ceiling in ceilings:
+        delay = next(delays)
+        assert ceiling / 2 <= delay <= ceiling
+
+
+def test_wait_for_graphserver_timeout() -> None:
+    start = time.monotonic()
+    assert not supervisor.wait_for_graphserver(('127.0.0.1', _free_port()), timeout = 0.2)
+    assert time.monotonic() - start < 1.0
+
+
+def _serve(address: typing.Tuple[str, int]) -> subprocess.Popen:
+    # A GraphServer in its own process: killing it closes every connection to
+    # it at once, as when the host's GraphServer really goes away
+    server = subprocess.Popen([sys.executable, '-m', 'ezmsg.core', 'serve', '--address', f'{address[0]}:{address[1]}'])
+    assert supervisor.wait_for_graphserver(address, timeout = 10.0)
+    return server
+
+
+def _wait(predicate: typing.Callable[[], bool], timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _supervisor(tmpdir: Path, address: typing.Tuple[str, int], stop: threading.Event) -> threading.Thread:
+    # A daemon, so a failed test can't leave the interpreter waiting on it
+    config_path = tmpdir / 'ezmsg-gadget.conf'
+    config_path.write_text(
+        f'[gadget]\nname = sim\n\n'
+        f'[endpoint]\nremote_host = {address[0]}\nremote_port = {address[1]}\n\n'
+        f'[function.Mouse.mouse0]\nbackend = nonblocking\n'
+    )
+    activate(config_path)
+    return threading.Thread(
+        target = supervisor.supervise,
+        kwargs = dict(config = GadgetConfig(config_path), stop = stop, watchdog_period = 0.05),
+        daemon = True
+    )
+
+
+def test_wait_for_graphserver_stops() -> None:
+    stop = threading.Event()
+    threading.Timer(0.1, stop.set).start()
+    start = time.monotonic()
+    assert not supervisor.wait_for_graphserver(('127.0.0.1', _free_port()), stop = stop)
+    assert time.monotonic() - start < 1.0
+
+
+def test_supervise_reconnects(monkeypatch: pytest.MonkeyPatch) -> None:
+    address = ('127.0.0.1', _free_port())
+    starts: typing.List[float] = []
+    probes: typing.List[float] = []
+    initialize, probe = HIDDevice.initialize, supervisor._probe
+
+    async def record_initialize(self: HIDDevice) -> None:
+        starts.append(time.monotonic())
+        await initialize(self)
+
+    async def record_probe(*args: typing.Any) -> bool:
+        probes.append(time.monotonic())
+        return await probe(*args)
+
+    # A ping after a start is the watchdog's: the graph is up
+    def watching() -> bool:
+        return bool(starts) and bool(probes) and probes[-1] > starts[-1]
+
+    monkeypatch.setattr(HIDDevice, 'initialize', record_initialize)
+    monkeypatch.setattr(supervisor, '_probe', record_probe)
+    monkeypatch.setattr(supervisor, 'SHUTDOWN_TIMEOUT', 0.5)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv(simulate.SIMULATE_ENV, str(Path(tmpdir) / 'root'))
+        stop = threading.Event()
+        thread = _supervisor(Path(tmpdir), address, stop)
+        server = _serve(address)
+        try:
+            thread.start()
+            _wait(watching)
+            assert len(starts) == 1
+            pooled = dict(HANDLE_POOL._files)
+            assert len(pooled) == 1
+
+            # GraphServer blip
+            server.kill()
+            server.wait()
+            server = _serve(address)
+            _wait(lambda: len(starts) == 2 and watching())
+            assert len(starts) == 2
+            assert HANDLE_POOL._files == pooled # Same descriptor, not reopened
+
+            # Gone for good: the supervisor keeps waiting until stopped (the
+            # lost graph's teardown may take up to SHUTDOWN_TIMEOUT)
+            server.kill()
+            server.wait()
+            time.sleep(0.2)
+            assert thread.is_alive() and len(starts) == 2
+            stopped = time.monotonic()
+            stop.set()
+            thread.join(timeout = 5.0)
+            assert not thread.is_alive()
+            assert time.monotonic() - stopped < supervisor.SHUTDOWN_TIMEOUT + 0.5
+            assert HANDLE_POOL._files == {}
+        finally:
+            stop.set()
+            server.kill()
+            server.wait()
+            thread.join(timeout = 5.0)
+
+
+def test_supervise_stops_graph(monkeypatch: pytest.MonkeyPatch) -> None:
+    address = ('127.0.0.1', _free_port())
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv(simulate.SIMULATE_ENV, str(Path(tmpdir) / 'root'))
+        stop = threading.Event()
+        thread = _supervisor(Path(tmpdir), address, stop)
+        server = _serve(address)
+        try:
+            thread.start()
+            _wait(lambda: len(HANDLE_POOL._files) == 1)
+            assert len(HANDLE_POOL._files) == 1
+
+            # A running graph ends within a watchdog period or so
+            stopped = time.monotonic()
+            stop.set()
+            thread.join(timeout = 5.0)
+            assert not thread.is_alive()
+            assert time.monotonic() - stopped < 1.0
+            assert HANDLE_POOL._files == {}
+        finally:
+            stop.set()
+            server.kill()
+            server.wait()
+            thread.join(timeout = 5.0)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,72 @@
+import typing
+
+import pytest
+
+from ezmsg.gadget.function import Keyboard
+from ezmsg.gadget.text import compile_text, LAYOUTS, LAYOUT_US, LAYOUT_DE, LAYOUT_FR
+
+SHIFT = Keyboard.MODIFIER_LEFT_SHIFT
+
+
+def reports(data: bytes) -> typing.List[typing.Tuple[int, int]]:
+    assert len(data) % 8 == 0
+    return [(data[i], data[i + 2]) for i in range(0, len(data), 8)]
+
+
+def test_compile_us() -> None:
+    assert reports(compile_text('Hi!', LAYOUT_US)) == [
+        (SHIFT, Keyboard.KEYCODE_H),
+        (0, 0), # Modifiers change
+        (0, Keyboard.KEYCODE_I),
+        (0, 0),
+        (SHIFT, Keyboard.KEYCODE_NUMBER_1),
+        (0, 0),
+    ]
+
+    # Repeated keys need a release in between; distinct keys don't
+    assert reports(compile_text('aab')) == [
+        (0, Keyboard.KEYCODE_A),
+        (0, 0),
+        (0, Keyboard.KEYCODE_A),
+        (0, Keyboard.KEYCODE_B),
+        (0, 0),
+    ]
+
+    # Windows line endings type one Enter
+    assert compile_text('a\r\n') == compile_text('a\n')
+
+
+def test_layouts() -> None:
+    assert reports(compile_text('z', LAYOUT_DE)) == [(0, Keyboard.KEYCODE_Y), (0, 0)]
+    assert reports(compile_text('a', LAYOUT_FR)) == [(0, Keyboard.KEYCODE_Q), (0, 0)]
+    assert reports(compile_text('@', LAYOUT_DE)) == [(Keyboard.MODIFIER_RIGHT_ALT, Keyboard.KEYCODE_Q), (0, 0)]
+
+    # Dead keys are followed by a space
+    assert reports(compile_text('^', LAYOUT_DE)) == [
+        (0, Keyboard.KEYCODE_ACCENT_GRAVE),
+        (0, Keyboard.KEYCODE_SPACEBAR),
+        (0, 0)
+    ]
+
+    # Every layout can type printable ASCII letters and digits
+    for layout in LAYOUTS:
+        compile_text('The quick brown fox jumps over the lazy dog 0123456789', layout)
+
+
+def test_fragments_are_independent() -> None:
+    text = 'ssh user@example.com -p 2222'
+    assert compile_text(text + ' ' + text) == compile_text(text + ' ') + compile_text(text)
+
+
+def test_untypeable() -> None:
+    with pytest.raises(ValueError):
+        compile_text('ü', LAYOUT_US)
+    with pytest.raises(ValueError):
+        compile_text('abc', 'dvorak')
+
+
+if __name__ == '__main__':
+    test_compile_us()
+    test_layouts()
+    test_fragments_are_independent()
+    test_untypeable()
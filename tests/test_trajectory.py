@@ -0,0 +1,84 @@
+import numpy as np
+
+from ezmsg.gadget.function import Touch
+from ezmsg.gadget.trajectory import TrajectoryResampler, interpolate, smooth
+
+
+def test_linear_window() -> None:
+    resampler = TrajectoryResampler(rate = 100.0)
+    touch, first = resampler.window(0.0, Touch.Message(touch = 0x02, absolute_x = 0.0, absolute_y = 0.5))
+    assert touch == 0x02
+    assert first.tolist() == [[0.0, 0.5]] # A new contact jumps straight to the target
+    resampler.emitted(first[-1])
+
+    # 40 ms between targets at 100 Hz -> 4 evenly spaced samples ending on the target
+    _, window = resampler.window(0.04, Touch.Message(touch = 0x02, absolute_x = 0.4, absolute_y = 0.5))
+    assert np.allclose(window, [[0.1, 0.5], [0.2, 0.5], [0.3, 0.5], [0.4, 0.5]])
+    resampler.emitted(window[-1])
+
+    # Pauses are capped at max_gap
+    _, window = resampler.window(5.0, Touch.Message(touch = 0x02, absolute_x = 0.5, absolute_y = 0.5))
+    assert len(window) == 10
+    resampler.emitted(window[-1])
+
+    # Lifting the finger is never interpolated
+    touch, window = resampler.window(5.04, Touch.Message(touch = 0x00, absolute_x = 0.9, absolute_y = 0.9))
+    assert touch == 0x00 and window.tolist() == [[0.9, 0.9]]
+
+
+def test_interrupted_window() -> None:
+    resampler = TrajectoryResampler(rate = 100.0)
+    _, window = resampler.window(0.0, Touch.Message(touch = 0x02, absolute_x = 0.0, absolute_y = 0.5))
+    resampler.emitted(window[-1])
+    _, window = resampler.window(0.04, Touch.Message(touch = 0x02, absolute_x = 0.4, absolute_y = 0.5))
+
+    # A newer target arrives after two of the four samples went out; the next
+    # window continues from where the pointer actually is, not from 0.4
+    for position in window[:2]:
+        resampler.emitted(position)
+    _, window = resampler.window(0.08, Touch.Message(touch = 0x02, absolute_x = 0.6, absolute_y = 0.5))
+    assert np.allclose(window, [[0.3, 0.5], [0.4, 0.5], [0.5, 0.5], [0.6, 0.5]])
+
+
+def test_spline() -> None:
+    start, end, before = np.array([0.5, 0.5]), np.array([0.6, 0.5]), np.array([0.5, 0.4])
+    samples = interpolate(start, end, 8, 'spline', before)
+    assert samples.shape == (8, 2)
+    assert np.allclose(samples[-1], end)
+    assert not np.allclose(samples, interpolate(start, end, 8, 'linear'))
+
+    # Collinear, evenly spaced targets give a straight, evenly spaced spline
+    samples = interpolate(start, end, 4, 'spline', np.array([0.4, 0.5]))
+    assert np.allclose(samples, interpolate(start, end, 4, 'linear'))
+
+
+def test_smoothing_and_clamp() -> None:
+    samples = np.tile([[1.0, 1.0]], (5, 1))
+    alpha = 0.5
+    expected = []
+    y = np.zeros(2)
+    for x in samples:
+        y = alpha * y + (1 - alpha) * x
+        expected.append(y)
+    assert np.allclose(smooth(samples, alpha, np.zeros(2)), expected)
+
+    resampler = TrajectoryResampler(rate = 100.0, interpolation = 'spline', smoothing = 0.02)
+    for arrival, xy in [(0.0, 0.9), (0.02, 0.99)]:
+        _, window = resampler.window(arrival, Touch.Message(touch = 0x02, absolute_x = xy, absolute_y = xy))
+        resampler.emitted(window[-1])
+    _, window = resampler.window(0.04, Touch.Message(touch = 0x02, absolute_x = 1.2, absolute_y = -0.1))
+    assert window.max() <= 1.0 and window.min() >= 0.0
+
+    resampler = TrajectoryResampler(rate = 100.0)
+    _, window = resampler.window(0.0, Touch.Message(touch = 0x02, absolute_x = 0.9, absolute_y = 0.1))
+    resampler.emitted(window[-1])
+    _, window = resampler.window(0.04, Touch.Message(touch = 0x02, absolute_x = 1.2, absolute_y = -0.1))
+    reports = np.frombuffer(Touch.encode_batch(0x02, window[:, 0], window[:, 1]), dtype = Touch.SPEC.input.dtype)
+    assert reports['x'][-1] == 10000 and reports['y'][-1] == 0
+
+
+if __name__ == '__main__':
+    test_linear_window()
+    test_interrupted_window()
+    test_spline()
+    test_smoothing_and_clamp()
@@ -0,0 +1,141 @@
+import asyncio
+import typing
+
+from ezmsg.gadget.function import Keyboard, Mouse, Touch
+from ezmsg.gadget.message import HIDMessage
+from ezmsg.gadget.writequeue import WriteQueue
+
+
+async def _drain(queue: WriteQueue, messages: typing.List[HIDMessage]) -> typing.List[HIDMessage]:
+    for msg in messages:
+        queue.put(msg)
+
+    out: typing.List[HIDMessage] = []
+    while queue.backlog:
+        out.append(await queue.get())
+    return out
+
+
+def test_mouse_deltas_coalesce() -> None:
+    async def run() -> None:
+        queue = WriteQueue(latency = 0.0)
+        out = await _drain(queue, [
+            Mouse.Message(relative_x = 0.1, relative_y = -0.1, relative_wheel = 1),
+            Mouse.Message(relative_x = 0.1, relative_y = -0.1, relative_wheel = 1),
+            Mouse.Message(relative_x = 0.1, relative_y = -0.1, relative_wheel = 1),
+        ])
+
+        assert len(out) == 1
+        assert isinstance(out[0], Mouse.Message)
+        assert abs(out[0].relative_x - 0.3) < 1e-9
+        assert abs(out[0].relative_y + 0.3) < 1e-9
+        assert out[0].relative_wheel == 3
+        assert queue.stats.received == 3
+        assert queue.stats.merged == 2
+        assert queue.stats.written == 1
+
+    asyncio.run(run())
+
+
+def test_button_transitions_preserved() -> None:
+    async def run() -> None:
+        queue = WriteQueue(latency = 0.0)
+        out = await _drain(queue, [
+            Mouse.Message(buttons = 0x00, relative_x = 0.1),
+            Mouse.Message(buttons = 0x01, relative_x = 0.1),
+            Mouse.Message(buttons = 0x01, relative_x = 0.1),
+            Mouse.Message(buttons = 0x00),
+            Mouse.Message(relative_x = 0.9),
+            Mouse.Message(relative_x = 0.9), # Would overflow one report
+        ])
+
+        assert [m.buttons for m in out] == [0x00, 0x01, 0x00, 0x00] # type: ignore
+        assert queue.stats.merged == 2
+
+    asyncio.run(run())
+
+
+def test_touch_and_keyboard() -> None:
+    async def run() -> None:
+        queue = WriteQueue(latency = 0.0)
+        keys = [
+            Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A),
+            Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A),
+        ]
+        out = await _drain(queue, keys + [
+            Touch.Message(touch = 0x03, absolute_x = 0.1),
+            Touch.Message(touch = 0x03, absolute_x = 0.2),
+            Touch.Message(touch = 0x03, absolute_x = 0.3),
+            Touch.Message(touch = 0x02, absolute_x = 0.3),
+        ])
+
+        assert out[:2] == keys
+        assert out[2:] == [
+            Touch.Message(touch = 0x03, absolute_x = 0.3),
+            Touch.Message(touch = 0x02, absolute_x = 0.3),
+        ]
+
+    asyncio.run(run())
+
+
+def test_latency_budget() -> None:
+    async def run() -> None:
+        queue = WriteQueue(latency = 0.05)
+
+        async def produce() -> None:
+            for _ in range(5):
+                queue.put(Mouse.Message(relative_x = 0.01))
+                await asyncio.sleep(0.005)
+
+        producer = asyncio.create_task(produce())
+        msg = await queue.get()
+        await producer
+
+        assert isinstance(msg, Mouse.Message)
+        assert abs(msg.relative_x - 0.05) < 1e-9
+        assert queue.stats.max_added_latency >= 0.02
+
+    asyncio.run(run())
+
+
+def test_pacing() -> None:
+    async def run() -> None:
+        interval = 0.02
+        queue = WriteQueue(interval = interval)
+
+        async def produce() -> None:
+            for i in range(20):
+                queue.put(Mouse.Message(relative_x = 0.01))
+                if i == 10:
+                    queue.put(Keyboard.Message(hid_keycode = Keyboard.KEYCODE_A))
+                    queue.put(Keyboard.Message(hid_keycode = Keyboard.KEYCODE_B))
+                await asyncio.sleep(0.005)
+
+        producer = asyncio.create_task(produce())
+
+        writes: typing.List[typing.Tuple[float, HIDMessage]] = []
+        loop = asyncio.get_running_loop()
+        while not producer.done() or queue.backlog:
+            msg = await queue.get()
+            writes.append((loop.time(), msg))
+        await producer
+
+        gaps = [b[0] - a[0] for a, b in zip(writes[:-1], writes[1:])]
+        assert min(gaps) >= interval * 0.9
+
+        # Transitions are kept in order and no movement is lost
+        keys = [m.hid_keycode for _, m in writes if isinstance(m, Keyboard.Message)]
+        assert keys == [Keyboard.KEYCODE_A, Keyboard.KEYCODE_B]
+        total_x = sum(m.relative_x for _, m in writes if isinstance(m, Mouse.Message))
+        assert abs(total_x - 0.2) < 1e-9
+        assert len(writes) < 22
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    test_mouse_deltas_coalesce()
+    test_button_transitions_preserved()
+    test_touch_and_keyboard()
+    test_latency_budget()
+    test_pacing()